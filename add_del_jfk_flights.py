@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
 from flight.models import Place, Flight, Week
+from flight.search_cache import bulk_update
 
 def add_del_jfk_flights():
     """Add flights between Delhi and New York JFK."""
@@ -138,4 +139,5 @@ def add_del_jfk_flights():
     print(f"   JFK -> DEL: {jfk_del_count}")
 
 if __name__ == "__main__":
-    add_del_jfk_flights()
+    with bulk_update():
+        add_del_jfk_flights()
@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
 from flight.models import Place, Flight, Week
+from flight.search_cache import bulk_update
 
 def analyze_routes():
     """Analyze which routes have and don't have flights."""
@@ -174,4 +175,5 @@ if __name__ == "__main__":
     print("=== Analyzing Routes ===\n")
     analyze_routes()
     print("\n=== Adding Missing Routes ===\n")
-    add_missing_routes()
+    with bulk_update():
+        add_missing_routes()
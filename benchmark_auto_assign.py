@@ -0,0 +1,98 @@
+"""
+Benchmark of the group seat auto-assignment search.
+
+Fills every cabin of the registered layouts to a given occupancy with random
+seats and times find_block() (the block search over the precomputed
+candidate masks and the free-seat bitmap) for each party size, then times the
+whole auto_assign_seats() request, database reads and group reservation
+included, on one flight inside a transaction that is rolled back.
+
+Run this from the project root using:
+python benchmark_auto_assign.py [occupancy percent]
+"""
+
+import os
+import sys
+import random
+import time
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone.settings')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+django.setup()
+
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from flight.cabin_layouts import CABIN_LAYOUTS
+from flight.models import Flight
+from flight.seat_assign import auto_assign_seats, candidate_blocks, find_block, seat_adjacency
+from flight.seat_manager import book_seats, seat_key
+
+PARTY_SIZES = (1, 2, 4, 6, 9)
+SEARCHES = 2000
+
+
+class Rollback(Exception):
+    pass
+
+
+def random_bitmap(adjacency, occupancy):
+    free = 0
+    for index in random.sample(range(len(adjacency.numbers)), round(len(adjacency.numbers) * (1 - occupancy))):
+        free |= 1 << index
+    return free
+
+
+def time_search(layout, seat_class, occupancy):
+    adjacency = seat_adjacency(layout, seat_class)
+    bitmaps = [random_bitmap(adjacency, occupancy) for _ in range(50)]
+    results = []
+    for size in PARTY_SIZES:
+        blocks = candidate_blocks(layout, seat_class, size, 'window')
+        start = time.perf_counter()
+        for search in range(SEARCHES):
+            find_block(adjacency, bitmaps[search % len(bitmaps)], blocks, size)
+        results.append((time.perf_counter() - start) / SEARCHES * 1e6)
+    return len(adjacency.numbers), results
+
+
+def time_request(occupancy):
+    departure_date = date.today() + timedelta(days=365)
+    flight = Flight.objects.operating_on(departure_date.weekday()).filter(economy_fare__gt=0).first()
+    adjacency = seat_adjacency('standard', 'economy')
+    taken = [number for number in adjacency.numbers if random.random() < occupancy]
+    timings = []
+    try:
+        with transaction.atomic():
+            book_seats([seat_key(flight.id, departure_date, number) for number in taken])
+            for size in PARTY_SIZES:
+                start = time.perf_counter()
+                auto_assign_seats(flight, departure_date, 'economy', size, 'window')
+                timings.append((time.perf_counter() - start) * 1000)
+            raise Rollback
+    except Rollback:
+        pass
+    return timings
+
+
+def main():
+    occupancy = float(sys.argv[1]) / 100 if len(sys.argv) > 1 else 0.95
+    random.seed(7)
+
+    print(f"Block search at {occupancy:.0%} occupancy, microseconds per search")
+    print(f"{'cabin':>18}{'seats':>7}" + ''.join(f"{f'party {size}':>10}" for size in PARTY_SIZES))
+    for layout, cabins in CABIN_LAYOUTS.items():
+        for seat_class, rows, columns in cabins:
+            seats, results = time_search(layout, seat_class, occupancy)
+            print(f"{f'{layout} {seat_class}':>18}{seats:>7}" + ''.join(f"{result:>10.1f}" for result in results))
+
+    print("\nWhole request (reads, search and group reservation), milliseconds")
+    print(''.join(f"{f'party {size}':>10}" for size in PARTY_SIZES))
+    print(''.join(f"{timing:>10.2f}" for timing in time_request(occupancy)))
+
+
+if __name__ == "__main__":
+    main()
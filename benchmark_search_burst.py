@@ -0,0 +1,103 @@
+"""
+Benchmark of request coalescing in the flight search.
+
+Starts a number of worker processes with cold schedule indexes that share a
+file-based search cache, releases them at once on the same search, first with
+FLIGHT_SEARCH_COALESCE off and then on, and reports the schedule loads (full
+Flight queries building an index) and the other queries of the burst.
+
+Threads of one process gain nothing from coalescing, the index lock already
+makes them wait for a single load.  Across processes it is what saves work:
+without it every cold worker loads the whole schedule; with it one worker
+does while the others wait for the flight ids it stores and fetch those
+flights with one query.
+
+Run this from the project root using:
+python benchmark_search_burst.py [workers] [origin] [destination] [date]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import multiprocessing
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone.settings')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+django.setup()
+
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from flight import search_index
+from flight.search_index import find_flights_between
+
+
+def search_in_worker(barrier, search, results):
+    # A freshly started worker: own connection, no index
+    connections.close_all()
+    search_index._index = None
+    counts = {'schedule_loads': 0, 'queries': 0}
+
+    def count_query(execute, sql, params, many, context):
+        counts['queries'] += 1
+        if 'FROM "flight_flight"' in sql and '"flight_flight"."id" IN' not in sql:
+            counts['schedule_loads'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        barrier.wait()
+        find_flights_between(*search)
+    results.put(counts)
+
+
+def run_burst(workers, search):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    caches[settings.FLIGHT_SEARCH_CACHE].clear()
+    connections.close_all()
+
+    processes = [context.Process(target=search_in_worker, args=(barrier, search, results)) for _ in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        'schedule_loads': sum(count['schedule_loads'] for count in counts),
+        'queries': sum(count['queries'] for count in counts),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    origin = sys.argv[2] if len(sys.argv) > 2 else 'DEL'
+    destination = sys.argv[3] if len(sys.argv) > 3 else 'BOM'
+    date = sys.argv[4] if len(sys.argv) > 4 else '2030-01-07'
+    search = ([origin], [destination], datetime.strptime(date, "%Y-%m-%d").weekday(), 'economy')
+
+    shared_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='search-burst-'),
+    }
+    print(f"{workers} cold workers searching {origin} -> {destination} on {date} at once, shared file cache")
+    print(f"{'coalescing':<12}{'schedule loads':>16}{'other queries':>15}{'seconds':>10}")
+    with override_settings(CACHES=dict(settings.CACHES, burst=shared_cache), FLIGHT_SEARCH_CACHE='burst'):
+        for coalesce in (False, True):
+            with override_settings(FLIGHT_SEARCH_COALESCE=coalesce):
+                counts = run_burst(workers, search)
+            print(f"{'on' if coalesce else 'off':<12}{counts['schedule_loads']:>16}"
+                  f"{counts['queries'] - counts['schedule_loads']:>15}{counts['seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
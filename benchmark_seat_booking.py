@@ -0,0 +1,98 @@
+"""
+Benchmark of database round trips per seat booking.
+
+Books groups of seats the way confirm_seat_booking used to (book_seat for
+every seat, each with its own select_for_update transaction) and with the
+group operation book_seats (one conditional UPDATE, plus one bulk INSERT for
+seats that have no row yet), both for seats that were reserved first (the
+normal flow of the seat page) and for seats that were not.
+
+Everything runs inside one transaction that is rolled back at the end, so the
+per-seat transactions show up as savepoints, as they do inside the atomic
+confirm_seat_booking view.
+
+Run this from the project root using:
+python benchmark_seat_booking.py [repeats]
+"""
+
+import os
+import sys
+import time
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone.settings')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+django.setup()
+
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from flight.models import Flight
+from flight.seat_manager import book_seat, book_seats, reserve_seats, seat_key, layout_seats
+
+GROUP_SIZES = (1, 2, 4, 6)
+
+
+class Rollback(Exception):
+    pass
+
+
+def book_one_by_one(keys):
+    for key in keys:
+        if not book_seat(key)['success']:
+            raise RuntimeError(f"could not book {key}")
+
+
+def book_as_group(keys):
+    if not book_seats(keys)['success']:
+        raise RuntimeError(f"could not book {keys}")
+
+
+def measure(book, groups, reserve_first):
+    queries = 0
+    elapsed = 0.0
+    for keys in groups:
+        if reserve_first:
+            reserve_seats(keys)
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            book(keys)
+            elapsed += time.perf_counter() - start
+        queries += len(context.captured_queries)
+    return queries / len(groups), elapsed / len(groups) * 1000
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    departure_date = date.today() + timedelta(days=365)
+    flight = Flight.objects.operating_on(departure_date.weekday()).filter(economy_fare__gt=0).first()
+    seat_numbers = [template.number for template, price in layout_seats(flight, 'economy')]
+    # Fresh seats for every group, taking later weekly departures once a departure is used up
+    seats = (
+        seat_key(flight.id, departure_date + timedelta(weeks=week), number)
+        for week in range(52) for number in seat_numbers
+    )
+
+    print(f"Flight {flight.id} on {departure_date}, average of {repeats} bookings per row")
+    print(f"{'seats':>6}{'reserved first':>16}{'one by one':>14}{'as group':>10}{'ms one by one':>16}{'ms as group':>13}")
+    try:
+        with transaction.atomic():
+            for size in GROUP_SIZES:
+                for reserve_first in (True, False):
+                    results = []
+                    for book in (book_one_by_one, book_as_group):
+                        groups = [[next(seats) for _ in range(size)] for _ in range(repeats)]
+                        results.append(measure(book, groups, reserve_first))
+                    (loop_queries, loop_ms), (group_queries, group_ms) = results
+                    print(f"{size:>6}{'yes' if reserve_first else 'no':>16}{loop_queries:>14.1f}{group_queries:>10.1f}"
+                          f"{loop_ms:>16.2f}{group_ms:>13.2f}")
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark of seat changes under contention: optimistic conditional updates
+against the earlier pessimistic SELECT ... FOR UPDATE transactions.
+
+Worker processes reserve and release random seats out of a small set of hot
+seats of one departure (stored densely) as fast as they can.  The optimistic
+reserve_seat()/release_seat() read outside the write transaction and change
+a seat with UPDATE ... WHERE id = ? AND version = ?; the pessimistic ones
+read and write in one transaction, which on SQLite (no row locks) makes two
+writers fail with "database is locked" instead of waiting.  The departure's
+seats are deleted afterwards.
+
+Run this from the project root using:
+python benchmark_seat_contention.py [workers] [operations per worker] [hot seats]
+"""
+
+import os
+import sys
+import random
+import time
+import multiprocessing
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone.settings')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+django.setup()
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from flight.cabin_layouts import seat_map_template
+from flight.models import Flight, Seat, SeatAvailability, SeatMapVersion
+from flight.seat_assign import seat_adjacency
+from flight.seat_manager import _publish, provision_departures, release_seat, reserve_seat, seat_key, seat_lookup
+
+
+@transaction.atomic
+def locked_reserve_seat(seat_id, duration_minutes=10):
+    # reserve_seat() as it was: lock, check and save in one transaction
+    try:
+        seat = Seat.objects.select_for_update().filter(**seat_lookup(seat_id)).first()
+        if seat.status != 'available' and not (seat.status == 'reserved' and timezone.now() > seat.reserved_until):
+            return {'success': False, 'error': 'Seat is already reserved'}
+        seat.status = 'reserved'
+        seat.reserved_until = timezone.now() + timedelta(minutes=duration_minutes)
+        seat.save()
+        _publish(seat)
+        return {'success': True}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+@transaction.atomic
+def locked_release_seat(seat_id):
+    try:
+        seat = Seat.objects.select_for_update().filter(**seat_lookup(seat_id)).first()
+        if seat.status != 'reserved':
+            return {'success': False, 'error': 'Seat is not reserved'}
+        seat.status = 'available'
+        seat.reserved_until = None
+        seat.save()
+        _publish(seat)
+        return {'success': True}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+STRATEGIES = {
+    'optimistic': (reserve_seat, release_seat),
+    'pessimistic': (locked_reserve_seat, locked_release_seat),
+}
+
+
+def init_worker():
+    settings.SEAT_STORAGE = 'dense'
+    connections.close_all()
+
+
+def run_worker(args):
+    strategy, keys, operations, seed = args
+    reserve, release = STRATEGIES[strategy]
+    random.seed(seed)
+    done = 0
+    errors = {}
+    start = time.perf_counter()
+    for operation in range(operations):
+        key = random.choice(keys)
+        result = reserve(key)
+        if result['success']:
+            result = release(key)
+        if result['success']:
+            done += 1
+        else:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+    return done, errors, time.perf_counter() - start
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    hot_seats = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+
+    departure_date = date.today() + timedelta(days=365)
+    flight = Flight.objects.operating_on(departure_date.weekday()).filter(economy_fare__gt=0).first()
+    numbers = seat_adjacency(seat_map_template(flight).layout, 'economy').numbers[:hot_seats]
+    keys = [seat_key(flight.id, departure_date, number) for number in numbers]
+    departure = dict(flight=flight, departure_date=departure_date)
+    provision_departures([(flight.id, departure_date)])
+    connections.close_all()
+
+    print(f"{workers} workers x {operations} reserve+release cycles on {hot_seats} hot seats ({connections['default'].vendor})")
+    print(f"{'strategy':>12}{'cycles/s':>10}{'done':>7}  errors")
+    try:
+        for strategy in STRATEGIES:
+            with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+                start = time.perf_counter()
+                results = pool.map(run_worker, [(strategy, keys, operations, seed) for seed in range(workers)])
+                elapsed = time.perf_counter() - start
+            done = sum(result[0] for result in results)
+            errors = {}
+            for result in results:
+                for error, count in result[1].items():
+                    errors[error] = errors.get(error, 0) + count
+            print(f"{strategy:>12}{done / elapsed:>10.0f}{done:>7}  {errors or '-'}")
+    finally:
+        Seat.objects.filter(**departure).delete()
+        SeatMapVersion.objects.filter(**departure).delete()
+        SeatAvailability.objects.filter(**departure).delete()
+
+
+if __name__ == "__main__":
+    main()
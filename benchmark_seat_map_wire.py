@@ -0,0 +1,72 @@
+"""
+Benchmark of the seat map API in its two representations.
+
+Books a share of the seats of one economy cabin inside a transaction that is
+rolled back, then requests the whole cabin from get_available_seats() as JSON
+and as the packed seat map (Accept: application/vnd.flight.seatmap+json),
+reporting the response size and the time per request of each.
+
+Run this from the project root using:
+python benchmark_seat_map_wire.py [occupancy percent]
+"""
+
+import os
+import sys
+import random
+import time
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone.settings')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+django.setup()
+
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.test import RequestFactory
+
+from flight.models import Flight
+from flight.seat_assign import seat_adjacency
+from flight.seat_manager import book_seats, seat_key
+from flight.seat_wire import SEAT_MAP_MEDIA_TYPE
+from flight.views import get_available_seats
+
+REQUESTS = 300
+
+
+class Rollback(Exception):
+    pass
+
+
+def time_requests(request):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = get_available_seats(request)
+    return len(response.content), (time.perf_counter() - start) / REQUESTS * 1000
+
+
+def main():
+    occupancy = float(sys.argv[1]) / 100 if len(sys.argv) > 1 else 0.5
+    random.seed(7)
+    departure_date = date.today() + timedelta(days=365)
+    flight = Flight.objects.operating_on(departure_date.weekday()).filter(economy_fare__gt=0).first()
+    numbers = [number for number in seat_adjacency('standard', 'economy').numbers if random.random() < occupancy]
+    params = {'flight_id': flight.id, 'seat_class': 'economy', 'depart_date': f"{departure_date:%d-%m-%Y}"}
+    factory = RequestFactory()
+
+    try:
+        with transaction.atomic():
+            book_seats([seat_key(flight.id, departure_date, number) for number in numbers])
+            print(f"Economy cabin at {occupancy:.0%} occupancy, {REQUESTS} requests each")
+            print(f"{'format':>8}{'bytes':>8}{'ms/request':>12}")
+            for name, headers in (('json', {}), ('packed', {'HTTP_ACCEPT': SEAT_MAP_MEDIA_TYPE})):
+                size, elapsed = time_requests(factory.get('/api/seats/available', params, **headers))
+                print(f"{name:>8}{size:>8}{elapsed:>12.2f}")
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -41,7 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'flight'
+    'flight.apps.FlightConfig'
 ]
 
 MIDDLEWARE = [
@@ -86,6 +86,40 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The flight search cache holds the flight ids of searches made while a
+# worker's schedule index is cold or stale (the schedule version itself is in
+# the database). With several gunicorn workers, a shared backend such as
+# memcached or DatabaseCache (after `createcachetable`) lets them share it.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'flight-default',
+    }
+}
+
+FLIGHT_SEARCH_CACHE = 'default'
+
+# Cache of the rendered seat grids of the seat selection page (flight/seat_grid.py)
+SEAT_GRID_CACHE = 'default'
+
+# Let one request compute a missing search result while identical requests wait for it
+FLIGHT_SEARCH_COALESCE = True
+
+# 'sparse' stores only reserved and booked seats and derives the rest of the seat map
+# from the cabin layout; 'dense' stores every seat of a departure once it is opened
+SEAT_STORAGE = 'sparse'
+
+# Carries seat change events to the live seat map streams of every worker process.
+# DatabaseBackend polls the SeatEvent table; 'flight.seat_events.RedisBackend' (with
+# SEAT_EVENTS_REDIS_URL) pushes them instead, LocalBackend only reaches the same process
+SEAT_EVENTS_BACKEND = 'flight.seat_events.DatabaseBackend'
+SEAT_EVENTS_POLL_INTERVAL = 0.5
+SEAT_EVENTS_RETENTION = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -5,6 +5,7 @@ from .models import *
 # Register your models here.
 
 admin.site.register(Place)
+admin.site.register(MetroArea)
 admin.site.register(Week)
 admin.site.register(Flight)
 admin.site.register(Passenger)
@@ -0,0 +1,104 @@
+"""
+Aircraft cabin layouts and the seat-map templates compiled from them.
+
+A layout lists the cabins of an aircraft type front to back: seat class, the
+rows it spans and its seat letters, with a space for every aisle ("ABC DEF").
+Each layout is compiled once into an immutable SeatMapTemplate that seat
+creation and the seat map views walk instead of parsing seat numbers.
+
+Flight.plane holds the flight number in the bundled data, so flights whose
+plane is not a registered aircraft type use the 'standard' layout.
+"""
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+
+DEFAULT_LAYOUT = 'standard'
+
+CABIN_LAYOUTS = {
+    # Single-aisle configuration every flight used so far; first class sits at the back
+    'standard': (
+        ('economy', range(1, 26), 'ABC DEF'),
+        ('business', range(26, 31), 'AB CD'),
+        ('first', range(31, 34), 'A B'),
+    ),
+    'A320': (
+        ('business', range(1, 4), 'AB CD'),
+        ('economy', range(4, 31), 'ABC DEF'),
+    ),
+    'B737': (
+        ('business', range(1, 5), 'AB CD'),
+        ('economy', range(5, 33), 'ABC DEF'),
+    ),
+    'B787': (
+        ('business', range(1, 8), 'A DG K'),
+        ('economy', range(10, 39), 'ABC DEF GHK'),
+    ),
+    'B777': (
+        ('first', range(1, 3), 'A EF K'),
+        ('business', range(5, 12), 'AB DEFG JK'),
+        ('economy', range(20, 50), 'ABC DEFG HJK'),
+    ),
+}
+
+
+class SeatTemplate(NamedTuple):
+    number: str
+    seat_class: str
+    row: int
+    column: str
+
+
+class CabinTemplate(NamedTuple):
+    seat_class: str
+    column_groups: tuple    # seat letters between aisles, e.g. (('A', 'B', 'C'), ('D', 'E', 'F'))
+    rows: tuple             # (row number, seats of the row) pairs
+    seats: tuple
+
+
+class SeatMapTemplate(NamedTuple):
+    layout: str
+    cabins: MappingProxyType    # seat class -> CabinTemplate, front to back
+    seats: tuple                # every seat, front to back
+    by_number: MappingProxyType
+
+
+@lru_cache(maxsize=None)
+def compile_layout(name):
+    """
+    Seat-map template of a registered layout, compiled on first use
+    """
+    cabins = {}
+    seats = []
+    for seat_class, rows, columns in CABIN_LAYOUTS[name]:
+        column_groups = tuple(tuple(group) for group in columns.split())
+        letters = [letter for group in column_groups for letter in group]
+        cabin_rows = []
+        for row in rows:
+            row_seats = tuple(SeatTemplate(f"{row}{letter}", seat_class, row, letter) for letter in letters)
+            cabin_rows.append((row, row_seats))
+            seats.extend(row_seats)
+        cabin_seats = tuple(seat for _, row_seats in cabin_rows for seat in row_seats)
+        cabins[seat_class] = CabinTemplate(seat_class, column_groups, tuple(cabin_rows), cabin_seats)
+    return SeatMapTemplate(
+        layout=name,
+        cabins=MappingProxyType(cabins),
+        seats=tuple(seats),
+        by_number=MappingProxyType({seat.number: seat for seat in seats}),
+    )
+
+
+def aircraft_layout(plane):
+    """
+    Name of the layout registered for an aircraft type, or DEFAULT_LAYOUT
+    """
+    plane = (plane or '').strip().upper()
+    return plane if plane in CABIN_LAYOUTS else DEFAULT_LAYOUT
+
+
+def seat_map_template(flight):
+    """
+    Compiled seat-map template for the aircraft of a flight
+    """
+    return compile_layout(aircraft_layout(flight.plane))
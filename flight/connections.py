@@ -0,0 +1,239 @@
+"""
+One- and two-stop connection search.
+
+The weekly schedule is turned into a time-expanded graph: every flight becomes
+an event at its minute of the week (Monday 00:00 = 0) at the origin airport.
+Connections are found by jumping from an arrival event to the departures that
+leave inside the allowed layover window, which is a binary search on the
+sorted departure times of the connecting airport.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from itertools import count
+
+from .search_index import FARE_FIELDS, get_fare, get_schedule_index
+
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Minimum connection times, in minutes
+DOMESTIC_MIN_CONNECTION = 60
+INTERNATIONAL_MIN_CONNECTION = 90
+MAX_LAYOVER = 12 * 60
+
+DEFAULT_LIMIT = 10
+DEFAULT_BUDGET_MS = 50
+
+SORT_ORDERS = ('price', 'duration')
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class Timeline:
+    """
+    Flights sorted by departure minute of the week.  The week is stored twice
+    (the second copy shifted by one week) so a window that crosses Sunday
+    midnight is still one contiguous slice.
+    """
+
+    def __init__(self, events):
+        events = sorted(events, key=lambda event: (event[0], event[1].id))
+        events += [(minute + MINUTES_PER_WEEK, flight) for minute, flight in events]
+        self.times = [minute for minute, flight in events]
+        self.flights = [flight for minute, flight in events]
+
+    def window(self, start, end):
+        lo = bisect_left(self.times, start)
+        hi = bisect_right(self.times, end)
+        return zip(self.times[lo:hi], self.flights[lo:hi])
+
+
+class ConnectionGraph:
+    """
+    Departure timelines per airport and per route, built from the schedule index
+    """
+
+    def __init__(self, schedule_index):
+        self.source = schedule_index
+
+        events = {}
+        for (origin, destination, weekday, cabin), flights in schedule_index.items():
+            for flight in flights:
+                if flight.duration is None:
+                    continue
+                minute = weekday * MINUTES_PER_DAY + _minutes(flight.depart_time)
+                events[(flight.id, minute)] = flight
+
+        by_airport = {}
+        by_route = {}
+        self.inbound = {}
+        for (flight_id, minute), flight in events.items():
+            origin, destination = flight.origin.code, flight.destination.code
+            by_airport.setdefault(origin, []).append((minute, flight))
+            by_route.setdefault((origin, destination), []).append((minute, flight))
+            self.inbound.setdefault(destination, set()).add(origin)
+
+        self.departures = {code: Timeline(items) for code, items in by_airport.items()}
+        self.routes = {route: Timeline(items) for route, items in by_route.items()}
+
+
+def get_connection_graph():
+    """
+    Return the graph of this worker, rebuilt whenever the schedule index is rebuilt
+    """
+    global _graph
+    schedule_index = get_schedule_index()
+    graph = _graph
+    if graph is None or graph.source is not schedule_index:
+        with _graph_lock:
+            if _graph is None or _graph.source is not schedule_index:
+                _graph = ConnectionGraph(schedule_index)
+            graph = _graph
+    return graph
+
+
+def min_connection_time(inbound, outbound):
+    """
+    Minimum connection time between two legs: domestic if all three airports
+    are in the same country
+    """
+    countries = {inbound.origin.country, inbound.destination.country, outbound.destination.country}
+    if len(countries) == 1:
+        return DOMESTIC_MIN_CONNECTION
+    return INTERNATIONAL_MIN_CONNECTION
+
+
+def _duration(flight):
+    return int(flight.duration.total_seconds() // 60)
+
+
+def _codes(codes):
+    return {codes} if isinstance(codes, str) else set(codes)
+
+
+def _windows(timelines, start, end):
+    """
+    Departures inside [start, end] on several timelines, in time order
+    """
+    windows = [timeline.window(start, end) for timeline in timelines if timeline is not None]
+    if len(windows) == 1:
+        return windows[0]
+    return heapq.merge(*windows, key=lambda event: event[0])
+
+
+def find_connections(origin_codes, destination_codes, weekday, cabin, max_stops=2,
+                     limit=DEFAULT_LIMIT, sort='price', budget_ms=DEFAULT_BUDGET_MS):
+    """
+    Cheapest (sort='price') or fastest (sort='duration') itineraries with one or
+    two stops leaving origin on the given weekday.  Origin and destination are
+    an airport code or a collection of codes (all airports of a metro area).
+    The search stops once the latency budget is used up and returns the best
+    itineraries found so far.
+    """
+    if cabin not in FARE_FIELDS or sort not in SORT_ORDERS or limit <= 0 or max_stops < 1:
+        return []
+
+    origin_codes = _codes(origin_codes)
+    destination_codes = _codes(destination_codes)
+    endpoints = origin_codes | destination_codes
+    graph = get_connection_graph()
+    first_legs = [graph.departures.get(code) for code in origin_codes]
+    feeders = set()
+    for code in destination_codes:
+        feeders |= graph.inbound.get(code, set())
+    if not any(first_legs) or not feeders:
+        return []
+
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    day_start = weekday * MINUTES_PER_DAY
+    best = []   # heap of the current top `limit`, worst itinerary first
+    tiebreak = count()
+
+    def offer(legs, fare, elapsed):
+        key = (fare, elapsed) if sort == 'price' else (elapsed, fare)
+        entry = (tuple(-x for x in key), next(tiebreak), key, legs, fare, elapsed)
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        elif key < best[0][2]:
+            heapq.heapreplace(best, entry)
+
+    def fare_cutoff():
+        # Fares only add up, so a partial itinerary above this fare cannot make the list;
+        # one at it still can when it is faster than the worst one kept
+        if sort != 'price' or len(best) < limit:
+            return None
+        return best[0][2][0]
+
+    for depart1, leg1 in _windows(first_legs, day_start, day_start + MINUTES_PER_DAY - 1):
+        if time.perf_counter() > deadline:
+            break
+        fare1 = get_fare(leg1, cabin)
+        stop1 = leg1.destination.code
+        if not fare1 or stop1 in endpoints:
+            continue
+        cutoff = fare_cutoff()
+        if cutoff is not None and fare1 > cutoff:
+            continue
+        arrive1 = depart1 + _duration(leg1)
+
+        # One stop: leg1 then a direct flight from the connecting airport
+        final_legs = [graph.routes.get((stop1, code)) for code in destination_codes]
+        for depart2, leg2 in _windows(final_legs, arrive1, arrive1 + MAX_LAYOVER):
+            if depart2 < arrive1 + min_connection_time(leg1, leg2):
+                continue
+            fare2 = get_fare(leg2, cabin)
+            if not fare2:
+                continue
+            arrive2 = depart2 + _duration(leg2)
+            offer(((depart1, leg1), (depart2, leg2)), fare1 + fare2, arrive2 - depart1)
+
+        if max_stops < 2:
+            continue
+
+        # Two stops: only follow legs that land somewhere with a flight to the destination
+        middle_legs = graph.departures.get(stop1)
+        if middle_legs is None:
+            continue
+        for depart2, leg2 in middle_legs.window(arrive1, arrive1 + MAX_LAYOVER):
+            stop2 = leg2.destination.code
+            if stop2 not in feeders or stop2 == stop1 or stop2 in endpoints:
+                continue
+            if depart2 < arrive1 + min_connection_time(leg1, leg2):
+                continue
+            fare2 = get_fare(leg2, cabin)
+            if not fare2:
+                continue
+            cutoff = fare_cutoff()
+            if cutoff is not None and fare1 + fare2 > cutoff:
+                continue
+            arrive2 = depart2 + _duration(leg2)
+            final_legs = [graph.routes.get((stop2, code)) for code in destination_codes]
+            for depart3, leg3 in _windows(final_legs, arrive2, arrive2 + MAX_LAYOVER):
+                if depart3 < arrive2 + min_connection_time(leg2, leg3):
+                    continue
+                fare3 = get_fare(leg3, cabin)
+                if not fare3:
+                    continue
+                arrive3 = depart3 + _duration(leg3)
+                offer(((depart1, leg1), (depart2, leg2), (depart3, leg3)), fare1 + fare2 + fare3, arrive3 - depart1)
+
+    itineraries = []
+    for _, _, _, legs, fare, elapsed in sorted(best, key=lambda entry: (entry[2], entry[1])):
+        itineraries.append({
+            'legs': [
+                {'flight': flight, 'day_offset': (minute - day_start) // MINUTES_PER_DAY}
+                for minute, flight in legs
+            ],
+            'stops': len(legs) - 1,
+            'fare': fare,
+            'duration_minutes': elapsed,
+        })
+    return itineraries
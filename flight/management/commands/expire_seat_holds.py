@@ -0,0 +1,30 @@
+"""
+Worker that releases expired seat holds, so the seat read paths never write.
+
+Run with: python main.py expire_seat_holds [--interval 15] [--batch-size 500] [--once]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from flight.seat_manager import EXPIRY_BATCH_SIZE, cleanup_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release expired seat reservations in batches, every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=15, help="Seconds between sweeps")
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE, help="Holds released per transaction")
+        parser.add_argument('--once', action='store_true', help="Run a single sweep and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            released = cleanup_expired_reservations(batch_size=options['batch_size'])
+            if released or options['once']:
+                self.stdout.write(f"Released {released} expired seat hold(s)")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,94 @@
+"""
+Create the seats of every upcoming departure that has none yet (dense seat
+storage only; with sparse storage available seats are never stored).
+
+Departures are found with one anti-join per date and seeded in chunks, each
+chunk in its own transaction with large bulk INSERTs, optionally spread over
+worker processes.  Seats that exist are skipped, so an interrupted run can
+simply be started again.
+
+Run with: python main.py provision_seats [--days 7] [--start YYYY-MM-DD]
+          [--chunk 50] [--batch-size 2000] [--workers 1]
+"""
+import multiprocessing
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from flight.seat_manager import PROVISION_BATCH_SIZE, provision_departures, sparse_storage, unseeded_departures
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never share the parent's database connection
+    connections.close_all()
+
+
+def _provision_chunk(args):
+    departures, batch_size = args
+    return len(departures), provision_departures(departures, batch_size)
+
+
+class Command(BaseCommand):
+    help = "Create the seats of upcoming departures that have none yet, in chunked bulk transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Number of days to provision")
+        parser.add_argument('--start', help="First departure date (YYYY-MM-DD), today by default")
+        parser.add_argument('--chunk', type=int, default=50, help="Departures per transaction")
+        parser.add_argument('--batch-size', type=int, default=PROVISION_BATCH_SIZE, help="Seat rows per INSERT")
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes")
+
+    def handle(self, *args, **options):
+        if sparse_storage():
+            self.stdout.write("SEAT_STORAGE is 'sparse': available seats are not stored, nothing to provision")
+            return
+        try:
+            start = datetime.strptime(options['start'], "%Y-%m-%d").date() if options['start'] else date.today()
+        except ValueError:
+            raise CommandError("--start must be a date in YYYY-MM-DD form")
+
+        dates = [start + timedelta(days=offset) for offset in range(options['days'])]
+        departures = list(unseeded_departures(dates))
+        chunk = max(options['chunk'], 1)
+        chunks = [(departures[i:i + chunk], options['batch_size']) for i in range(0, len(departures), chunk)]
+        self.stdout.write(f"{len(departures)} departure(s) without seats between {dates[0]} and {dates[-1]}" if dates else "No dates to provision")
+        if not chunks:
+            return
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write("SQLite allows one writer at a time, provisioning without workers")
+            workers = 1
+
+        started = last_report = time.perf_counter()
+        done = seats = 0
+        pool = None
+        if workers > 1:
+            connections.close_all()
+            pool = multiprocessing.Pool(workers, initializer=_init_worker)
+            results = pool.imap_unordered(_provision_chunk, chunks)
+        else:
+            results = map(_provision_chunk, chunks)
+        try:
+            for chunk_departures, chunk_seats in results:
+                done += chunk_departures
+                seats += chunk_seats
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL or done == len(departures):
+                    last_report = now
+                    self.stdout.write(
+                        f"{done}/{len(departures)} departures, {seats} seats, "
+                        f"{seats / max(now - started, 1e-9):,.0f} seats/s"
+                    )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.stdout.write(f"Provisioned {done} departure(s) with {seats} seats in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,21 @@
+"""
+Repair the seat availability counters of departures whose counts drifted
+from their stored seats (e.g. after seats were edited in the admin).
+
+Run with: python main.py reconcile_seat_counters [--check]
+"""
+from django.core.management.base import BaseCommand
+
+from flight.seat_manager import reconcile_seat_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the seat availability counters of departures that drifted from their seats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drifted departures, do not repair them")
+
+    def handle(self, *args, **options):
+        checked, drifted = reconcile_seat_counters(repair=not options['check'])
+        action = "found" if options['check'] else "repaired"
+        self.stdout.write(f"Checked {checked} departure(s), {action} {drifted} with drifted counters")
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.2 on 2026-10-16 22:41
+
+from django.db import migrations, models
+
+
+METRO_AREAS = [
+    ('NYC', 'New York', 'United States', ['JFK', 'LGA', 'EWR']),
+    ('LON', 'London', 'United Kingdom', ['LHR', 'LGW', 'STN']),
+    ('TYO', 'Tokyo', 'Japan', ['NRT', 'HND']),
+    ('SEL', 'Seoul', 'South Korea', ['ICN', 'GMP']),
+    ('MOW', 'Moscow', 'Russia', ['SVO', 'DME']),
+    ('WAS', 'Washington', 'United States', ['DCA', 'BWI']),
+]
+
+
+def add_metro_areas(apps, schema_editor):
+    MetroArea = apps.get_model('flight', 'MetroArea')
+    Place = apps.get_model('flight', 'Place')
+    for code, city, country, airports in METRO_AREAS:
+        metro = MetroArea.objects.create(code=code, city=city, country=country)
+        metro.airports.set(Place.objects.filter(code__in=airports))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0003_auto_20251201_1830'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetroArea',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=3, unique=True)),
+                ('city', models.CharField(max_length=64)),
+                ('country', models.CharField(max_length=64)),
+                ('airports', models.ManyToManyField(related_name='metro_areas', to='flight.Place')),
+            ],
+        ),
+        migrations.RunPython(add_metro_areas, migrations.RunPython.noop),
+    ]
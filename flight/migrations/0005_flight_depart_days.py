@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+def backfill_depart_days(apps, schema_editor):
+    Flight = apps.get_model('flight', 'Flight')
+    masks = {}
+    for flight_id, number in Flight.depart_day.through.objects.values_list('flight_id', 'week__number'):
+        masks[flight_id] = masks.get(flight_id, 0) | (1 << number)
+
+    by_mask = {}
+    for flight_id, mask in masks.items():
+        by_mask.setdefault(mask, []).append(flight_id)
+    for mask, flight_ids in by_mask.items():
+        for i in range(0, len(flight_ids), 500):
+            Flight.objects.filter(id__in=flight_ids[i:i + 500]).update(depart_days=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0004_metroarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='depart_days',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin', 'destination', 'depart_days'], name='flight_flig_origin__e07c5c_idx'),
+        ),
+        migrations.RunPython(backfill_depart_days, migrations.RunPython.noop),
+    ]
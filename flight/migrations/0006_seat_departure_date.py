@@ -0,0 +1,45 @@
+# Generated by Django 3.1.2 on 2026-10-16 22:53
+
+from django.db import migrations, models
+
+
+def date_existing_seats(apps, schema_editor):
+    """
+    Seats sold on a ticket take the ticket's departure date.  Undated seats no
+    one holds are dropped (they are recreated per date on demand); undated
+    booked or reserved seats without a ticket are kept with a null date.
+    """
+    Seat = apps.get_model('flight', 'Seat')
+    Ticket = apps.get_model('flight', 'Ticket')
+    links = Ticket.selected_seats.through.objects.filter(ticket__flight_ddate__isnull=False)
+    for seat_id, departure_date in links.values_list('seat_id', 'ticket__flight_ddate'):
+        Seat.objects.filter(id=seat_id).update(departure_date=departure_date)
+    Seat.objects.filter(departure_date__isnull=True, status='available', tickets__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0005_flight_depart_days'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seat',
+            name='flight_seat_flight__8d5618_idx',
+        ),
+        migrations.AddField(
+            model_name='seat',
+            name='departure_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='seat',
+            unique_together={('flight', 'departure_date', 'seat_number')},
+        ),
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(fields=['flight', 'departure_date', 'status'], name='flight_seat_flight__72d7cc_idx'),
+        ),
+        migrations.RunPython(date_existing_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-16 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0006_seat_departure_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(condition=models.Q(status='reserved'), fields=['reserved_until'], name='seat_hold_deadline_idx'),
+        ),
+    ]
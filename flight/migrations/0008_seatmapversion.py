@@ -0,0 +1,27 @@
+# Generated by Django 3.1.2 on 2026-10-16 23:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0007_seat_hold_deadline_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatMapVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_date', models.DateField()),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('seat_versions', models.JSONField(default=dict)),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_map_versions', to='flight.flight')),
+            ],
+            options={
+                'unique_together': {('flight', 'departure_date')},
+            },
+        ),
+    ]
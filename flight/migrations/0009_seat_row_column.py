@@ -0,0 +1,41 @@
+# Generated by Django 3.1.2 on 2026-10-16 23:07
+
+import re
+
+from django.db import migrations, models
+
+
+def split_seat_numbers(apps, schema_editor):
+    """
+    Fill row and column from the seat number, one UPDATE per distinct seat number
+    """
+    Seat = apps.get_model('flight', 'Seat')
+    for seat_number in Seat.objects.values_list('seat_number', flat=True).distinct():
+        match = re.fullmatch(r'(\d+)([A-Z])', seat_number)
+        if match:
+            Seat.objects.filter(seat_number=seat_number).update(row=int(match.group(1)), column=match.group(2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0008_seatmapversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seat',
+            name='column',
+            field=models.CharField(blank=True, max_length=1),
+        ),
+        migrations.AddField(
+            model_name='seat',
+            name='row',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(fields=['flight', 'departure_date', 'row', 'column'], name='flight_seat_flight__4d89d3_idx'),
+        ),
+        migrations.RunPython(split_seat_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.2 on 2026-10-16 23:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0009_seat_row_column'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatAvailability',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_date', models.DateField()),
+                ('seat_class', models.CharField(choices=[('economy', 'Economy'), ('business', 'Business'), ('first', 'First')], max_length=20)),
+                ('capacity', models.PositiveSmallIntegerField()),
+                ('reserved', models.PositiveSmallIntegerField(default=0)),
+                ('booked', models.PositiveSmallIntegerField(default=0)),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_availability', to='flight.flight')),
+            ],
+            options={
+                'unique_together': {('flight', 'departure_date', 'seat_class')},
+            },
+        ),
+    ]
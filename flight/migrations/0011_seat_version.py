@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0010_seatavailability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seat',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
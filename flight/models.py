@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 
 from datetime import datetime
 
@@ -19,6 +20,16 @@ class Place(models.Model):
         return f"{self.city}, {self.country} ({self.code})"
 
 
+class MetroArea(models.Model):
+    code = models.CharField(max_length=3, unique=True)
+    city = models.CharField(max_length=64)
+    country = models.CharField(max_length=64)
+    airports = models.ManyToManyField(Place, related_name="metro_areas")
+
+    def __str__(self):
+        return f"{self.city}, {self.country} ({self.code}, all airports)"
+
+
 class Week(models.Model):
     number = models.IntegerField()
     name = models.CharField(max_length=16)
@@ -27,11 +38,32 @@ class Week(models.Model):
         return f"{self.name} ({self.number})"
 
 
+def weekday_mask(weekdays):
+    """
+    Bitmask with bit n set for every weekday number n (0 = Monday)
+    """
+    mask = 0
+    for number in weekdays:
+        mask |= 1 << number
+    return mask
+
+
+class FlightQuerySet(models.QuerySet):
+    def operating_on(self, weekday):
+        """
+        Flights that depart on the given weekday, tested on the depart_days mask
+        """
+        return self.annotate(
+            operates=models.F('depart_days').bitand(1 << weekday)
+        ).filter(operates__gt=0)
+
+
 class Flight(models.Model):
     origin = models.ForeignKey(Place, on_delete=models.CASCADE, related_name="departures")
     destination = models.ForeignKey(Place, on_delete=models.CASCADE, related_name="arrivals")
     depart_time = models.TimeField(auto_now=False, auto_now_add=False)
     depart_day = models.ManyToManyField(Week, related_name="flights_of_the_day")
+    depart_days = models.PositiveSmallIntegerField(default=0, editable=False)   # weekday_mask() of depart_day, kept in sync by signals
     duration = models.DurationField(null=True)
     arrival_time = models.TimeField(auto_now=False, auto_now_add=False)
     plane = models.CharField(max_length=24)
@@ -40,6 +72,13 @@ class Flight(models.Model):
     business_fare = models.FloatField(null=True)
     first_fare = models.FloatField(null=True)
 
+    objects = FlightQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['origin', 'destination', 'depart_days']),
+        ]
+
     def __str__(self):
         return f"{self.id}: {self.origin} to {self.destination}"
 
@@ -70,20 +109,90 @@ SEAT_STATUS = (
 
 class Seat(models.Model):
     flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='seats')
+    departure_date = models.DateField(null=True)  # Seats are inventory of one departure; null only on legacy undated rows
     seat_number = models.CharField(max_length=5)  # e.g., '1A', '2B', etc.
+    row = models.PositiveSmallIntegerField(null=True)  # 12 of '12C', so seats sort in cabin order
+    column = models.CharField(max_length=1, blank=True)  # C of '12C'
     seat_class = models.CharField(max_length=20, choices=SEAT_CLASS)
     status = models.CharField(max_length=20, choices=SEAT_STATUS, default='available')
     price = models.FloatField()
     reserved_until = models.DateTimeField(null=True, blank=True)  # Temporary reservation
+    version = models.PositiveIntegerField(default=0)  # Raised by every change, for conditional updates (see seat_manager)
     
     class Meta:
-        unique_together = ['flight', 'seat_number']
+        unique_together = ['flight', 'departure_date', 'seat_number']
         indexes = [
-            models.Index(fields=['flight', 'status']),
+            models.Index(fields=['flight', 'departure_date', 'status']),
+            models.Index(fields=['flight', 'departure_date', 'row', 'column']),
+            # Deadline order of the holds, walked by cleanup_expired_reservations
+            models.Index(fields=['reserved_until'], name='seat_hold_deadline_idx', condition=models.Q(status='reserved')),
         ]
     
+    @property
+    def key(self):
+        """
+        Identifier used by the seat API (see seat_manager.seat_key); the id for legacy undated seats
+        """
+        if self.departure_date is None:
+            return str(self.id)
+        return f"{self.flight_id}-{self.departure_date:%Y%m%d}-{self.seat_number}"
+
+    def __str__(self):
+        return f"{self.flight.id} on {self.departure_date} - Seat {self.seat_number} ({self.seat_class})"
+
+
+class SeatAvailability(models.Model):
+    # Seat counts of a cabin of a departure, recounted with every seat change (see seat_manager.count_seats)
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='seat_availability')
+    departure_date = models.DateField()
+    seat_class = models.CharField(max_length=20, choices=SEAT_CLASS)
+    capacity = models.PositiveSmallIntegerField()
+    reserved = models.PositiveSmallIntegerField(default=0)
+    booked = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['flight', 'departure_date', 'seat_class']
+
+    @property
+    def available(self):
+        # lapsed: holds past their deadline not released yet, when annotated (see seat_manager.seat_availability)
+        held = self.reserved - (getattr(self, 'lapsed', None) or 0)
+        return max(self.capacity - held - self.booked, 0)
+
+    def __str__(self):
+        return f"{self.flight.id} on {self.departure_date} - {self.seat_class}: {self.available} of {self.capacity} available"
+
+
+class SeatMapVersion(models.Model):
+    # Inventory version of a departure, raised by every seat change (see seat_manager.record_seat_changes)
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='seat_map_versions')
+    departure_date = models.DateField()
+    version = models.PositiveIntegerField(default=0)
+    seat_versions = models.JSONField(default=dict)  # seat number -> version of its last change
+
+    class Meta:
+        unique_together = ['flight', 'departure_date']
+
+    def __str__(self):
+        return f"{self.flight.id} on {self.departure_date} - version {self.version}"
+
+
+class ScheduleVersion(models.Model):
+    # One row: raised by every flight schedule change, so every process sees it (see search_cache)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"Schedule version {self.version}"
+
+
+class SeatEvent(models.Model):
+    # Seat change event for the live seat maps of every process (see seat_events.DatabaseBackend)
+    channel = models.CharField(max_length=64)
+    event = models.JSONField(encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
     def __str__(self):
-        return f"{self.flight.id} - Seat {self.seat_number} ({self.seat_class})"
+        return f"Seat event {self.id} on {self.channel}"
 
 
 
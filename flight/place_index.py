@@ -0,0 +1,126 @@
+"""
+In-memory autocomplete index over airports (city, airport name, code, country).
+
+Every 1-, 2- and 3-character substring of a place's searchable text maps to
+the places containing it.  Short queries are a single lookup; longer queries
+intersect their trigrams and confirm the substring, which gives the same
+matches as a plain `q in field` scan without touching the database.  When
+nothing matches, places sharing most of the query's trigrams are returned so
+small typos ("delhy", "mumbia") still find something.
+
+A Place change raises the shared schedule version (search_cache), so every
+worker rebuilds its index at its next query once it sees the new version.
+"""
+import threading
+
+from .models import Place
+from .search_cache import current_version
+
+
+MAX_RESULTS = 10
+TYPO_MIN_SHARED = 0.5   # share of the query trigrams a typo match must contain
+SEPARATOR = '\x00'      # keeps n-grams from spanning two fields
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def _ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class PlaceIndex:
+
+    def __init__(self, places):
+        self.places = []
+        self.grams = {}
+        for place in places:
+            entry = {
+                'code': place.code.lower(),
+                'city': place.city.lower(),
+                'text': SEPARATOR.join(field.lower() for field in (place.city, place.airport, place.code, place.country)),
+                'payload': {'code': place.code, 'city': place.city, 'country': place.country},
+            }
+            position = len(self.places)
+            self.places.append(entry)
+            for n in (1, 2, 3):
+                for gram in _ngrams(entry['text'], n):
+                    if SEPARATOR not in gram:
+                        self.grams.setdefault(gram, set()).add(position)
+
+    def _rank(self, position, q):
+        entry = self.places[position]
+        if entry['code'] == q:
+            group = 0
+        elif entry['code'].startswith(q):
+            group = 1
+        elif entry['city'].startswith(q):
+            group = 2
+        else:
+            group = 3
+        return (group, entry['city'], entry['code'])
+
+    def _substring_matches(self, q):
+        if len(q) <= 3:
+            return self.grams.get(q, set())
+        trigrams = _ngrams(q, 3)
+        candidates = set.intersection(*(self.grams.get(gram, set()) for gram in trigrams))
+        return {position for position in candidates if q in self.places[position]['text']}
+
+    def _typo_matches(self, q):
+        trigrams = _ngrams(q, 3)
+        shared = {}
+        for gram in trigrams:
+            for position in self.grams.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        needed = max(1, TYPO_MIN_SHARED * len(trigrams))
+        scores = {position: hits for position, hits in shared.items() if hits >= needed}
+        return sorted(scores, key=lambda position: (-scores[position], self.places[position]['city']))
+
+    def search(self, q, limit=MAX_RESULTS):
+        q = q.strip().lower()
+        if not q:
+            return []
+        matches = self._substring_matches(q)
+        if matches:
+            ordered = sorted(matches, key=lambda position: self._rank(position, q))
+        elif len(q) >= 4:
+            ordered = self._typo_matches(q)
+        else:
+            ordered = []
+        return [self.places[position]['payload'] for position in ordered[:limit]]
+
+
+def get_place_index():
+    """
+    Return the autocomplete index of this worker, building it on first use
+    and again whenever the shared schedule version has moved on
+    """
+    global _index, _index_version
+    version = current_version()
+    index = _index
+    if index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = PlaceIndex(Place.objects.all())
+                _index_version = version
+            index = _index
+    return index
+
+
+def invalidate_place_index(**kwargs):
+    """
+    Drop the index of this worker so the next query rebuilds it (used as a
+    signal receiver; other workers follow the version bump of the change)
+    """
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def search_places(q, limit=MAX_RESULTS):
+    """
+    Places matching q, exact airport code first, at most `limit` results
+    """
+    return get_place_index().search(q, limit)
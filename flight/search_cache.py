@@ -0,0 +1,150 @@
+"""
+Search result cache for workers whose schedule index is not current.
+
+A worker with a current schedule index answers from it directly, which is
+faster than any cache.  A worker that is cold (just started) or stale (the
+schedule changed) looks in the Django cache named by
+settings.FLIGHT_SEARCH_CACHE for the flight ids of the search, so popular
+searches are answered with one query while the index is rebuilt; only a
+miss builds the index.
+
+The schedule version is kept in the database (ScheduleVersion), so a Flight
+change or a bulk script finishing in any process retires the cached ids and
+tells every worker to rebuild its index, whatever the cache backend.  Workers
+re-read it at most every VERSION_CHECK_INTERVAL seconds.
+
+Concurrent misses for the same key are coalesced: one request computes the
+result while the others, in this worker or in other workers sharing the
+cache, wait for it.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import ScheduleVersion
+
+from .single_flight import SingleFlight
+
+
+HITS_KEY = 'flight-search:hits'
+MISSES_KEY = 'flight-search:misses'
+COALESCED_KEY = 'flight-search:coalesced'
+TIMEOUT = 60 * 60
+VERSION_CHECK_INTERVAL = 1.0
+
+_local = threading.local()
+_single_flight = SingleFlight()
+_version = (None, 0.0)     # (schedule version, time it was read)
+
+
+def get_cache():
+    return caches[getattr(settings, 'FLIGHT_SEARCH_CACHE', 'default')]
+
+
+def current_version():
+    """
+    Schedule version shared by all processes, read from the database at most
+    every VERSION_CHECK_INTERVAL seconds
+    """
+    global _version
+    version, read_at = _version
+    now = time.monotonic()
+    if version is None or now - read_at >= VERSION_CHECK_INTERVAL:
+        version = ScheduleVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+        if version is None:
+            version = ScheduleVersion.objects.get_or_create(pk=1)[0].version
+        _version = (version, now)
+    return version
+
+
+def bump_version():
+    """
+    Retire every cached result and every worker's index, unless a bulk_update() block is running
+    """
+    global _version
+    if getattr(_local, 'bulk', 0):
+        _local.changed = True
+        return
+    if not ScheduleVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        ScheduleVersion.objects.get_or_create(pk=1, defaults={'version': 2})
+    _version = (None, 0.0)
+
+
+@contextmanager
+def bulk_update():
+    """
+    Group many Flight writes (fare scripts, data loaders) into one invalidation at the end
+    """
+    _local.bulk = getattr(_local, 'bulk', 0) + 1
+    try:
+        yield
+    finally:
+        _local.bulk -= 1
+        if not _local.bulk and getattr(_local, 'changed', False):
+            _local.changed = False
+            bump_version()
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def search_key(origin_codes, destination_codes, weekday, cabin, version):
+    return 'flight-search:{}:{}:{}:{}:{}'.format(
+        version, ','.join(sorted(origin_codes)), ','.join(sorted(destination_codes)), weekday, cabin
+    )
+
+
+def cached_search(origin_codes, destination_codes, weekday, cabin, version, compute):
+    """
+    Flight ids computed by compute() for a (route, weekday, cabin) at a
+    schedule version, from the cache when possible
+    """
+    cache = get_cache()
+    key = search_key(origin_codes, destination_codes, weekday, cabin, version)
+    ids = cache.get(key)
+    if ids is not None:
+        _count(HITS_KEY)
+        return ids
+
+    def compute_and_store():
+        result = compute()
+        cache.set(key, result, TIMEOUT)
+        return result
+
+    if not getattr(settings, 'FLIGHT_SEARCH_COALESCE', True):
+        _count(MISSES_KEY)
+        return compute_and_store()
+
+    ids, shared = _single_flight.do(key, compute_and_store, cache)
+    _count(COALESCED_KEY if shared else MISSES_KEY)
+    return ids
+
+
+def search_cache_stats():
+    """
+    Hit, miss and coalesced counters of the searches that could not use a
+    current index, summed over the workers sharing the cache.  A coalesced
+    request missed the cache but waited for another request's result.
+    """
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    coalesced = cache.get(COALESCED_KEY, 0)
+    total = hits + misses + coalesced
+    return {
+        'version': current_version(),
+        'hits': hits,
+        'misses': misses,
+        'coalesced': coalesced,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,115 @@
+"""
+Server-side filtering, sorting and keyset pagination of search results.
+
+Filters and sort orders mirror the controls of the search page: departure and
+arrival time slots (hours, end exclusive), airline, maximum price and the
+Depart / Arrive / Price / Duration sort headers.  Pages are addressed by a
+cursor holding the sort key of the last flight already shown, so "load more"
+keeps working when earlier pages would shift.
+"""
+import math
+from bisect import bisect_right
+
+from .search_index import get_fare
+
+
+PAGE_SIZE = 20
+SORT_ORDERS = ('price', 'depart', 'arrive', 'duration')
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _hour_range(params, name, suffix):
+    start = params.get(f'{name}_from{suffix}')
+    end = params.get(f'{name}_to{suffix}')
+    if start in (None, '') or end in (None, ''):
+        return None
+    return int(start), int(end)
+
+
+def parse_filters(params, suffix=''):
+    """
+    Read the filters of one leg from request parameters.  The return leg of a
+    round trip uses the same names with suffix '2' (depart_from2, sort2, ...).
+    Raises ValueError on malformed numbers or cursors.
+    """
+    max_price = params.get(f'max_price{suffix}')
+    sort = params.get(f'sort{suffix}') or 'price'
+    sort = sort if sort in SORT_ORDERS else 'price'
+    after = params.get(f'after{suffix}')
+    return {
+        'depart': _hour_range(params, 'depart', suffix),
+        'arrive': _hour_range(params, 'arrive', suffix),
+        'airline': params.get(f'airline{suffix}') or None,
+        'max_price': float(max_price) if max_price else None,
+        'sort': sort,
+        'after': decode_cursor(after, sort) if after else None,
+    }
+
+
+def apply_filters(flights, cabin, filters):
+    """
+    Flights passing every filter, in their original order
+    """
+    depart, arrive = filters['depart'], filters['arrive']
+    airline, max_price = filters['airline'], filters['max_price']
+    result = []
+    for flight in flights:
+        if depart and not depart[0] <= flight.depart_time.hour < depart[1]:
+            continue
+        if arrive and not arrive[0] <= flight.arrival_time.hour < arrive[1]:
+            continue
+        if airline and flight.airline != airline:
+            continue
+        if max_price is not None and get_fare(flight, cabin) > max_price:
+            continue
+        result.append(flight)
+    return result
+
+
+def sort_key(sort, cabin):
+    """
+    Key function for a sort order; always ends with the flight id so keys are unique
+    """
+    if sort == 'depart':
+        return lambda flight: (_minutes(flight.depart_time), get_fare(flight, cabin), flight.id)
+    if sort == 'arrive':
+        return lambda flight: (_minutes(flight.arrival_time), get_fare(flight, cabin), flight.id)
+    if sort == 'duration':
+        return lambda flight: (flight.duration.total_seconds() if flight.duration else 0, get_fare(flight, cabin), flight.id)
+    return lambda flight: (get_fare(flight, cabin), flight.id)
+
+
+def encode_cursor(key):
+    return '_'.join(repr(value) for value in key)
+
+
+def decode_cursor(cursor, sort):
+    """
+    Sort key held by a cursor.  Raises ValueError unless it is a key of the sort order.
+    """
+    key = tuple(float(value) for value in cursor.split('_'))
+    if len(key) != (2 if sort == 'price' else 3) or not all(math.isfinite(value) for value in key):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return key
+
+
+def paginate(flights, cabin, sort, after=None, page_size=PAGE_SIZE):
+    """
+    One page of flights in sort order, starting after the sort key of a
+    decoded cursor.  Returns the page and the cursor of the next page (None on the last page).
+    """
+    key = sort_key(sort, cabin)
+    if sort != 'price':
+        # The schedule index is already in price order
+        flights = sorted(flights, key=key)
+    start = 0
+    if after:
+        keys = [key(flight) for flight in flights]
+        start = bisect_right(keys, after)
+    page = list(flights[start:start + page_size])
+    if start + page_size >= len(flights) or not page:
+        return page, None
+    return page, encode_cursor(key(page[-1]))
@@ -0,0 +1,170 @@
+"""
+Process-local schedule index used by the flight search.
+
+Every worker builds the index once, on the first search, and keeps it until a
+Flight (or its operating days) changes.  A search is then a dictionary lookup
+keyed by (origin code, destination code, weekday, cabin) that returns the
+flights already sorted by the fare of that cabin.
+
+Changes are tracked through the schedule version of search_cache, so a
+worker also rebuilds when another worker or a bulk script changed flights;
+until it has, its searches go through the search result cache.
+"""
+import heapq
+import threading
+from collections import defaultdict
+
+from .models import Flight
+from .search_cache import bump_version, cached_search, current_version
+
+
+FARE_FIELDS = {
+    'economy': 'economy_fare',
+    'business': 'business_fare',
+    'first': 'first_fare',
+}
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+_weekday_fares = {}
+
+
+def get_fare(flight, cabin):
+    """
+    Fare of a flight for the given cabin ('economy', 'business' or 'first')
+    """
+    return getattr(flight, FARE_FIELDS[cabin])
+
+
+def build_schedule_index():
+    """
+    Load every flight once and group it by route, weekday and cabin.
+    Flights without a fare for a cabin are left out of that cabin.
+    """
+    index = defaultdict(list)
+
+    for flight in Flight.objects.select_related('origin', 'destination').exclude(depart_days=0):
+        for weekday in range(7):
+            if not flight.depart_days & (1 << weekday):
+                continue
+            for cabin in FARE_FIELDS:
+                fare = get_fare(flight, cabin)
+                if not fare:
+                    continue
+                key = (flight.origin.code, flight.destination.code, weekday, cabin)
+                index[key].append(flight)
+
+    for (origin, destination, weekday, cabin), route_flights in index.items():
+        route_flights.sort(key=lambda flight: (get_fare(flight, cabin), flight.id))
+
+    return {key: tuple(route_flights) for key, route_flights in index.items()}
+
+
+def current_schedule_index(version):
+    """
+    The index of this worker if it was built at the schedule version, else None
+    """
+    index = _index
+    return index if index is not None and _index_version == version else None
+
+
+def get_schedule_index(version=None):
+    """
+    Return the index of this worker, building it on first use and again
+    whenever the shared schedule version has moved on
+    """
+    global _index, _index_version
+    if version is None:
+        version = current_version()
+    index = _index
+    if index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _weekday_fares.clear()
+                _index = build_schedule_index()
+                _index_version = version
+            index = _index
+    return index
+
+
+def invalidate_schedule_index(**kwargs):
+    """
+    Drop the index and retire cached results in every worker (used as a signal receiver)
+    """
+    global _index
+    with _index_lock:
+        _index = None
+        _weekday_fares.clear()
+    bump_version()
+
+
+def find_flights(origin_code, destination_code, weekday, cabin):
+    """
+    Flights from origin to destination on a weekday (0 = Monday), cheapest first
+    """
+    return get_schedule_index().get((origin_code, destination_code, weekday, cabin), ())
+
+
+def find_flights_between(origin_codes, destination_codes, weekday, cabin):
+    """
+    Flights between any of the origin airports and any of the destination
+    airports (e.g. all airports of two metro areas), merged cheapest first.
+    Served from the index when it is current, else from the search result cache.
+    """
+    def merge_routes(index):
+        routes = [
+            index.get((origin, destination, weekday, cabin), ())
+            for origin in origin_codes
+            for destination in destination_codes
+            if origin != destination
+        ]
+        routes = [flights for flights in routes if flights]
+        if len(routes) == 1:
+            return routes[0]
+        return tuple(heapq.merge(*routes, key=lambda flight: (get_fare(flight, cabin), flight.id)))
+
+    version = current_version()
+    index = current_schedule_index(version)
+    if index is not None:
+        return merge_routes(index)
+
+    ids = cached_search(
+        origin_codes, destination_codes, weekday, cabin, version,
+        lambda: [flight.id for flight in merge_routes(get_schedule_index(version))]
+    )
+    index = current_schedule_index(version)
+    if index is not None:
+        # Built by this request
+        return merge_routes(index)
+    flights = Flight.objects.select_related('origin', 'destination').in_bulk(ids)
+    return tuple(flights[flight_id] for flight_id in ids if flight_id in flights)
+
+
+def weekday_min_fares(origin_codes, destination_codes, cabin):
+    """
+    Cheapest fare between the airports for each weekday (index 0 = Monday),
+    None where nothing flies.  Cached per route until the schedule changes.
+    """
+    key = (tuple(sorted(origin_codes)), tuple(sorted(destination_codes)), cabin)
+    index = get_schedule_index()
+    fares = _weekday_fares.get(key)
+    if fares is None:
+        fares = []
+        for weekday in range(7):
+            cheapest = [
+                get_fare(flights[0], cabin)
+                for flights in (
+                    index.get((origin, destination, weekday, cabin), ())
+                    for origin in key[0] for destination in key[1]
+                    if origin != destination
+                )
+                if flights
+            ]
+            fares.append(min(cheapest) if cheapest else None)
+        fares = tuple(fares)
+        with _index_lock:
+            # Only while the index they were computed from is still the current one
+            if _index is index:
+                _weekday_fares[key] = fares
+    return fares
@@ -0,0 +1,119 @@
+"""
+NDJSON flight search stream for the JSON API.
+
+Direct flights are read straight from the database as value rows through a
+server-side iterator, so each line is written as soon as its chunk arrives
+and no model instance or full result list is built, however many airports
+a metro area search spans.  Connecting itineraries follow, one line each,
+from the connection search (which is bounded by its limit).
+
+Every line is a JSON object with a "type": "flight" or "connection", then a
+closing "end" line with the counts, or an "error" line if the stream fails.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .connections import DEFAULT_LIMIT, find_connections
+from .models import Flight
+from .search_index import FARE_FIELDS, get_fare
+
+
+CHUNK_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+FLIGHT_FIELDS = (
+    'id', 'airline', 'plane', 'origin__code', 'destination__code',
+    'depart_time', 'arrival_time', 'duration',
+)
+
+
+def ndjson_line(data):
+    return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+def _clock(value):
+    return value.strftime("%H:%M") if value else None
+
+
+def _minutes(duration):
+    return int(duration.total_seconds() // 60) if duration else None
+
+
+def direct_flight_rows(origin_codes, destination_codes, weekday, cabin):
+    """
+    Value rows of the direct flights on a weekday, cheapest first, streamed from the database
+    """
+    fare_field = FARE_FIELDS[cabin]
+    return (
+        Flight.objects.operating_on(weekday)
+        .filter(origin__code__in=origin_codes, destination__code__in=destination_codes, **{f'{fare_field}__gt': 0})
+        .order_by(fare_field, 'id')
+        .values(*FLIGHT_FIELDS, fare=F(fare_field))
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def flight_line(row, depart_date):
+    return {
+        'type': 'flight',
+        'flight_id': row['id'],
+        'airline': row['airline'],
+        'plane': row['plane'],
+        'origin': row['origin__code'],
+        'destination': row['destination__code'],
+        'date': depart_date,
+        'depart_time': _clock(row['depart_time']),
+        'arrival_time': _clock(row['arrival_time']),
+        'duration_minutes': _minutes(row['duration']),
+        'fare': row['fare'],
+    }
+
+
+def connection_line(itinerary, depart_date, cabin):
+    return {
+        'type': 'connection',
+        'stops': itinerary['stops'],
+        'fare': itinerary['fare'],
+        'duration_minutes': itinerary['duration_minutes'],
+        'legs': [{
+            'flight_id': leg['flight'].id,
+            'airline': leg['flight'].airline,
+            'plane': leg['flight'].plane,
+            'origin': leg['flight'].origin.code,
+            'destination': leg['flight'].destination.code,
+            'date': depart_date + timedelta(days=leg['day_offset']),
+            'depart_time': _clock(leg['flight'].depart_time),
+            'arrival_time': _clock(leg['flight'].arrival_time),
+            'fare': get_fare(leg['flight'], cabin),
+        } for leg in itinerary['legs']],
+    }
+
+
+def stream_search(origin_codes, destination_codes, depart_date, cabin, max_stops=0, limit=DEFAULT_LIMIT):
+    """
+    Generate the NDJSON lines of a search: direct flights, then (with max_stops > 0)
+    connecting itineraries of up to max_stops stops
+    """
+    weekday = depart_date.weekday()
+    counts = {'flights': 0, 'connections': 0}
+    try:
+        for row in direct_flight_rows(origin_codes, destination_codes, weekday, cabin):
+            counts['flights'] += 1
+            yield ndjson_line(flight_line(row, depart_date))
+
+        if max_stops > 0:
+            itineraries = find_connections(origin_codes, destination_codes, weekday, cabin, max_stops=max_stops, limit=limit)
+            for itinerary in itineraries:
+                counts['connections'] += 1
+                yield ndjson_line(connection_line(itinerary, depart_date, cabin))
+    except Exception:
+        # The details stay in the log, the client only learns that the search broke off
+        logger.exception("Flight search stream failed")
+        yield ndjson_line({'type': 'error', 'error': 'Search failed'})
+        return
+    yield ndjson_line(dict(counts, type='end'))
@@ -0,0 +1,171 @@
+"""
+Best-available seat assignment for a party booking together.
+
+Every cabin template is compiled once into a SeatAdjacency: a bit per seat
+(in cabin order) and, per party size and seat preference, the candidate
+blocks of that size as bitmasks, best first:
+
+  1. side by side in one row, no aisle between
+  2. one row, across an aisle
+  3. two rows next to each other, in the same columns
+
+The free seats of a departure are read into one integer bitmap, so finding a
+block is a scan of precomputed masks (free & mask == mask) that stops at the
+first fit.  When no block fits, the party gets the free seats spanning the
+fewest rows.  The chosen seats are claimed together with reserve_seats().
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.utils import timezone
+
+from .cabin_layouts import compile_layout, seat_map_template
+from .models import Seat
+from .seat_manager import hold_expired, reserve_seats, seat_key, seat_price
+
+
+MAX_PARTY_SIZE = 9
+PREFERENCES = ('window', 'aisle')
+# Fresh searches after the chosen block was taken by a concurrent booking
+ASSIGN_ATTEMPTS = 3
+
+
+class SeatAdjacency(NamedTuple):
+    numbers: tuple      # seat numbers, bit i is numbers[i]
+    bits: dict          # seat number -> bit
+    rows: tuple         # (seat bits of a row, front to back, aisles marked by None)
+    window: int         # mask of window seats
+    aisle: int          # mask of aisle seats
+
+
+@lru_cache(maxsize=None)
+def seat_adjacency(layout, seat_class):
+    """
+    Adjacency structure of a cabin of a registered layout, or None when the layout has no such cabin
+    """
+    cabin = compile_layout(layout).cabins.get(seat_class)
+    if cabin is None:
+        return None
+    numbers = tuple(seat.number for seat in cabin.seats)
+    bits = {number: 1 << index for index, number in enumerate(numbers)}
+    rows = []
+    window = aisle = 0
+    for row, row_seats in cabin.rows:
+        by_column = {seat.column: bits[seat.number] for seat in row_seats}
+        row_bits = []
+        for group_index, group in enumerate(cabin.column_groups):
+            if group_index:
+                # The seats either side of the aisle
+                aisle |= row_bits[-1] | by_column[group[0]]
+                row_bits.append(None)
+            row_bits.extend(by_column[column] for column in group)
+        window |= row_bits[0] | row_bits[-1]
+        rows.append(tuple(row_bits))
+    return SeatAdjacency(numbers, bits, tuple(rows), window, aisle)
+
+
+def _runs(row_bits, size, across_aisles):
+    """
+    Masks of size seats next to each other in a row, with their first seat position
+    """
+    seats = [(position, bit) for position, bit in enumerate(row_bits) if bit is not None]
+    for start in range(len(seats) - size + 1):
+        window = seats[start:start + size]
+        crosses = window[-1][0] - window[0][0] != size - 1
+        if crosses == across_aisles:
+            yield window[0][0], sum(bit for _, bit in window)
+
+
+@lru_cache(maxsize=None)
+def candidate_blocks(layout, seat_class, size, preference=None):
+    """
+    Bitmasks of the blocks of size seats of a cabin, best first.  Within a
+    tier, blocks with a seat of the preferred kind come first, then front to back.
+    """
+    adjacency = seat_adjacency(layout, seat_class)
+    if adjacency is None:
+        return ()
+    tiers = ([], [], [])
+    for row_bits in adjacency.rows:
+        tiers[0].extend(mask for _, mask in _runs(row_bits, size, across_aisles=False))
+        tiers[1].extend(mask for _, mask in _runs(row_bits, size, across_aisles=True))
+    if size > 1:
+        front_size = (size + 1) // 2
+        for front_row, back_row in zip(adjacency.rows, adjacency.rows[1:]):
+            back_runs = dict(_runs(back_row, size - front_size, across_aisles=False))
+            for position, mask in _runs(front_row, front_size, across_aisles=False):
+                if position in back_runs:
+                    tiers[2].append(mask | back_runs[position])
+
+    preferred = getattr(adjacency, preference) if preference in PREFERENCES else 0
+    blocks = []
+    for tier in tiers:
+        # Stable sort keeps front-to-back order within the preferred and other blocks
+        blocks.extend(sorted(tier, key=lambda mask: not mask & preferred))
+    return tuple(blocks)
+
+
+def free_seat_bitmap(flight, departure_date, seat_class, adjacency):
+    """
+    Bitmap of the seats of a cabin that can be reserved now (expired holds count as free)
+    """
+    free = (1 << len(adjacency.numbers)) - 1
+    now = timezone.now()
+    taken = Seat.objects.filter(
+        flight=flight, departure_date=departure_date, seat_class=seat_class
+    ).exclude(status='available').only('seat_number', 'status', 'reserved_until')
+    for seat in taken:
+        if not hold_expired(seat, now):
+            free &= ~adjacency.bits.get(seat.seat_number, 0)
+    return free
+
+
+def find_block(adjacency, free, blocks, size):
+    """
+    Seat numbers of the best free block, or the free seats spanning the fewest
+    rows when no block fits; None when fewer than size seats are free
+    """
+    for mask in blocks:
+        if free & mask == mask:
+            return [number for number in adjacency.numbers if adjacency.bits[number] & mask]
+
+    # Scattered: the window of consecutive rows with enough free seats spanning the fewest rows
+    row_free = [[bit for bit in row_bits if bit is not None and free & bit] for row_bits in adjacency.rows]
+    best = None
+    for start in range(len(row_free)):
+        chosen = []
+        for end in range(start, len(row_free)):
+            chosen.extend(row_free[end])
+            if len(chosen) >= size:
+                if best is None or end - start < best[0]:
+                    best = (end - start, chosen[:size])
+                break
+    if best is None:
+        return None
+    mask = sum(best[1])
+    return [number for number in adjacency.numbers if adjacency.bits[number] & mask]
+
+
+def auto_assign_seats(flight, departure_date, seat_class, party_size, preference=None, duration_minutes=10):
+    """
+    Find the best block of party_size seats of a cabin and reserve it as a group
+    """
+    if not 1 <= party_size <= MAX_PARTY_SIZE:
+        return {'success': False, 'error': f'Party size must be between 1 and {MAX_PARTY_SIZE}'}
+    if not flight.depart_days & (1 << departure_date.weekday()):
+        return {'success': False, 'error': 'Flight does not operate on this date'}
+    layout = seat_map_template(flight).layout
+    adjacency = seat_adjacency(layout, seat_class)
+    if adjacency is None or seat_price(flight, seat_class) is None:
+        return {'success': False, 'error': 'Seat class not available'}
+    blocks = candidate_blocks(layout, seat_class, party_size, preference)
+
+    for attempt in range(ASSIGN_ATTEMPTS):
+        numbers = find_block(adjacency, free_seat_bitmap(flight, departure_date, seat_class, adjacency), blocks, party_size)
+        if numbers is None:
+            return {'success': False, 'error': 'Not enough seats available'}
+        result = reserve_seats([seat_key(flight.id, departure_date, number) for number in numbers], duration_minutes)
+        if result['success']:
+            result['seat_numbers'] = numbers
+            return result
+    return result
@@ -0,0 +1,236 @@
+"""
+Seat change events for the real-time seat map.
+
+seat_manager publishes every seat change once its transaction commits.  The
+configured backend (settings.SEAT_EVENTS_BACKEND) carries it to every worker
+process, where the broker hands it to the seat map streams subscribed to that
+departure.  DatabaseBackend (the default) fans out across processes through
+the SeatEvent table, RedisBackend through Redis pub/sub; LocalBackend only
+reaches streams of the publishing process.  A process starts receiving events
+from other processes once a stream calls listen() on the backend.
+
+An event is {'version': ..., 'seats': [{'id', 'number', 'status',
+'reserved_until'}, ...]} for the seats of one departure (flight and date)
+changed together; version is the departure's inventory version after the
+change (see seat_manager.seat_map_changes()).
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import SeatEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+def departure_channel(flight_id, departure_date):
+    return f"{flight_id}:{departure_date:%Y%m%d}"
+
+
+class SeatEventBroker:
+    """
+    In-process fan-out of events to the subscribers of a channel
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel, callback):
+        """
+        Call callback(event) for every event on the channel; returns a function that unsubscribes
+        """
+        with self._lock:
+            self._subscribers[channel].add(callback)
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers[channel].discard(callback)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+        return unsubscribe
+
+    def deliver(self, channel, event):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(event)
+
+
+class LocalBackend:
+    """
+    Delivers events to the subscribers of this process only (single worker, development)
+    """
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def listen(self):
+        pass
+
+
+class DatabaseBackend:
+    """
+    Delivers events to the subscribers of every process through the SeatEvent
+    table, which a thread of every listening process polls every
+    settings.SEAT_EVENTS_POLL_INTERVAL seconds.  Needs nothing but the
+    database.  Events older than settings.SEAT_EVENTS_RETENTION seconds are
+    deleted as new ones come in.
+    """
+    # Events committed out of id order are still picked up this long after they were written
+    COMMIT_LAG = timedelta(seconds=5)
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.interval = getattr(settings, 'SEAT_EVENTS_POLL_INTERVAL', 0.5)
+        self.retention = timedelta(seconds=getattr(settings, 'SEAT_EVENTS_RETENTION', 300))
+        self.last_id = 0
+        self.recent = {}
+        self.pruned_at = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event):
+        SeatEvent.objects.create(channel=channel, event=event)
+        if self.pruned_at is None or time.monotonic() - self.pruned_at > self.PRUNE_INTERVAL:
+            self.pruned_at = time.monotonic()
+            SeatEvent.objects.filter(created__lt=timezone.now() - self.retention).delete()
+
+    def listen(self):
+        with self.lock:
+            if self.thread is None:
+                # Events written before this process listened are not delivered
+                self.last_id = SeatEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+                self.recent = dict(
+                    SeatEvent.objects.filter(created__gte=timezone.now() - self.COMMIT_LAG).values_list('id', 'created')
+                )
+                self.thread = threading.Thread(target=self._run, name='seat-events', daemon=True)
+                self.thread.start()
+
+    def receive(self):
+        """
+        Deliver the events written since the last call.  Ids are handed out
+        before commit, so the recent window is read again and the ids already
+        delivered are skipped.
+        """
+        window_start = timezone.now() - self.COMMIT_LAG
+        events = SeatEvent.objects.filter(Q(id__gt=self.last_id) | Q(created__gte=window_start)).order_by('id')
+        for seat_event in events:
+            if seat_event.id in self.recent:
+                continue
+            self.recent[seat_event.id] = seat_event.created
+            self.last_id = max(self.last_id, seat_event.id)
+            self.deliver(seat_event.channel, seat_event.event)
+        self.recent = {event_id: created for event_id, created in self.recent.items() if created >= window_start}
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.receive()
+            except Exception:
+                logger.exception("Reading seat events failed")
+                # Reconnect at the next poll
+                connection.close()
+
+
+class RedisBackend:
+    """
+    Delivers events to the subscribers of every process through Redis pub/sub
+    (settings.SEAT_EVENTS_REDIS_URL; needs the redis package)
+    """
+    prefix = 'seat-events:'
+
+    def __init__(self, deliver):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBackend for seat events requires the redis package")
+        self.client = redis.Redis.from_url(getattr(settings, 'SEAT_EVENTS_REDIS_URL', 'redis://localhost:6379/0'))
+        self.deliver = deliver
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event):
+        self.client.publish(f'{self.prefix}{channel}', json.dumps(event, cls=DjangoJSONEncoder))
+
+    def listen(self):
+        with self.lock:
+            if self.thread is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{f'{self.prefix}*': self.on_message})
+                self.thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def on_message(self, message):
+        channel = message['channel'].decode()[len(self.prefix):]
+        self.deliver(channel, json.loads(message['data']))
+
+
+broker = SeatEventBroker()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(settings, 'SEAT_EVENTS_BACKEND', 'flight.seat_events.DatabaseBackend'))
+                _backend = backend_class(broker.deliver)
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting.startswith('SEAT_EVENTS_'):
+        _backend = None
+
+
+def publish_seat_changes(changes, versions):
+    """
+    Publish seat changes once the current transaction commits.  changes are
+    (flight_id, departure_date, seat_number, status, reserved_until) tuples,
+    versions the inventory version of each (flight_id, departure_date) after
+    them; undated legacy seats are skipped.
+    """
+    from .seat_manager import seat_key
+
+    events = defaultdict(list)
+    for flight_id, departure_date, seat_number, status, reserved_until in changes:
+        if departure_date is None:
+            continue
+        events[(flight_id, departure_date)].append({
+            'id': seat_key(flight_id, departure_date, seat_number),
+            'number': seat_number,
+            'status': status,
+            'reserved_until': reserved_until,
+        })
+
+    def publish():
+        backend = get_backend()
+        for (flight_id, departure_date), seats in events.items():
+            event = {'version': versions[(flight_id, departure_date)], 'seats': seats}
+            backend.publish(departure_channel(flight_id, departure_date), event)
+
+    if events:
+        transaction.on_commit(publish)
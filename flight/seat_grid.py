@@ -0,0 +1,72 @@
+"""
+Rendered seat grid of the seat selection page, cached per cabin of a departure.
+
+The grid (flight/seat_grid.html) is stored in the Django cache named by
+settings.SEAT_GRID_CACHE under a key that embeds the cabin's inventory
+version from seat_map_changes().  seat_manager raises that version with every
+seat change it records, so a change retires the cached grid without anything
+being deleted, and a page view of an unchanged cabin costs one version read
+and a cache get.  Holds expire without a seat change, so a grid showing one
+is cached no longer than the earliest hold lasts, and is stored with the
+holds it shows (cabin_holds()) for the seat map ETag of the page.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .models import Seat
+from .seat_manager import cabin_column_groups, cabin_holds, departure_seats, seat_map_changes, seat_price
+
+
+TIMEOUT = 60 * 60
+
+
+def get_cache():
+    return caches[getattr(settings, 'SEAT_GRID_CACHE', 'default')]
+
+
+def grid_key(flight, departure_date, seat_class, version):
+    # The cabin price is part of the key: a fare change is no seat change
+    return 'seat-grid:{}:{:%Y%m%d}:{}:{}:{}'.format(
+        flight.id, departure_date, seat_class, version, seat_price(flight, seat_class)
+    )
+
+
+def render_seat_grid(flight, departure_date, seat_class):
+    """
+    (rendered seat grid, its cabin_holds(), seconds it stays right) of a cabin of a departure
+    """
+    column_groups = cabin_column_groups(flight, seat_class)
+    now = timezone.now()
+    stored = list(Seat.objects.filter(flight=flight, departure_date=departure_date, seat_class=seat_class))
+    holds = cabin_holds(flight, departure_date, seat_class, now, stored)
+    timeout = TIMEOUT
+    if holds[0] is not None:
+        timeout = min(timeout, max(int((holds[0] - now).total_seconds()), 1))
+    rows = {}
+    for seat in departure_seats(flight, departure_date, seat_class, stored):
+        rows.setdefault(seat['row'], {})[seat['column']] = seat
+    rows = [
+        (row, [[seats[column] for column in group if column in seats] for group in column_groups])
+        for row, seats in rows.items()
+    ]
+    return render_to_string('flight/seat_grid.html', {'rows': rows}), holds, timeout
+
+
+def seat_grid(flight, departure_date, seat_class):
+    """
+    (inventory version, cabin_holds(), rendered seat grid) of a cabin of a
+    departure, from the cache when possible
+    """
+    version, _ = seat_map_changes(flight, departure_date, seat_class)
+    cache = get_cache()
+    key = grid_key(flight, departure_date, seat_class, version)
+    cached = cache.get(key)
+    if cached is None:
+        html, holds, timeout = render_seat_grid(flight, departure_date, seat_class)
+        cache.set(key, (html, holds), timeout)
+    else:
+        html, holds = cached
+    return version, holds, mark_safe(html)
@@ -1,190 +1,731 @@
-from .models import Flight, Seat, SEAT_CLASS
+from .cabin_layouts import seat_map_template
+from .models import Flight, Seat, SeatAvailability, SeatMapVersion, SEAT_CLASS
+from .search_index import FARE_FIELDS, get_fare
+from .seat_events import publish_seat_changes
+from collections import Counter
 from datetime import datetime, timedelta
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Func, OuterRef, Q, Subquery
 from django.utils import timezone
 
 
-def create_seats_for_flight(flight):
+def sparse_storage():
     """
-    Create seats for a flight based on standard aircraft configuration
+    True when only reserved and booked seats are stored (settings.SEAT_STORAGE = 'sparse');
+    available seats then exist only in the layout
     """
-    seats = []
-    
-    # Economy Class: Rows 1-25, Seats A-F (6 seats per row)
-    economy_rows = range(1, 26)
-    economy_columns = ['A', 'B', 'C', 'D', 'E', 'F']
-    
-    for row in economy_rows:
-        for col in economy_columns:
-            seat_number = f"{row}{col}"
-            seats.append(Seat(
-                flight=flight,
-                seat_number=seat_number,
-                seat_class='economy',
-                status='available',
-                price=flight.economy_fare if flight.economy_fare else 0
-            ))
-    
-    # Business Class: Rows 26-30, Seats A-D (4 seats per row)
-    business_rows = range(26, 31)
-    business_columns = ['A', 'B', 'C', 'D']
-    
-    if flight.business_fare and flight.business_fare > 0:
-        for row in business_rows:
-            for col in business_columns:
-                seat_number = f"{row}{col}"
-                seats.append(Seat(
-                    flight=flight,
-                    seat_number=seat_number,
-                    seat_class='business',
-                    status='available',
-                    price=flight.business_fare
-                ))
-    
-    # First Class: Rows 31-33, Seats A-B (2 seats per row)
-    first_rows = range(31, 34)
-    first_columns = ['A', 'B']
-    
-    if flight.first_fare and flight.first_fare > 0:
-        for row in first_rows:
-            for col in first_columns:
-                seat_number = f"{row}{col}"
-                seats.append(Seat(
-                    flight=flight,
-                    seat_number=seat_number,
-                    seat_class='first',
-                    status='available',
-                    price=flight.first_fare
-                ))
-    
+    return getattr(settings, 'SEAT_STORAGE', 'sparse') == 'sparse'
+
+
+def seat_key(flight_id, departure_date, seat_number):
+    """
+    Identifier of a seat of one departure, whether or not it has a row, e.g. '42-20300107-12A'
+    """
+    return f"{flight_id}-{departure_date:%Y%m%d}-{seat_number}"
+
+
+def parse_departure_date(value):
+    """
+    Departure date from a request parameter, in the d-m-Y form the booking pages
+    pass around or in Y-m-d.  Returns None when it is missing or malformed.
+    """
+    for date_format in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value or '', date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def seat_lookup(seat_id):
+    """
+    Filter arguments for a seat identifier: a seat_key() or, for legacy rows, a numeric id.
+    Raises ValueError on anything else.
+    """
+    seat_id = str(seat_id)
+    if seat_id.isdigit():
+        return {'id': int(seat_id)}
+    flight_id, departure_date, seat_number = seat_id.split('-')
+    return {
+        'flight_id': int(flight_id),
+        'departure_date': datetime.strptime(departure_date, "%Y%m%d").date(),
+        'seat_number': seat_number,
+    }
+
+
+def get_seats(seat_ids):
+    """
+    Stored seats (reserved or booked) for a list of seat identifiers, in cabin order
+    """
+    query = Q()
+    for seat_id in seat_ids:
+        try:
+            query |= Q(**seat_lookup(seat_id))
+        except ValueError:
+            continue
+    if not query:
+        return Seat.objects.none()
+    return Seat.objects.filter(query).order_by('departure_date', 'row', 'column')
+
+
+def seat_price(flight, seat_class):
+    """
+    Price of a seat of the class, or None when the flight does not sell it.
+    Economy is always sold (at 0 when the flight has no economy fare).
+    """
+    if seat_class not in FARE_FIELDS:
+        return None
+    fare = get_fare(flight, seat_class)
+    if seat_class == 'economy':
+        return fare if fare else 0
+    return fare if fare and fare > 0 else None
+
+
+def layout_seats(flight, seat_class=None):
+    """
+    (seat template, price) of every seat the flight sells, in cabin order,
+    from the seat-map template of its aircraft
+    """
+    for cabin in seat_map_template(flight).cabins.values():
+        if seat_class and cabin.seat_class != seat_class:
+            continue
+        price = seat_price(flight, cabin.seat_class)
+        if price is None:
+            continue
+        for seat in cabin.seats:
+            yield seat, price
+
+
+def cabin_column_groups(flight, seat_class):
+    """
+    Seat letters of a cabin between aisles, e.g. [['A', 'B', 'C'], ['D', 'E', 'F']]
+    """
+    cabin = seat_map_template(flight).cabins.get(seat_class)
+    return [list(group) for group in cabin.column_groups] if cabin else []
+
+
+def hold_expired(seat, now):
+    """
+    True for a reservation past its deadline.  Reads treat it as available;
+    the row itself is fixed by the next write or the expiry worker.
+    """
+    return seat.status == 'reserved' and seat.reserved_until is not None and seat.reserved_until < now
+
+
+def departure_seats(flight, departure_date, seat_class, stored=None):
+    """
+    Every seat of a departure and class in cabin order, as dicts: the layout
+    with the stored (reserved or booked) seats laid over it.  Expired holds
+    read as available.
+    """
+    if stored is None:
+        stored = Seat.objects.filter(flight=flight, departure_date=departure_date, seat_class=seat_class)
+    now = timezone.now()
+    stored = {seat.seat_number: seat for seat in stored if not hold_expired(seat, now)}
+    for template, price in layout_seats(flight, seat_class):
+        seat = stored.get(template.number)
+        yield {
+            'id': seat_key(flight.id, departure_date, template.number),
+            'number': template.number,
+            'row': template.row,
+            'column': template.column,
+            'status': seat.status if seat else 'available',
+            'price': seat.price if seat else price,
+            'reserved_until': seat.reserved_until if seat else None
+        }
+
+
+def _layout_seat_rows(flight, departure_date):
+    """
+    Unsaved available Seat rows of every seat of a departure
+    """
+    for template, price in layout_seats(flight):
+        yield Seat(
+            flight=flight,
+            departure_date=departure_date,
+            seat_number=template.number,
+            row=template.row,
+            column=template.column,
+            seat_class=template.seat_class,
+            status='available',
+            price=price
+        )
+
+
+def create_seats_for_flight(flight, departure_date):
+    """
+    Create the seats of one departure of a flight based on standard aircraft configuration.
+    Seats that already exist are skipped, so concurrent calls are safe.
+    """
+    seats = list(_layout_seat_rows(flight, departure_date))
+
     # Bulk create all seats
-    Seat.objects.bulk_create(seats)
+    Seat.objects.bulk_create(seats, batch_size=500, ignore_conflicts=True)
     return len(seats)
 
 
-def get_seat_map(flight, seat_class='economy'):
+PROVISION_BATCH_SIZE = 2000
+
+
+def unseeded_departures(dates):
+    """
+    (flight id, departure date) of the departures on the dates whose seats
+    were never created, with one anti-join query per date
+    """
+    for departure_date in dates:
+        seeded = Seat.objects.filter(flight=OuterRef('pk'), departure_date=departure_date, status='available')
+        flights = Flight.objects.operating_on(departure_date.weekday()).filter(~Exists(seeded)).order_by('id')
+        for flight_id in flights.values_list('id', flat=True):
+            yield flight_id, departure_date
+
+
+def provision_departures(departures, batch_size=PROVISION_BATCH_SIZE):
     """
-    Get seat map for a specific flight and class
-    Returns a structured representation of the seat layout
+    Create the seats of a list of (flight id, departure date) departures in one
+    transaction, batch_size rows per INSERT.  Seats that already exist are
+    skipped, so an interrupted run can simply be started again.  Returns the
+    number of seat rows written.
+    """
+    flights = Flight.objects.in_bulk({flight_id for flight_id, departure_date in departures})
+    seats = [
+        seat
+        for flight_id, departure_date in departures if flight_id in flights
+        for seat in _layout_seat_rows(flights[flight_id], departure_date)
+    ]
+    with transaction.atomic():
+        Seat.objects.bulk_create(seats, batch_size=batch_size, ignore_conflicts=True)
+    return len(seats)
+
+
+def ensure_seats_for_departure(flight, departure_date):
+    """
+    Materialize the seats of a departure the first time it is opened (dense storage only).
+    Returns the number of seats created (0 when they already existed).
+    """
+    if sparse_storage():
+        return 0
+    if Seat.objects.filter(flight=flight, departure_date=departure_date, status='available').exists():
+        return 0
+    return create_seats_for_flight(flight, departure_date)
+
+
+def get_seat_map(flight, departure_date, seat_class='economy'):
+    """
+    Get seat map for a specific departure and class
+    Returns a structured representation of the seat layout (a plain read, no locks)
     """
     seats = Seat.objects.filter(
         flight=flight,
+        departure_date=departure_date,
         seat_class=seat_class
-    ).select_for_update()
-    
+    )
+
     # Organize seats by row
     seat_map = {}
-    for seat in seats:
-        row = ''.join(filter(str.isdigit, seat.seat_number))
-        col = ''.join(filter(str.isalpha, seat.seat_number))
-        
-        if row not in seat_map:
-            seat_map[row] = {}
-        
-        seat_map[row][col] = {
-            'id': seat.id,
-            'number': seat.seat_number,
-            'status': seat.status,
-            'price': seat.price,
-            'reserved_until': seat.reserved_until
-        }
-    
+    for seat in departure_seats(flight, departure_date, seat_class, stored=seats):
+        seat_map.setdefault(str(seat['row']), {})[seat['column']] = seat
+
     return seat_map
 
 
-@transaction.atomic
+def _new_seat(lookup, flight=None):
+    """
+    Unsaved Seat for a seat of the layout that has no row yet, or None if there is no such seat
+    """
+    if 'id' in lookup:
+        return None
+    if flight is None:
+        flight = Flight.objects.filter(id=lookup['flight_id']).first()
+    if flight is None or not flight.depart_days & (1 << lookup['departure_date'].weekday()):
+        return None
+    template = seat_map_template(flight).by_number.get(lookup['seat_number'])
+    price = seat_price(flight, template.seat_class) if template else None
+    if price is None:
+        return None
+    return Seat(
+        flight=flight,
+        departure_date=lookup['departure_date'],
+        seat_number=template.number,
+        row=template.row,
+        column=template.column,
+        seat_class=template.seat_class,
+        price=price
+    )
+
+
+def _departure_version(flight_id, departure_date):
+    """
+    SeatMapVersion row of a departure, locked for the rest of the transaction
+    """
+    versions = SeatMapVersion.objects.select_for_update()
+    seat_map_version = versions.filter(flight_id=flight_id, departure_date=departure_date).first()
+    if seat_map_version is None:
+        try:
+            with transaction.atomic():
+                seat_map_version = SeatMapVersion.objects.create(flight_id=flight_id, departure_date=departure_date)
+        except IntegrityError:
+            # Created by a concurrent change
+            seat_map_version = versions.get(flight_id=flight_id, departure_date=departure_date)
+    return seat_map_version
+
+
+def cabin_capacities(flight):
+    """
+    Number of seats of every cabin the flight sells
+    """
+    return {
+        cabin.seat_class: len(cabin.seats)
+        for cabin in seat_map_template(flight).cabins.values()
+        if seat_price(flight, cabin.seat_class) is not None
+    }
+
+
+def _cabin_count(status, **filters):
+    """
+    Number of seats with status (and filters) in the cabin of the SeatAvailability row being updated or read
+    """
+    return Subquery(
+        Seat.objects.filter(
+            flight_id=OuterRef('flight_id'),
+            departure_date=OuterRef('departure_date'),
+            seat_class=OuterRef('seat_class'),
+            status=status,
+            **filters
+        ).order_by().annotate(count=Func(F('id'), function='COUNT')).values('count')
+    )
+
+
+def count_seats(flight_id, departure_date):
+    """
+    Recount the reserved and booked seats of every cabin of a departure into
+    its SeatAvailability rows, in one UPDATE.  The rows are created the first
+    time a seat of the departure changes.
+    """
+    counters = SeatAvailability.objects.filter(flight_id=flight_id, departure_date=departure_date)
+    if counters.update(reserved=_cabin_count('reserved'), booked=_cabin_count('booked')):
+        return
+    flight = Flight.objects.get(id=flight_id)
+    SeatAvailability.objects.bulk_create([
+        SeatAvailability(flight=flight, departure_date=departure_date, seat_class=seat_class, capacity=capacity)
+        for seat_class, capacity in cabin_capacities(flight).items()
+    ], ignore_conflicts=True)
+    counters.update(reserved=_cabin_count('reserved'), booked=_cabin_count('booked'))
+
+
+def reconcile_seat_counters(repair=True):
+    """
+    Check every departure that has stored seats or counters against a fresh
+    count of its seats and its cabin layout, and recount the ones that
+    drifted (or lack counters) under the departure lock, like a seat change.
+    Returns (departures checked, departures repaired).
+    """
+    counts = Counter()
+    stored = Seat.objects.filter(departure_date__isnull=False, status__in=['reserved', 'booked'])
+    for row in stored.values('flight_id', 'departure_date', 'seat_class', 'status').annotate(count=Count('id')).order_by():
+        counts[(row['flight_id'], row['departure_date'], row['seat_class'], row['status'])] = row['count']
+    counters = {}
+    for counter in SeatAvailability.objects.all().iterator():
+        counters[(counter.flight_id, counter.departure_date, counter.seat_class)] = counter
+
+    departures = {key[:2] for key in counts} | {key[:2] for key in counters}
+    flights = Flight.objects.in_bulk({flight_id for flight_id, departure_date in departures})
+    drifted = []
+    for flight_id, departure_date in sorted(departures):
+        for seat_class, capacity in cabin_capacities(flights[flight_id]).items():
+            counter = counters.get((flight_id, departure_date, seat_class))
+            expected = (
+                capacity,
+                counts[(flight_id, departure_date, seat_class, 'reserved')],
+                counts[(flight_id, departure_date, seat_class, 'booked')],
+            )
+            if counter is None or (counter.capacity, counter.reserved, counter.booked) != expected:
+                drifted.append((flights[flight_id], departure_date))
+                break
+
+    if repair:
+        for flight, departure_date in drifted:
+            with transaction.atomic():
+                _departure_version(flight.id, departure_date)
+                for seat_class, capacity in cabin_capacities(flight).items():
+                    SeatAvailability.objects.update_or_create(
+                        flight=flight, departure_date=departure_date, seat_class=seat_class,
+                        defaults={'capacity': capacity}
+                    )
+                count_seats(flight.id, departure_date)
+    return len(departures), len(drifted)
+
+
+def seat_availability(flight_ids, departure_date, seat_class):
+    """
+    {flight id: available seats} of a cabin for one departure date of several
+    flights, in one query.  Departures missing have not sold a seat yet.
+    Holds past their deadline count as available, as in seat map reads: the
+    counters are only recounted when the expiry worker releases them.
+    """
+    counters = SeatAvailability.objects.filter(
+        flight_id__in=flight_ids, departure_date=departure_date, seat_class=seat_class
+    ).only('flight_id', 'capacity', 'reserved', 'booked').annotate(
+        lapsed=_cabin_count('reserved', reserved_until__lt=timezone.now())
+    )
+    return {counter.flight_id: counter.available for counter in counters}
+
+
+def record_seat_changes(changes):
+    """
+    Raise the inventory version and recount the seat counters of the
+    departures of changed seats, and publish the changes once the transaction
+    commits.  changes are
+    (flight_id, departure_date, seat_number, status, reserved_until) tuples.
+    Call it in the transaction of the change, after the seats themselves were
+    written, so version order is commit order.
+    """
+    changes = [change for change in changes if change[1] is not None]
+    departures = {}
+    for flight_id, departure_date, seat_number, status, reserved_until in changes:
+        departures.setdefault((flight_id, departure_date), []).append(seat_number)
+    versions = {}
+    # Fixed lock order, so group changes spanning departures cannot deadlock
+    for (flight_id, departure_date), seat_numbers in sorted(departures.items()):
+        seat_map_version = _departure_version(flight_id, departure_date)
+        seat_map_version.version += 1
+        seat_map_version.seat_versions.update(dict.fromkeys(seat_numbers, seat_map_version.version))
+        seat_map_version.save(update_fields=['version', 'seat_versions'])
+        count_seats(flight_id, departure_date)
+        versions[(flight_id, departure_date)] = seat_map_version.version
+    publish_seat_changes(changes, versions)
+
+
+def _publish(seat):
+    """
+    Record the new state of a seat for the seat map versions and live seat maps
+    """
+    record_seat_changes([(seat.flight_id, seat.departure_date, seat.seat_number, seat.status, seat.reserved_until)])
+
+
+def seat_map_changes(flight, departure_date, seat_class, since=None):
+    """
+    (version, changed seat numbers) of a cabin of a departure.  The version of a
+    cabin is the version of its last seat change (0 before any); the seat numbers
+    are those changed after version since, or None for every seat when since is
+    not given or not a version of this cabin.
+    """
+    cabin = seat_map_template(flight).cabins.get(seat_class)
+    seat_versions = SeatMapVersion.objects.filter(
+        flight=flight, departure_date=departure_date
+    ).values_list('seat_versions', flat=True).first() or {}
+    cabin_versions = {seat.number: seat_versions[seat.number] for seat in (cabin.seats if cabin else ()) if seat.number in seat_versions}
+    version = max(cabin_versions.values(), default=0)
+    if since is None or since > version:
+        return version, None
+    return version, {number for number, seat_version in cabin_versions.items() if seat_version > since}
+
+
+def cabin_holds(flight, departure_date, seat_class, now=None, stored=None):
+    """
+    (earliest deadline of the live holds or None, seat numbers of the lapsed
+    holds) of a cabin of a departure, or of its stored seats when given.  A
+    hold lapses without a seat change, so the inventory version alone does
+    not tell a client that the seat reads as available now.
+    """
+    now = now or timezone.now()
+    if stored is None:
+        stored = Seat.objects.filter(
+            flight=flight, departure_date=departure_date, seat_class=seat_class,
+            status='reserved', reserved_until__isnull=False
+        ).only('seat_number', 'status', 'reserved_until')
+    next_expiry = None
+    lapsed = set()
+    for seat in stored:
+        if seat.status != 'reserved' or seat.reserved_until is None:
+            continue
+        if hold_expired(seat, now):
+            lapsed.add(seat.seat_number)
+        elif next_expiry is None or seat.reserved_until < next_expiry:
+            next_expiry = seat.reserved_until
+    return next_expiry, lapsed
+
+def _claim(seat, status, reserved_until=None):
+    """
+    Store a seat from _new_seat() with the given status.  The unique
+    (flight, departure_date, seat_number) constraint makes a concurrent claim
+    of the same seat fail.  Returns False if the seat was taken meanwhile.
+    """
+    seat.status = status
+    seat.reserved_until = reserved_until
+    try:
+        with transaction.atomic():
+            seat.save()
+    except IntegrityError:
+        return False
+    return True
+
+
+# Reads and conditional writes of a seat before an operation gives up on a busy seat
+SEAT_UPDATE_ATTEMPTS = 5
+SEAT_BUSY = 'Seat is being changed by someone else, please try again'
+
+
+def _transition(seat, status, reserved_until=None, delete=False):
+    """
+    Move a seat read earlier (or a new one from _new_seat()) to status, and
+    record the change, in one transaction.  A stored seat is changed with a
+    conditional UPDATE on the version it was read at, so the write misses when
+    someone changed the seat in between, on every database (SQLite has no row
+    locks).  Returns False in that case; the caller reads the seat again.
+    """
+    with transaction.atomic():
+        if seat.pk is None:
+            if not _claim(seat, status, reserved_until):
+                return False
+        else:
+            changed = Seat.objects.filter(id=seat.id, version=seat.version).update(
+                status=status, reserved_until=reserved_until, version=F('version') + 1
+            )
+            if not changed:
+                return False
+            if delete:
+                # Only after the conditional UPDATE holds the row
+                Seat.objects.filter(id=seat.id).delete()
+            seat.status, seat.reserved_until = status, reserved_until
+            seat.version += 1
+        _publish(seat)
+    return True
+
+
 def reserve_seat(seat_id, duration_minutes=10):
     """
-    Reserve a seat temporarily with row-level locking to prevent race conditions
+    Reserve a seat temporarily.  Optimistic: the seat is read without a lock
+    and changed with a conditional update, retried up to SEAT_UPDATE_ATTEMPTS
+    times when a concurrent change gets in first.
     """
     try:
-        # Get the seat with row-level lock (SELECT FOR UPDATE)
-        seat = Seat.objects.select_for_update().get(id=seat_id)
-        
-        # Check if seat is available
-        if seat.status != 'available':
-            # Check if reservation expired
-            if seat.status == 'reserved' and seat.reserved_until:
-                if timezone.now() > seat.reserved_until:
-                    # Reservation expired, make it available
-                    seat.status = 'available'
-                    seat.reserved_until = None
-                else:
-                    return {'success': False, 'error': 'Seat is already reserved'}
-            else:
+        lookup = seat_lookup(seat_id)
+        for attempt in range(SEAT_UPDATE_ATTEMPTS):
+            # An available seat without a row is inserted as reserved
+            seat = Seat.objects.filter(**lookup).first() or _new_seat(lookup)
+            if seat is None:
+                return {'success': False, 'error': 'Seat not found'}
+            if seat.status == 'booked':
                 return {'success': False, 'error': 'Seat is not available'}
-        
-        # Reserve the seat
-        seat.status = 'reserved'
-        seat.reserved_until = timezone.now() + timedelta(minutes=duration_minutes)
-        seat.save()
-        
-        return {
-            'success': True,
-            'seat_id': seat.id,
-            'seat_number': seat.seat_number,
-            'reserved_until': seat.reserved_until
-        }
-    except Seat.DoesNotExist:
+            if seat.status == 'reserved' and not hold_expired(seat, timezone.now()):
+                return {'success': False, 'error': 'Seat is already reserved'}
+
+            reserved_until = timezone.now() + timedelta(minutes=duration_minutes)
+            if _transition(seat, 'reserved', reserved_until):
+                return {
+                    'success': True,
+                    'seat_id': seat.key,
+                    'seat_number': seat.seat_number,
+                    'reserved_until': seat.reserved_until
+                }
+        return {'success': False, 'error': SEAT_BUSY}
+    except ValueError:
         return {'success': False, 'error': 'Seat not found'}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
-@transaction.atomic
 def book_seat(seat_id):
     """
-    Book a seat (mark as booked) with row-level locking
+    Book a seat (mark as booked), optimistically like reserve_seat()
     """
     try:
-        seat = Seat.objects.select_for_update().get(id=seat_id)
-        
-        # Can only book if available or reserved
-        if seat.status not in ['available', 'reserved']:
-            return {'success': False, 'error': 'Seat is not available for booking'}
-        
-        seat.status = 'booked'
-        seat.reserved_until = None
-        seat.save()
-        
-        return {'success': True, 'seat_id': seat.id, 'seat_number': seat.seat_number}
-    except Seat.DoesNotExist:
+        lookup = seat_lookup(seat_id)
+        for attempt in range(SEAT_UPDATE_ATTEMPTS):
+            seat = Seat.objects.filter(**lookup).first() or _new_seat(lookup)
+            if seat is None:
+                return {'success': False, 'error': 'Seat not found'}
+            # Can only book if available or reserved
+            if seat.status not in ['available', 'reserved']:
+                return {'success': False, 'error': 'Seat is not available for booking'}
+
+            if _transition(seat, 'booked'):
+                return {'success': True, 'seat_id': seat.key, 'seat_number': seat.seat_number}
+        return {'success': False, 'error': SEAT_BUSY}
+    except ValueError:
         return {'success': False, 'error': 'Seat not found'}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
-@transaction.atomic
 def release_seat(seat_id):
     """
-    Release a reserved seat back to available
+    Release a reserved seat back to available, optimistically like reserve_seat()
     """
     try:
-        seat = Seat.objects.select_for_update().get(id=seat_id)
-        
-        if seat.status == 'reserved':
-            seat.status = 'available'
-            seat.reserved_until = None
-            seat.save()
-            return {'success': True}
-        
-        return {'success': False, 'error': 'Seat is not reserved'}
-    except Seat.DoesNotExist:
+        lookup = seat_lookup(seat_id)
+    except ValueError:
         return {'success': False, 'error': 'Seat not found'}
+    for attempt in range(SEAT_UPDATE_ATTEMPTS):
+        seat = Seat.objects.filter(**lookup).first()
+        if seat is None:
+            return {'success': False, 'error': 'Seat not found'}
+        if seat.status != 'reserved':
+            return {'success': False, 'error': 'Seat is not reserved'}
 
+        delete = sparse_storage() and not seat.tickets.exists()
+        if _transition(seat, 'available', delete=delete):
+            return {'success': True}
+    return {'success': False, 'error': SEAT_BUSY}
+
+
+class SeatsUnavailable(Exception):
+    pass
 
-def cleanup_expired_reservations():
+
+def _seats_query(lookups):
     """
-    Clean up expired seat reservations (to be run periodically)
+    One filter matching every seat of a list of seat_lookup() results
     """
-    expired_seats = Seat.objects.filter(
-        status='reserved',
-        reserved_until__lt=timezone.now()
-    )
-    
-    count = expired_seats.update(
-        status='available',
-        reserved_until=None
+    ids = [lookup['id'] for lookup in lookups if 'id' in lookup]
+    departures = {}
+    for lookup in lookups:
+        if 'id' not in lookup:
+            departures.setdefault((lookup['flight_id'], lookup['departure_date']), []).append(lookup['seat_number'])
+    query = Q(id__in=ids) if ids else Q()
+    for (flight_id, departure_date), seat_numbers in departures.items():
+        query |= Q(flight_id=flight_id, departure_date=departure_date, seat_number__in=seat_numbers)
+    return query
+
+
+def _claim_seats(seat_ids, status, claimable, reserved_until=None):
+    """
+    Move a group of seats to status in as few statements as possible.  One
+    conditional UPDATE claims every stored seat that is still claimable; if
+    that does not cover the group, the seats without a row are inserted in one
+    bulk INSERT, which the unique constraint makes fail for a seat taken
+    meanwhile.  Raises SeatsUnavailable when any seat cannot be claimed; run
+    inside transaction.atomic() so the group is claimed as a unit.
+    """
+    try:
+        lookups = [seat_lookup(seat_id) for seat_id in dict.fromkeys(str(seat_id) for seat_id in seat_ids)]
+    except ValueError:
+        raise SeatsUnavailable('Seat not found')
+    if not lookups:
+        raise SeatsUnavailable('No seats selected')
+    query = _seats_query(lookups)
+    changes = [
+        (lookup['flight_id'], lookup['departure_date'], lookup['seat_number'], status, reserved_until)
+        for lookup in lookups if 'id' not in lookup
+    ]
+    ids = [lookup['id'] for lookup in lookups if 'id' in lookup]
+    if ids:
+        # Seats addressed by row id: record the change under their departure too
+        changes += [
+            (flight_id, departure_date, seat_number, status, reserved_until)
+            for flight_id, departure_date, seat_number in Seat.objects.filter(id__in=ids).values_list(
+                'flight_id', 'departure_date', 'seat_number'
+            )
+        ]
+
+    # Compare-and-set on the stored seats
+    claimed = Seat.objects.filter(query).filter(claimable).update(
+        status=status, reserved_until=reserved_until, version=F('version') + 1
     )
-    
-    return count
+    if claimed == len(lookups):
+        record_seat_changes(changes)
+        return
+
+    # Some seats are not stored (or were not claimable): insert the missing ones
+    stored = {
+        (seat.flight_id, seat.departure_date, seat.seat_number) if seat.departure_date else seat.id
+        for seat in Seat.objects.filter(query).only('id', 'flight_id', 'departure_date', 'seat_number')
+    }
+    missing = [
+        lookup for lookup in lookups
+        if 'id' not in lookup and (lookup['flight_id'], lookup['departure_date'], lookup['seat_number']) not in stored
+    ]
+    if len(stored) != claimed:
+        raise SeatsUnavailable('Seat is not available')
+
+    flights = Flight.objects.in_bulk({lookup['flight_id'] for lookup in missing})
+    seats = []
+    for lookup in missing:
+        seat = _new_seat(lookup, flights.get(lookup['flight_id']))
+        if seat is None:
+            raise SeatsUnavailable('Seat not found')
+        seat.status = status
+        seat.reserved_until = reserved_until
+        seats.append(seat)
+    if claimed + len(seats) != len(lookups):
+        raise SeatsUnavailable('Seat not found')
+    try:
+        Seat.objects.bulk_create(seats)
+    except IntegrityError:
+        raise SeatsUnavailable('Seat is not available')
+    record_seat_changes(changes)
+
+
+def reserve_seats(seat_ids, duration_minutes=10):
+    """
+    Reserve a group of seats all together or not at all
+    """
+    reserved_until = timezone.now() + timedelta(minutes=duration_minutes)
+    claimable = Q(status='available') | Q(status='reserved', reserved_until__lt=timezone.now())
+    try:
+        with transaction.atomic():
+            _claim_seats(seat_ids, 'reserved', claimable, reserved_until)
+    except SeatsUnavailable as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'seat_ids': list(seat_ids), 'reserved_until': reserved_until}
+
+
+def book_seats(seat_ids):
+    """
+    Book a group of seats all together or not at all
+    """
+    try:
+        with transaction.atomic():
+            _claim_seats(seat_ids, 'booked', Q(status__in=['available', 'reserved']))
+    except SeatsUnavailable as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'seat_ids': list(seat_ids)}
+
+
+EXPIRY_BATCH_SIZE = 500
+
+
+def cleanup_expired_reservations(batch_size=EXPIRY_BATCH_SIZE, now=None):
+    """
+    Release expired seat reservations, oldest deadline first, in batches of
+    batch_size with one short transaction each (run periodically by the
+    expire_seat_holds command).  Walks the partial index on reserved_until of
+    reserved seats instead of the whole table.  Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Holds being changed by a booking right now are skipped, not waited for
+            batch = list(
+                Seat.objects.select_for_update(skip_locked=True)
+                .filter(status='reserved', reserved_until__lt=now)
+                .order_by('reserved_until')
+                .values_list('id', 'flight_id', 'departure_date', 'seat_number')[:batch_size]
+            )
+            if not batch:
+                return released
+
+            # Re-check the deadline: a seat may have been reserved again meanwhile.
+            # The release keeps the old deadline until the seats it changed are
+            # read back, which tells them apart from seats released by others
+            # since the batch was read (those have no deadline)
+            batch_ids = [row[0] for row in batch]
+            Seat.objects.filter(id__in=batch_ids, status='reserved', reserved_until__lt=now).update(
+                status='available',
+                version=F('version') + 1
+            )
+            released_seats = Seat.objects.filter(id__in=batch_ids, status='available', reserved_until__isnull=False)
+            changes = [
+                (flight_id, departure_date, seat_number, 'available', None)
+                for flight_id, departure_date, seat_number in released_seats.values_list('flight_id', 'departure_date', 'seat_number')
+            ]
+            if sparse_storage():
+                released_seats.filter(tickets__isnull=True).delete()
+            released_seats.update(reserved_until=None)
+            released += len(changes)
+            record_seat_changes(changes)
+
+        if len(batch) < batch_size:
+            return released
@@ -0,0 +1,158 @@
+"""
+Server-sent event stream of seat changes for the seat selection page.
+
+GET /api/seats/stream?flight_id=&depart_date=&seat_class=&since= keeps the
+response open and writes an "event: seats" message with the changed seats of
+that cabin whenever seat_manager changes one of them, instead of the page
+polling the whole cabin.  Every message carries the cabin's inventory version
+as its id.  On connect the stream first sends the seats changed after the
+version the client has (since=, or the Last-Event-ID header of a reconnecting
+EventSource), or the whole cabin without one, so nothing changed while the
+client was not connected is missed.  It needs a logged-in session, like the
+seat selection page.  It is a plain ASGI app mounted by capstone/asgi.py, so it
+is only served under an ASGI server (the web process of the Procfile runs
+gunicorn with uvicorn workers); the page falls back to polling elsewhere.
+"""
+import asyncio
+import json
+from importlib import import_module
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, parse_cookie
+
+from .models import Flight
+from .seat_events import broker, departure_channel, get_backend
+from .seat_manager import cabin_holds, departure_seats, layout_seats, parse_departure_date, seat_map_changes
+
+
+STREAM_PATH = '/api/seats/stream'
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+def session_user(scope):
+    """
+    User of the session cookie of an ASGI request (AnonymousUser without one)
+    """
+    headers = dict(scope.get('headers', ()))
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request)
+
+
+def cabin_seat_numbers(flight_id, departure_date, seat_class):
+    """
+    (flight, seat numbers) of a cabin of a departure, or None when there is no such cabin
+    """
+    flight = Flight.objects.filter(id=flight_id).first() if str(flight_id).isdigit() else None
+    if flight is None or departure_date is None or not flight.depart_days & (1 << departure_date.weekday()):
+        return None
+    numbers = frozenset(template.number for template, price in layout_seats(flight, seat_class))
+    return (flight, numbers) if numbers else None
+
+
+def cabin_snapshot(flight, departure_date, seat_class, since=None):
+    """
+    (version, seats changed after version since) of a cabin of a departure, as
+    event seats; every seat when since is None or not a version of the cabin.
+    Lapsed holds count as changed, they read as available now.
+    """
+    version, changed = seat_map_changes(flight, departure_date, seat_class, since)
+    if changed is not None:
+        changed |= cabin_holds(flight, departure_date, seat_class)[1]
+    seats = [
+        {key: seat[key] for key in ('id', 'number', 'status', 'reserved_until')}
+        for seat in departure_seats(flight, departure_date, seat_class)
+        if changed is None or seat['number'] in changed
+    ]
+    return version, seats
+
+
+def _since(scope, params):
+    # A reconnecting EventSource sends the id of the last message it got
+    headers = dict(scope.get('headers', ()))
+    since = headers.get(b'last-event-id', b'').decode('latin-1') or params.get('since', [''])[0]
+    return int(since) if since.isdigit() else None
+
+
+def _message(version, seats):
+    return f"event: seats\nid: {version}\ndata: {json.dumps(seats, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _send_json(send, status, data):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def seat_stream(scope, receive, send):
+    params = parse_qs(scope['query_string'].decode())
+    flight_id = params.get('flight_id', [''])[0]
+    seat_class = params.get('seat_class', ['economy'])[0]
+    departure_date = parse_departure_date(params.get('depart_date', [''])[0])
+
+    user = await sync_to_async(session_user)(scope)
+    if not user.is_authenticated:
+        await _send_json(send, 403, {'success': False, 'error': 'Login required'})
+        return
+
+    cabin = await sync_to_async(cabin_seat_numbers)(flight_id, departure_date, seat_class)
+    if cabin is None:
+        await _send_json(send, 404, {'success': False, 'error': 'Flight not found'})
+        return
+    flight, numbers = cabin
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def on_event(event):
+        # Called from whichever thread received the change
+        seats = [seat for seat in event['seats'] if seat['number'] in numbers]
+        if seats:
+            loop.call_soon_threadsafe(queue.put_nowait, (event['version'], seats))
+
+    # Start receiving the events of other worker processes
+    await sync_to_async(get_backend().listen)()
+    unsubscribe = broker.subscribe(departure_channel(flight.id, departure_date), on_event)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        # Subscribed first, so a change is either in the snapshot or queued
+        since = _since(scope, params)
+        version, seats = await sync_to_async(cabin_snapshot)(flight, departure_date, seat_class, since)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(), 'more_body': True})
+        if seats or since is None:
+            await send({'type': 'http.response.body', 'body': _message(version, seats).encode(), 'more_body': True})
+        while True:
+            change = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({change, disconnect}, timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if change not in done:
+                change.cancel()
+            if disconnect in done:
+                return
+            if change in done:
+                event_version, seats = change.result()
+                if event_version <= version:
+                    # Already in the snapshot
+                    continue
+                version = event_version
+                message = _message(version, seats)
+            else:
+                message = ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+    finally:
+        unsubscribe()
+        disconnect.cancel()
@@ -0,0 +1,106 @@
+"""
+Packed wire format of a cabin's seat map, served by /api/seats/available to
+clients that ask for it with Accept: application/vnd.flight.seatmap+json.
+
+Instead of one JSON object per seat, the response names the cabin layout and
+carries the state of every seat in the cabin order of that layout:
+
+  layout       layout id of the aircraft, e.g. 'standard' (see cabin_layouts)
+  count        number of seats
+  statuses     2 bits per seat, four seats per byte with the first seat in the
+               low bits, base64: 0 available, 1 reserved, 2 booked
+  prices       price table of the cabin
+  price_codes  a byte per seat indexing prices, base64; only sent when the
+               cabin has more than one price
+
+The client lays the seats out from the cabin geometry (cabin_geometry())
+it got with the page, so a 150-seat cabin is about 50 bytes of statuses.
+"""
+import base64
+
+from django.utils import timezone
+
+from .cabin_layouts import seat_map_template
+from .models import Seat
+from .seat_manager import seat_price
+
+
+SEAT_MAP_MEDIA_TYPE = 'application/vnd.flight.seatmap+json'
+STATUSES = ('available', 'reserved', 'booked')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+# price_codes are single bytes
+MAX_PRICES = 256
+
+
+def wants_packed(request):
+    """
+    True when the client asked for the packed seat map in its Accept header
+    """
+    return SEAT_MAP_MEDIA_TYPE in request.META.get('HTTP_ACCEPT', '')
+
+
+def cabin_geometry(flight, seat_class):
+    """
+    Layout id, row numbers and column groups of a cabin, which order the seats
+    of a packed seat map: row by row, then column by column
+    """
+    template = seat_map_template(flight)
+    cabin = template.cabins.get(seat_class)
+    return {
+        'layout': template.layout,
+        'rows': [row for row, row_seats in cabin.rows] if cabin else [],
+        'column_groups': [list(group) for group in cabin.column_groups] if cabin else [],
+    }
+
+
+def pack_statuses(codes):
+    packed = bytearray((len(codes) + 3) // 4)
+    for index, code in enumerate(codes):
+        packed[index >> 2] |= code << ((index & 3) << 1)
+    return base64.b64encode(bytes(packed)).decode('ascii')
+
+
+def unpack_statuses(encoded, count):
+    packed = base64.b64decode(encoded)
+    return [STATUSES[(packed[index >> 2] >> ((index & 3) << 1)) & 3] for index in range(count)]
+
+
+def packed_seat_map(flight, departure_date, seat_class):
+    """
+    Packed seat map of a cabin of a departure (the same seats, states and
+    prices as departure_seats()), or None when its prices overflow the table
+    """
+    template = seat_map_template(flight)
+    cabin = template.cabins.get(seat_class)
+    price = seat_price(flight, seat_class)
+    numbers = [seat.number for seat in cabin.seats] if cabin and price is not None else []
+
+    now = timezone.now()
+    stored = {}
+    rows = Seat.objects.filter(
+        flight=flight, departure_date=departure_date, seat_class=seat_class
+    ).values_list('seat_number', 'status', 'reserved_until', 'price')
+    for number, status, reserved_until, seat_price_ in rows:
+        # Expired holds read as available, as in hold_expired()
+        if not (status == 'reserved' and reserved_until is not None and reserved_until < now):
+            stored[number] = (STATUS_CODES.get(status, 0), seat_price_)
+
+    prices = {}
+    codes = []
+    price_codes = bytearray()
+    for number in numbers:
+        code, seat_price_ = stored.get(number, (0, price))
+        codes.append(code)
+        price_codes.append(prices.setdefault(seat_price_, len(prices)) % MAX_PRICES)
+    if len(prices) > MAX_PRICES:
+        return None
+
+    data = {
+        'layout': template.layout,
+        'count': len(numbers),
+        'statuses': pack_statuses(codes),
+        'prices': list(prices),
+    }
+    if len(prices) > 1:
+        data['price_codes'] = base64.b64encode(bytes(price_codes)).decode('ascii')
+    return data
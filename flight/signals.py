@@ -0,0 +1,51 @@
+"""
+Signal receivers that keep the in-memory search structures in sync with the database
+"""
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .models import Flight, Place, weekday_mask
+from .search_index import invalidate_schedule_index
+from .place_index import invalidate_place_index
+
+
+def sync_depart_days(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep Flight.depart_days equal to the weekday mask of the depart_day relation
+    """
+    if action == 'pre_clear' and reverse:
+        # pk_set is not given for a clear, remember the flights of this weekday
+        instance._cleared_flight_ids = list(instance.flights_of_the_day.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        flights = [instance]
+    elif action == 'post_clear':
+        flights = Flight.objects.filter(id__in=getattr(instance, '_cleared_flight_ids', []))
+    else:
+        flights = Flight.objects.filter(id__in=pk_set)
+
+    for flight in flights:
+        mask = weekday_mask(flight.depart_day.values_list('number', flat=True))
+        Flight.objects.filter(id=flight.id).update(depart_days=mask)
+        # Update the instance too, so a later flight.save() does not write the old mask back
+        flight.depart_days = mask
+
+
+
+def invalidate_schedule_days(sender, action, **kwargs):
+    """
+    Invalidate the schedule index once the depart_day relation has changed, not before
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_schedule_index()
+
+m2m_changed.connect(sync_depart_days, sender=Flight.depart_day.through, dispatch_uid='flight_days_mask')
+post_save.connect(invalidate_schedule_index, sender=Flight, dispatch_uid='flight_save_schedule_index')
+post_delete.connect(invalidate_schedule_index, sender=Flight, dispatch_uid='flight_delete_schedule_index')
+m2m_changed.connect(invalidate_schedule_days, sender=Flight.depart_day.through, dispatch_uid='flight_days_schedule_index')
+post_save.connect(invalidate_schedule_index, sender=Place, dispatch_uid='place_save_schedule_index')
+post_delete.connect(invalidate_schedule_index, sender=Place, dispatch_uid='place_delete_schedule_index')
+post_save.connect(invalidate_place_index, sender=Place, dispatch_uid='place_save_place_index')
+post_delete.connect(invalidate_place_index, sender=Place, dispatch_uid='place_delete_place_index')
@@ -0,0 +1,83 @@
+"""
+Request coalescing ("single flight") for expensive computations.
+
+When a computation for a key is already running, later callers wait for its
+result instead of starting their own.  Threads of one worker wait on an
+event; other workers see a lock entry in the shared cache and poll the cache
+for the result the lock holder stores.
+"""
+import threading
+import time
+
+
+LOCK_TIMEOUT = 10       # seconds before a lock of a crashed worker is ignored
+POLL_INTERVAL = 0.02
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute, cache=None):
+        """
+        Return compute() for key, running it at most once at a time per key.
+        With a cache, compute() must store its result under key in that cache
+        so waiting workers can pick it up.  Returns (result, shared), shared
+        being True when the result came from another caller's computation.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._across_workers(key, compute, cache)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _across_workers(self, key, compute, cache):
+        if cache is None:
+            return compute(), False
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                return compute(), False
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is computing: wait for its result or for the lock to go away
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            result = cache.get(key)
+            if result is not None:
+                return result, True
+            if cache.get(lock_key) is None:
+                break
+        return compute(), False
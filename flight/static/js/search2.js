@@ -32,177 +32,110 @@ function flight_duration2() {
 
 
 function filter(element=null) {
-    //reset_filter();
     filter_price();
     if (element) {
         inactive(element);
         active(element);   
     }
-    //let type = element.dataset.type;
-    let start = null;
-    let end = null;
-    let flights = null;
-    if (true) {
-        if(document.querySelector(".departure-time-slot-group .square-box.active")) {
-            start = document.querySelector(".departure-time-slot-group .square-box.active").dataset.start;
-            end = document.querySelector(".departure-time-slot-group .square-box.active").dataset.end;
-            flights = document.querySelectorAll("#flights_div .each-flight-div-box.show");
-        }
-        departure_slot(flights, start, end);
-    }
-
-    flights = null;
-    if (true) {
-        if(document.querySelector(".arrival-time-slot-group .square-box.active")) {
-            start = document.querySelector(".arrival-time-slot-group .square-box.active").dataset.start;
-            end = document.querySelector(".arrival-time-slot-group .square-box.active").dataset.end;
-            flights = document.querySelectorAll("#flights_div .each-flight-div-box.show");
-        }
-        arrival_slot(flights, start, end);
-    }
-    //flights = document.querySelectorAll("#flights_div .each-flight-div-box.show");
+    schedule_results('');
 }
 
 
 function filter2(element=null) {
-    //reset_filter2();
     filter_price2();
     if (element) {
         inactive2(element);
         active2(element);   
     }
-    //let type = element.dataset.type;
-    let start = null;
-    let end = null;
-    let flights = null;
-    if (true) {
-        if(document.querySelector(".departure-time-slot-group2 .square-box.active")) {
-            start = document.querySelector(".departure-time-slot-group2 .square-box.active").dataset.start;
-            end = document.querySelector(".departure-time-slot-group2 .square-box.active").dataset.end;
-            flights = document.querySelectorAll("#flights_div2 .each-flight-div-box.show");
-        }
-        departure_slot2(flights, start, end);
-    }
-
-    flights = null;
-    if (true) {
-        if(document.querySelector(".arrival-time-slot-group2 .square-box.active")) {
-            start = document.querySelector(".arrival-time-slot-group2 .square-box.active").dataset.start;
-            end = document.querySelector(".arrival-time-slot-group2 .square-box.active").dataset.end;
-            flights = document.querySelectorAll("#flights_div2 .each-flight-div-box.show");
-        }
-        arrival_slot2(flights, start, end);
-    }
-    //flights = document.querySelectorAll("#flights_div2 .each-flight-div-box.show");
+    schedule_results('2');
 }
 
 
-function arrival_slot(flights, start, end) {
-    if (flights) {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-destination-time .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                //flights[i].style.display = 'block';
-                flights[i].classList.add('show');
-                flights[i].classList.remove('hide');
-            }
-            else {
-                //flights[i].style.display = 'none';
-                flights[i].classList.add('hide');
-                flights[i].classList.remove('show');
-            }
-        }
-    }
-}
-function departure_slot(flights, start, end) {
-    if (flights) {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-origin-time .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                //flights[i].style.display = 'block';
-                flights[i].classList.add('show');
-                flights[i].classList.remove('hide');
-            }
-            else {
-                //flights[i].style.display = 'none';
-                flights[i].classList.add('hide');
-                flights[i].classList.remove('show');
-            }
-        }
-    }
-}
+// Filtering, sorting and paging happen on the server. `leg` is '' for the
+// outbound list and '2' for the return list of a round trip.
+let results_timer = {'': null, '2': null};
 
+function schedule_results(leg) {
+    // The price slider fires on every step, wait for it to settle
+    clearTimeout(results_timer[leg]);
+    results_timer[leg] = setTimeout(() => load_results(leg), 300);
+}
 
-function arrival_slot2(flights, start, end) {
-    if (flights) {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-destination-time2 .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                //flights[i].style.display = 'block';
-                flights[i].classList.add('show');
-                flights[i].classList.remove('hide');
-            }
-            else {
-                //flights[i].style.display = 'none';
-                flights[i].classList.add('hide');
-                flights[i].classList.remove('show');
-            }
-        }
+function results_params(leg) {
+    let params = new URLSearchParams(window.location.search);
+    ['depart_from', 'depart_to', 'arrive_from', 'arrive_to', 'airline', 'max_price', 'sort', 'after'].forEach(name => {
+        params.delete(name + leg);
+    });
+    let departure = document.querySelector(`.departure-time-slot-group${leg} .square-box.active`);
+    if (departure) {
+        params.set('depart_from' + leg, departure.dataset.start);
+        params.set('depart_to' + leg, departure.dataset.end);
     }
-}
-function departure_slot2(flights, start, end) {
-    if (flights) {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-origin-time .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                //flights[i].style.display = 'block';
-                flights[i].classList.add('show');
-                flights[i].classList.remove('hide');
-            }
-            else {
-                //flights[i].style.display = 'none';
-                flights[i].classList.add('hide');
-                flights[i].classList.remove('show');
-            }
-        }
+    let arrival = document.querySelector(`.arrival-time-slot-group${leg} .square-box.active`);
+    if (arrival) {
+        params.set('arrive_from' + leg, arrival.dataset.start);
+        params.set('arrive_to' + leg, arrival.dataset.end);
+    }
+    let price = document.querySelector(`.filter-price${leg} input[type=range]`);
+    if (price && price.value !== price.getAttribute('max')) {
+        params.set('max_price' + leg, price.value);
+    }
+    let airline = document.querySelector(`.filter-airline${leg} select`);
+    if (airline && airline.value) {
+        params.set('airline' + leg, airline.value);
+    }
+    let list = document.querySelector('#flights_div' + leg);
+    if (list.dataset.sort) {
+        params.set('sort' + leg, list.dataset.sort);
     }
+    params.set('leg', leg === '2' ? '2' : '1');
+    return params;
 }
 
-
-function timeslot(slot) {
-    inactive(slot);
-    active(slot);
-
-    let type = slot.dataset.type;
-    let start = slot.dataset.start;
-    let end = slot.dataset.end;
-    let div = document.querySelector("#flights_div");
-    let flights = div.querySelectorAll(".each-flight-div-box");
-    if (type === 'departure') {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-origin-time .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                flights[i].style.display = 'block';
-            }
-            else {
-                flights[i].style.display = 'none';
-            }
-        }
+function load_results(leg, after=null) {
+    let params = results_params(leg);
+    if (after) {
+        params.set('after' + leg, after);
     }
-    if (type === 'arrival') {
-        for (let i = 0; i < flights.length; i++) {
-            time = flights[i].querySelector(".flight-destination-time .flight-time h5").innerText.split(":");
-            if((parseInt(time[0]) >= parseInt(start)) && (parseInt(time[0]) < parseInt(end))) {
-                flights[i].style.display = 'block';
-            }
-            else {
-                flights[i].style.display = 'none';
-            }
+    fetch('/flight/results?' + params.toString())
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            return;
+        }
+        let list = document.querySelector('#flights_div' + leg);
+        if (after) {
+            list.insertAdjacentHTML('beforeend', data.html);
+        }
+        else {
+            list.innerHTML = data.html;
+        }
+        let button = document.querySelector('#load-more' + leg);
+        button.dataset.next = data.next || '';
+        button.parentElement.style.display = data.next ? 'block' : 'none';
+        if (leg === '2') {
+            flight_duration2();
         }
+        else {
+            flight_duration();
+        }
+        flight_select();
+    });
+}
+
+function load_more(leg) {
+    let button = document.querySelector('#load-more' + leg);
+    if (button.dataset.next) {
+        load_results(leg, button.dataset.next);
     }
+}
 
+function sort_results(leg, order) {
+    document.querySelector('#flights_div' + leg).dataset.sort = order;
+    load_results(leg);
 }
 
+
 function active(slot) {
     slot.classList.add('active');
     slot.querySelectorAll('img').forEach(image => {
@@ -264,22 +197,6 @@ function inactive2(slot) {
 function filter_price() {
     let value = document.querySelector(".filter-price input[type=range]").value;
     document.querySelector(".filter-price .final-price-value").innerText = value;
-
-    let div = document.querySelector("#flights_div");
-    let flights = div.querySelectorAll(".each-flight-div-box");
-    for (let i = 0; i < flights.length; i++) {
-        if (flights[i].querySelector(".flight-price span").innerText > parseInt(value)) {
-            //flights[i].style.display = 'none';
-            flights[i].classList.add('hide');
-            flights[i].classList.remove('show');
-        }
-        else {
-            //flights[i].style.display = 'block';
-            flights[i].classList.add('show');
-            flights[i].classList.remove('hide');
-        }
-    }
-    
 }
 
 function reset_filter() {
@@ -290,12 +207,11 @@ function reset_filter() {
     document.querySelector(".filter-price input[type=range]").value = max;
     document.querySelector(".filter-price .final-price-value").innerText = max;
 
-    let flights = document.querySelector("#flights_div").querySelectorAll(".each-flight-div-box");
-    for (let i = 0; i < flights.length; i++) {
-            //flights[i].style.display = 'block';
-            flights[i].classList.add('show');
-            flights[i].classList.remove('hide');
+    let airline = document.querySelector(".filter-airline select");
+    if (airline) {
+        airline.value = '';
     }
+    load_results('');
 }
 
 
@@ -308,22 +224,6 @@ function reset_filter() {
 function filter_price2() {
     let value = document.querySelector(".filter-price2 input[type=range]").value;
     document.querySelector(".filter-price2 .final-price-value").innerText = value;
-
-    let div = document.querySelector("#flights_div2");
-    let flights = div.querySelectorAll(".each-flight-div-box");
-    for (let i = 0; i < flights.length; i++) {
-        if (flights[i].querySelector(".flight-price span").innerText > parseInt(value)) {
-            //flights[i].style.display = 'none';
-            flights[i].classList.add('hide');
-            flights[i].classList.remove('show');
-        }
-        else {
-            //flights[i].style.display = 'block';
-            flights[i].classList.add('show');
-            flights[i].classList.remove('hide');
-        }
-    }
-    
 }
 
 function reset_filter2() {
@@ -334,12 +234,11 @@ function reset_filter2() {
     document.querySelector(".filter-price2 input[type=range]").value = max;
     document.querySelector(".filter-price2 .final-price-value").innerText = max;
 
-    let flights = document.querySelector("#flights_div2").querySelectorAll(".each-flight-div-box");
-    for (let i = 0; i < flights.length; i++) {
-            //flights[i].style.display = 'block';
-            flights[i].classList.add('show');
-            flights[i].classList.remove('hide');
+    let airline = document.querySelector(".filter-airline2 select");
+    if (airline) {
+        airline.value = '';
     }
+    load_results('2');
 }
 
 ////////////////////////////////
@@ -0,0 +1,12 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def seats_left(flight, running_low):
+    """
+    Seats left on a flight of the search results when it is running low, else None
+    ({% with left=flight|seats_left:seats_left %})
+    """
+    return running_low.get(flight.id) if running_low else None
@@ -1,3 +1,1273 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time as time_module
+import unittest
+from unittest import mock
+from datetime import date, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.html import escapejs
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .cabin_layouts import compile_layout, seat_map_template
+from .connections import find_connections
+from .models import Flight, MetroArea, Place, ScheduleVersion, Seat, SeatAvailability, SeatEvent, User, Week
+from .seat_manager import book_seat, book_seats, get_seats, cleanup_expired_reservations, provision_departures, reconcile_seat_counters, unseeded_departures, departure_seats, get_seat_map, ensure_seats_for_departure, release_seat, reserve_seat, reserve_seats, seat_availability, seat_key, seat_map_changes, seat_price
+from .seat_assign import auto_assign_seats, candidate_blocks, seat_adjacency
+from .seat_events import DatabaseBackend, broker, departure_channel
+from .seat_grid import render_seat_grid
+from .seat_stream import seat_stream
+from .seat_wire import SEAT_MAP_MEDIA_TYPE, unpack_statuses
+from .search_filters import apply_filters, paginate, parse_filters
+from . import search_cache, search_index
+from .search_cache import search_cache_stats
+from .search_index import build_schedule_index, find_flights, find_flights_between, get_schedule_index, invalidate_schedule_index, weekday_min_fares
+from .single_flight import SingleFlight
+from .place_index import PlaceIndex, invalidate_place_index
+from .utils import addMetroAreas
+
+
+def make_place(code, city):
+    place, _ = Place.objects.get_or_create(code=code, defaults={'city': city, 'airport': f"{city} Airport", 'country': 'Testland'})
+    return place
+
+
+def make_flight(origin, destination, weekdays, economy_fare=5000.0, depart_time=time(8, 0)):
+    flight = Flight.objects.create(
+        origin=origin, destination=destination, depart_time=depart_time,
+        duration=timedelta(hours=2), arrival_time=time(depart_time.hour + 2, depart_time.minute),
+        plane='TT100', airline='Test Air', economy_fare=economy_fare, business_fare=0.0, first_fare=0.0
+    )
+    for number in weekdays:
+        flight.depart_day.add(Week.objects.get_or_create(number=number, defaults={'name': str(number)})[0])
+    flight.save()
+    return flight
+
+
+class DepartDaysTests(TestCase):
+
+    def setUp(self):
+        invalidate_schedule_index()
+        self.origin = make_place('QQA', 'Alpha')
+        self.destination = make_place('QQB', 'Beta')
+
+    def test_mask_follows_depart_day_relation(self):
+        flight = make_flight(self.origin, self.destination, [0, 2])
+        flight.refresh_from_db()
+        self.assertEqual(flight.depart_days, 0b101)
+
+        flight.depart_day.remove(Week.objects.get(number=0))
+        flight.refresh_from_db()
+        self.assertEqual(flight.depart_days, 0b100)
+
+        Week.objects.get(number=2).flights_of_the_day.clear()
+        flight.refresh_from_db()
+        self.assertEqual(flight.depart_days, 0)
+
+    def test_operating_on_uses_mask(self):
+        monday = make_flight(self.origin, self.destination, [0])
+        make_flight(self.origin, self.destination, [3])
+        self.assertEqual(list(Flight.objects.filter(origin=self.origin).operating_on(0)), [monday])
+
+    def test_index_build_is_one_query(self):
+        make_flight(self.origin, self.destination, [0, 1])
+        make_flight(self.origin, self.destination, [1], economy_fare=3000.0)
+        with self.assertNumQueries(1):
+            build_schedule_index()
+
+    @mock.patch.object(search_cache, 'VERSION_CHECK_INTERVAL', 60)
+    def test_search_after_warm_up_only_resolves_places(self):
+        cheap = make_flight(self.origin, self.destination, [0], economy_fare=3000.0)
+        dear = make_flight(self.origin, self.destination, [0], economy_fare=4000.0)
+        self.assertEqual(list(find_flights('QQA', 'QQB', 0, 'economy')), [cheap, dear])
+
+        params = {'Origin': 'QQA', 'Destination': 'QQB', 'TripType': '1', 'DepartDate': '2030-01-07', 'SeatClass': 'economy'}
+        # The two places and the seat counters of the results
+        with self.assertNumQueries(3):
+            response = self.client.get('/flight', params, HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'TT100', count=None)
+
+
+class ScheduleIndexTests(TestCase):
+
+    def setUp(self):
+        self.origin = make_place('QQA', 'Alpha')
+        self.destination = make_place('QQB', 'Beta')
+        self.dear = make_flight(self.origin, self.destination, [0, 3], economy_fare=4000.0)
+        self.cheap = make_flight(self.origin, self.destination, [0], economy_fare=3000.0)
+        invalidate_schedule_index()
+
+    def test_routes_are_keyed_by_weekday_and_cabin_cheapest_first(self):
+        self.cheap.business_fare = 9000.0
+        self.cheap.save()
+        index = build_schedule_index()
+        self.assertEqual(index[('QQA', 'QQB', 0, 'economy')], (self.cheap, self.dear))
+        self.assertEqual(index[('QQA', 'QQB', 3, 'economy')], (self.dear,))
+        self.assertEqual(index[('QQA', 'QQB', 0, 'business')], (self.cheap,))
+        # No fare, no entry; nothing on Tuesdays; direction matters
+        self.assertNotIn(('QQA', 'QQB', 0, 'first'), index)
+        self.assertEqual(find_flights('QQA', 'QQB', 1, 'economy'), ())
+        self.assertEqual(find_flights('QQB', 'QQA', 0, 'economy'), ())
+
+    def test_equal_fares_keep_id_order(self):
+        twin = make_flight(self.origin, self.destination, [0], economy_fare=3000.0)
+        self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), (self.cheap, twin, self.dear))
+
+    @mock.patch.object(search_cache, 'VERSION_CHECK_INTERVAL', 60)
+    def test_warm_index_answers_without_queries(self):
+        find_flights('QQA', 'QQB', 0, 'economy')
+        with self.assertNumQueries(0):
+            self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), (self.cheap, self.dear))
+
+    def test_weekday_change_bumps_the_version_once(self):
+        version = search_cache.current_version()
+        self.dear.depart_day.remove(Week.objects.get(number=0))
+        self.assertEqual(ScheduleVersion.objects.get(pk=1).version, version + 1)
+        self.cheap.depart_day.clear()
+        self.assertEqual(ScheduleVersion.objects.get(pk=1).version, version + 2)
+
+    def test_flight_changes_rebuild_the_index(self):
+        self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), (self.cheap, self.dear))
+
+        self.dear.economy_fare = 2000.0
+        self.dear.save()
+        self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), (self.dear, self.cheap))
+
+        self.dear.depart_day.remove(Week.objects.get(number=0))
+        self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), (self.cheap,))
+
+        self.cheap.delete()
+        self.assertEqual(find_flights('QQA', 'QQB', 0, 'economy'), ())
+        self.assertEqual(find_flights('QQA', 'QQB', 3, 'economy'), (self.dear,))
+
+
+class PlaceIndexTests(TestCase):
+
+    def setUp(self):
+        self.places = [
+            Place(code='DEL', city='Delhi', airport='Indira Gandhi International', country='India'),
+            Place(code='IDR', city='Indore', airport='Devi Ahilya Bai Holkar', country='India'),
+            Place(code='BOM', city='Mumbai', airport='Chhatrapati Shivaji', country='India'),
+            Place(code='DEN', city='Denver', airport='Denver International', country='United States'),
+        ]
+        self.index = PlaceIndex(self.places)
+
+    def codes(self, q, limit=10):
+        return [place['code'] for place in self.index.search(q, limit)]
+
+    def test_exact_code_then_code_and_city_prefixes(self):
+        self.assertEqual(self.codes('del'), ['DEL'])
+        self.assertEqual(self.codes('de'), ['DEL', 'DEN', 'IDR'])
+        self.assertEqual(self.codes('ind'), ['IDR', 'DEL', 'BOM'])
+
+    def test_matches_equal_a_substring_scan(self):
+        for q in ('i', 'an', 'nter', 'india', 'united st', 'shivaji', 'x'):
+            expected = {
+                place.code for place in self.places
+                if any(q in field.lower() for field in (place.city, place.airport, place.code, place.country))
+            }
+            self.assertEqual(set(self.codes(q)), expected, q)
+
+    def test_typos_find_places_sharing_most_trigrams(self):
+        self.assertEqual(self.codes('delhy'), ['DEL'])
+        self.assertEqual(self.codes('mumbia'), ['BOM'])
+        self.assertEqual(self.codes('qqqq'), [])
+
+    def test_results_are_capped(self):
+        self.assertEqual(len(self.codes('i', limit=2)), 2)
+        self.assertEqual(self.codes('   '), [])
+
+    def test_endpoint_sees_new_places(self):
+        invalidate_place_index()
+        self.assertEqual(self.client.get('/query/places/QQX', HTTP_HOST='127.0.0.1').json(), [])
+        make_place('QQX', 'Xeno')
+        self.assertEqual(self.client.get('/query/places/QQX', HTTP_HOST='127.0.0.1').json(), [{'code': 'QQX', 'city': 'Xeno', 'country': 'Testland'}])
+
+
+    def test_other_workers_follow_the_shared_version(self):
+        ScheduleVersion.objects.get_or_create(pk=1)
+        search_cache.bump_version()
+        self.assertEqual(self.client.get('/query/places/QQY', HTTP_HOST='127.0.0.1').json(), [])
+        # Written by another process: no signal here, only the version row moves
+        Place.objects.bulk_create([Place(code='QQY', city='Ypsilon', airport='Ypsilon Airport', country='Testland')])
+        with mock.patch.object(search_cache, '_version', (None, 0.0)):
+            ScheduleVersion.objects.filter(pk=1).update(version=F('version') + 1)
+            self.assertEqual(self.client.get('/query/places/QQY', HTTP_HOST='127.0.0.1').json(), [{'code': 'QQY', 'city': 'Ypsilon', 'country': 'Testland'}])
+
+    @mock.patch.object(search_cache, 'VERSION_CHECK_INTERVAL', 60)
+    def test_warm_index_answers_without_queries(self):
+        self.client.get('/query/places/del', HTTP_HOST='127.0.0.1')
+        with self.assertNumQueries(0):
+            self.client.get('/query/places/del', HTTP_HOST='127.0.0.1')
+
+class MetroAreaTests(TestCase):
+
+    def setUp(self):
+        invalidate_schedule_index()
+        invalidate_place_index()
+        self.airports = [make_place(code, 'New York') for code in ('JFK', 'LGA', 'EWR')]
+        self.destination = make_place('QQB', 'Beta')
+        MetroArea.objects.get(code='NYC').airports.clear()
+
+    def resolve(self, code):
+        # Imported here: importing views runs its data loading against the database in use
+        from .views import resolve_place
+        return resolve_place(code)
+
+    def search(self, origin):
+        params = {'Origin': origin, 'Destination': 'QQB', 'TripType': '1', 'DepartDate': '2030-01-07', 'SeatClass': 'economy'}
+        return self.client.get('/flight', params, HTTP_HOST='127.0.0.1')
+
+    def test_metro_without_airports_is_unknown(self):
+        self.assertEqual(self.resolve('NYC'), (None, None))
+        response = self.search('NYC')
+        self.assertTemplateUsed(response, 'flight/error.html')
+        self.assertTrue(response.context['error_message'].startswith("Airport code 'NYC' not found."))
+
+    def test_metro_code_and_city_resolve_to_member_airports(self):
+        addMetroAreas()
+        metro, codes = self.resolve('nyc')
+        self.assertEqual((metro.code, sorted(codes)), ('NYC', ['EWR', 'JFK', 'LGA']))
+        self.assertEqual(self.resolve('New York')[0], metro)
+        self.assertEqual(self.resolve('JFK'), (self.airports[0], ['JFK']))
+
+    def test_search_from_metro_covers_every_airport(self):
+        addMetroAreas()
+        flights = [make_flight(airport, self.destination, [0], economy_fare=fare) for airport, fare in zip(self.airports, (3000.0, 1000.0, 2000.0))]
+        response = self.search('NYC')
+        self.assertEqual(response.context['flights'], [flights[1], flights[2], flights[0]])
+
+    def test_unknown_code_suggests_close_places(self):
+        response = self.search('QQZZ')
+        self.assertTemplateUsed(response, 'flight/error.html')
+        self.assertEqual(response.context['error_message'], "Airport code 'QQZZ' not found.")
+        self.assertIn("Did you mean JFK", self.search('JFKX').context['error_message'])
+
+
+class SearchCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        origin, destination = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta')
+        self.flights = [make_flight(origin, destination, [0], economy_fare=fare) for fare in (2000.0, 1000.0)]
+        invalidate_schedule_index()
+
+    def search(self):
+        return find_flights_between(['QQA'], ['QQB'], 0, 'economy')
+
+    def counters(self):
+        stats = search_cache_stats()
+        return stats['hits'], stats['misses']
+
+    def test_current_index_bypasses_the_result_cache(self):
+        get_schedule_index()
+        self.assertEqual(self.search(), (self.flights[1], self.flights[0]))
+        self.assertEqual(self.counters(), (0, 0))
+
+    @mock.patch.object(search_cache, 'VERSION_CHECK_INTERVAL', 60)
+    def test_cold_worker_answers_from_cached_ids(self):
+        self.assertEqual(self.search(), (self.flights[1], self.flights[0]))
+        self.assertEqual(self.counters(), (0, 1))
+
+        # A worker that has not built its index yet
+        search_index._index = None
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search(), (self.flights[1], self.flights[0]))
+        self.assertEqual(self.counters(), (1, 1))
+        self.assertIsNone(search_index._index)
+
+    def test_change_made_by_another_process_is_seen(self):
+        self.assertEqual(self.search()[0], self.flights[1])
+        # A fare script elsewhere: writes without this process's signals, then raises the version
+        Flight.objects.filter(id=self.flights[0].id).update(economy_fare=500.0)
+        ScheduleVersion.objects.update(version=F('version') + 1)
+        with mock.patch.object(search_cache, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(self.search()[0].id, self.flights[0].id)
+
+
+class WeekdayMinFaresTests(TestCase):
+
+    def setUp(self):
+        self.alpha, self.beta, self.gamma = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), make_place('QQC', 'Gamma')
+        make_flight(self.alpha, self.beta, [0, 2], economy_fare=3000.0)
+        make_flight(self.alpha, self.beta, [0], economy_fare=2500.0)
+        make_flight(self.gamma, self.beta, [2, 4], economy_fare=2000.0)
+        invalidate_schedule_index()
+
+    def test_cheapest_fare_per_weekday(self):
+        self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'economy'), (2500.0, None, 3000.0, None, None, None, None))
+        self.assertEqual(weekday_min_fares(['QQA', 'QQC'], ['QQB'], 'economy'), (2500.0, None, 2000.0, None, 2000.0, None, None))
+        self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'business'), (None,) * 7)
+
+    def test_same_airport_pairs_are_skipped(self):
+        make_flight(self.beta, self.beta, [1], economy_fare=100.0)
+        self.assertEqual(weekday_min_fares(['QQA', 'QQB'], ['QQB'], 'economy')[1], None)
+
+    def test_minima_follow_schedule_changes(self):
+        self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'economy')[0], 2500.0)
+        make_flight(self.alpha, self.beta, [0], economy_fare=1500.0)
+        self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'economy')[0], 1500.0)
+
+    def test_minima_of_a_replaced_index_are_not_kept(self):
+        # The index was rebuilt while these minima were computed from the old one
+        with mock.patch.object(search_index, 'get_schedule_index', return_value={}):
+            self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'economy')[0], None)
+        self.assertEqual(weekday_min_fares(['QQA'], ['QQB'], 'economy')[0], 2500.0)
+
+
+class ConnectionTests(TestCase):
+
+    def setUp(self):
+        invalidate_schedule_index()
+        self.origin, self.destination = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta')
+        self.slow_hub, self.fast_hub = make_place('QQC', 'Gamma'), make_place('QQD', 'Delta')
+        make_flight(self.origin, self.slow_hub, [0], economy_fare=1000.0, depart_time=time(8, 0))
+        make_flight(self.slow_hub, self.destination, [0], economy_fare=1000.0, depart_time=time(14, 0))
+        make_flight(self.origin, self.fast_hub, [0], economy_fare=1000.0, depart_time=time(8, 0))
+        make_flight(self.fast_hub, self.destination, [0], economy_fare=1000.0, depart_time=time(11, 0))
+
+    def test_same_fare_ties_go_to_the_faster_itinerary(self):
+        itineraries = find_connections('QQA', 'QQB', 0, 'economy', max_stops=1, limit=1)
+        self.assertEqual(len(itineraries), 1)
+        self.assertEqual(itineraries[0]['fare'], 2000.0)
+        self.assertEqual(itineraries[0]['duration_minutes'], 5 * 60)
+        self.assertEqual(itineraries[0]['legs'][0]['flight'].destination, self.fast_hub)
+
+    def test_no_itineraries_without_stops(self):
+        self.assertEqual(find_connections('QQA', 'QQB', 0, 'economy', max_stops=0), [])
+
+    def test_api_rejects_stops_and_limit_out_of_range(self):
+        params = {'origin': 'QQA', 'destination': 'QQB', 'date': '2030-01-07'}
+        self.assertEqual(len(self.client.get('/api/flights/connections', dict(params, stops='1'), HTTP_HOST='127.0.0.1').json()['itineraries']), 2)
+        for extra in ({'stops': '0'}, {'stops': '-1'}, {'stops': '3'}, {'limit': '0'}, {'limit': '-2'}):
+            response = self.client.get('/api/flights/connections', dict(params, **extra), HTTP_HOST='127.0.0.1')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'success': False, 'error': 'Invalid date, limit or stops'})
+
+    def test_fastest_first(self):
+        make_flight(self.origin, self.slow_hub, [0], economy_fare=500.0, depart_time=time(6, 0))
+        itineraries = find_connections('QQA', 'QQB', 0, 'economy', max_stops=1, sort='duration')
+        self.assertEqual([itinerary['duration_minutes'] for itinerary in itineraries], [5 * 60, 8 * 60, 10 * 60])
+        self.assertEqual(find_connections('QQA', 'QQB', 0, 'economy', max_stops=1)[0]['fare'], 1500.0)
+
+
+class SearchApiTests(TestCase):
+
+    def setUp(self):
+        invalidate_schedule_index()
+        self.origin = make_place('QQA', 'Alpha')
+        self.destination = make_place('QQB', 'Beta')
+
+    def search(self, **params):
+        params = dict({'origin': 'QQA', 'destination': 'QQB', 'date': '2030-01-07'}, **params)
+        response = self.client.get('/api/flights/search', params, HTTP_HOST='127.0.0.1')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_direct_flights_cheapest_first(self):
+        dear = make_flight(self.origin, self.destination, [0], economy_fare=4000.0)
+        cheap = make_flight(self.origin, self.destination, [0, 1], economy_fare=3000.0)
+        make_flight(self.origin, self.destination, [2], economy_fare=1000.0)
+
+        lines = self.search()
+        self.assertEqual([line['flight_id'] for line in lines[:-1]], [cheap.id, dear.id])
+        self.assertEqual(lines[0]['date'], '2030-01-07')
+        self.assertEqual(lines[0]['fare'], 3000.0)
+        self.assertEqual(lines[-1], {'type': 'end', 'flights': 2, 'connections': 0})
+
+    def test_adds_connections_when_stops_allowed(self):
+        hub = make_place('QQC', 'Gamma')
+        make_flight(self.origin, hub, [0], depart_time=time(8, 0))
+        make_flight(hub, self.destination, [0], depart_time=time(12, 0))
+
+        lines = self.search(stops='1')
+        self.assertEqual([line['type'] for line in lines], ['connection', 'end'])
+        self.assertEqual([leg['origin'] for leg in lines[0]['legs']], ['QQA', 'QQC'])
+
+    def test_streams_under_the_asgi_application(self):
+        from capstone.asgi import application
+        flight = make_flight(self.origin, self.destination, [0], economy_fare=3000.0)
+
+        async def run():
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                messages.append(message)
+
+            await application({
+                'type': 'http', 'method': 'GET', 'path': '/api/flights/search',
+                'query_string': b'origin=QQA&destination=QQB&date=2030-01-07',
+                'headers': [(b'host', b'127.0.0.1')], 'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 1),
+            }, receive, send)
+            return messages
+
+        # As the test client does: the test transaction's connection must stay open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            messages = async_to_sync(run)()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual(messages[0]['status'], 200)
+        lines = [json.loads(line) for line in b''.join(message.get('body', b'') for message in messages[1:]).decode().splitlines()]
+        self.assertEqual([line.get('flight_id') for line in lines], [flight.id, None])
+        self.assertEqual(lines[-1], {'type': 'end', 'flights': 1, 'connections': 0})
+
+    def test_rejects_limit_below_one(self):
+        for limit in ('0', '-3'):
+            response = self.client.get('/api/flights/search', {'origin': 'QQA', 'destination': 'QQB', 'date': '2030-01-07', 'limit': limit}, HTTP_HOST='127.0.0.1')
+            self.assertEqual(response.json(), {'success': False, 'error': 'Invalid date, limit or stops'})
+
+    def test_failure_is_logged_not_sent(self):
+        make_flight(self.origin, self.destination, [0])
+        with mock.patch('flight.search_stream.find_connections', side_effect=RuntimeError('no such table: secret')):
+            with self.assertLogs('flight.search_stream', 'ERROR') as logs:
+                lines = self.search(stops='1')
+        self.assertEqual(lines[-1], {'type': 'error', 'error': 'Search failed'})
+        self.assertIn('no such table: secret', logs.output[0])
+
+    def test_rejects_unknown_place(self):
+        response = self.client.get('/api/flights/search', {'origin': 'QQZ', 'destination': 'QQB', 'date': '2030-01-07'}, HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.json(), {'success': False, 'error': 'Unknown origin or destination'})
+
+
+class SearchFilterTests(TestCase):
+
+    def setUp(self):
+        invalidate_schedule_index()
+        self.origin = make_place('QQA', 'Alpha')
+        self.destination = make_place('QQB', 'Beta')
+        self.flights = [
+            make_flight(self.origin, self.destination, [0], economy_fare=1000.0 * (index + 1), depart_time=time(6 + index, 0))
+            for index in range(5)
+        ]
+        self.flights[1].airline = 'Other Air'
+        self.flights[1].save()
+        invalidate_schedule_index()
+        self.params = {'Origin': 'QQA', 'Destination': 'QQB', 'DepartDate': '2030-01-07', 'SeatClass': 'economy', 'TripType': '1'}
+
+    def results(self, **params):
+        return self.client.get('/flight/results', dict(self.params, **params), HTTP_HOST='127.0.0.1').json()
+
+    def test_filters_keep_flights_passing_all_of_them(self):
+        flights = sorted(Flight.objects.all(), key=lambda flight: flight.id)
+        filters = parse_filters({'depart_from': '7', 'depart_to': '10', 'airline': 'Test Air', 'max_price': '3500'})
+        self.assertEqual(apply_filters(flights, 'economy', filters), [self.flights[2]])
+
+    def test_pages_follow_the_cursor_without_gaps(self):
+        ids = []
+        after = ''
+        while True:
+            filters = parse_filters({'sort': 'depart', 'after': after})
+            page, after = paginate(Flight.objects.all(), 'economy', filters['sort'], filters['after'], page_size=2)
+            ids.extend(flight.id for flight in page)
+            if after is None:
+                break
+        self.assertEqual(ids, [flight.id for flight in self.flights])
+
+    def shown(self, html):
+        return [int(flight_id) for flight_id in re.findall(r'name="flight1Id" value="(\d+)"', html)]
+
+    def test_results_endpoint_pages_through_the_search(self):
+        first = self.results()
+        self.assertEqual((self.shown(first['html']), first['next']), ([flight.id for flight in self.flights], None))
+
+        after = f"2000.0_{self.flights[1].id}"
+        self.assertEqual(self.shown(self.results(after=after)['html']), [flight.id for flight in self.flights[2:]])
+        self.assertEqual(self.shown(self.results(airline='Other Air')['html']), [self.flights[1].id])
+
+    def test_malformed_cursor_is_an_invalid_filter(self):
+        for after in ('abc', '1.0', 'nan_1', '1.0_2.0_3.0'):
+            with self.assertRaises(ValueError):
+                parse_filters({'after': after})
+            self.assertEqual(self.results(after=after), {'success': False, 'error': 'Invalid filter'})
+
+        response = self.client.get('/flight', dict(self.params, after='abc'), HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['flights']), 5)
+
+
+class SeatInventoryTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.next_monday = date(2030, 1, 14)
+        User.objects.create_user('flyer', password='secret')
+        self.client.login(username='flyer', password='secret')
+
+    def open_seat_map(self, departure_date):
+        params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': departure_date.strftime('%d-%m-%Y')}
+        return self.client.get('/flight/seats', params, HTTP_HOST='127.0.0.1')
+
+    def seat_statuses(self, departure_date):
+        return {seat['number']: seat['status'] for seat in departure_seats(self.flight, departure_date, 'economy')}
+
+    def test_sparse_storage_keeps_only_held_seats(self):
+        self.assertEqual(self.open_seat_map(self.monday).status_code, 200)
+        self.assertFalse(Seat.objects.exists())
+
+        self.assertTrue(reserve_seat(seat_key(self.flight.id, self.monday, '12A'))['success'])
+        self.assertTrue(book_seat(seat_key(self.flight.id, self.monday, '12B'))['success'])
+        self.assertEqual(Seat.objects.count(), 2)
+        statuses = self.seat_statuses(self.monday)
+        self.assertEqual(len(statuses), 150)
+        self.assertEqual((statuses['12A'], statuses['12B'], statuses['12C']), ('reserved', 'booked', 'available'))
+
+        self.assertTrue(release_seat(seat_key(self.flight.id, self.monday, '12A'))['success'])
+        self.assertEqual(Seat.objects.count(), 1)
+
+    def test_seat_cannot_be_held_twice(self):
+        key = seat_key(self.flight.id, self.monday, '3C')
+        self.assertTrue(reserve_seat(key)['success'])
+        self.assertEqual(reserve_seat(key), {'success': False, 'error': 'Seat is already reserved'})
+        self.assertTrue(book_seat(key)['success'])
+        self.assertFalse(book_seat(key)['success'])
+        self.assertFalse(reserve_seat(seat_key(self.flight.id, self.monday, '99Z'))['success'])
+
+    @override_settings(SEAT_STORAGE='dense')
+    def test_dense_storage_creates_seats_when_a_departure_is_opened(self):
+        self.assertEqual(self.open_seat_map(self.monday).status_code, 200)
+        self.assertEqual(Seat.objects.filter(flight=self.flight, departure_date=self.monday).count(), 150)
+
+        self.assertEqual(ensure_seats_for_departure(self.flight, self.monday), 0)
+        self.assertEqual(Seat.objects.count(), 150)
+        self.assertTrue(book_seat(seat_key(self.flight.id, self.monday, '12A'))['success'])
+        self.assertEqual(Seat.objects.count(), 150)
+
+    def test_seats_come_back_in_cabin_order(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('10A', '2C', '2A', '1F')]
+        self.assertTrue(reserve_seats(keys[:2])['success'])
+        self.assertTrue(book_seat(keys[2])['success'])
+        with override_settings(SEAT_STORAGE='dense'):
+            self.assertEqual(ensure_seats_for_departure(self.flight, self.next_monday), 150)
+
+        self.assertEqual([(seat.row, seat.column) for seat in get_seats(keys)], [(2, 'A'), (2, 'C'), (10, 'A')])
+        seats = Seat.objects.filter(departure_date=self.next_monday).order_by('row', 'column')
+        self.assertEqual([seat.seat_number for seat in seats[5:8]], ['1F', '2A', '2B'])
+
+    def test_booking_is_limited_to_its_departure(self):
+        self.assertTrue(book_seat(seat_key(self.flight.id, self.monday, '12A'))['success'])
+        self.assertEqual(self.seat_statuses(self.monday)['12A'], 'booked')
+        self.assertEqual(self.seat_statuses(self.next_monday)['12A'], 'available')
+
+    def test_rejects_date_the_flight_does_not_operate(self):
+        self.assertEqual(self.open_seat_map(date(2030, 1, 8)).status_code, 404)
+        self.assertFalse(Seat.objects.exists())
+
+
+class GroupBookingTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.keys = [seat_key(self.flight.id, self.monday, number) for number in ('7A', '7B', '7C')]
+
+    def statuses(self):
+        return dict(Seat.objects.values_list('seat_number', 'status'))
+
+    def test_books_group_of_unstored_seats(self):
+        self.assertEqual(book_seats(self.keys), {'success': True, 'seat_ids': self.keys})
+        self.assertEqual(self.statuses(), {'7A': 'booked', '7B': 'booked', '7C': 'booked'})
+
+    def test_books_reserved_group_with_one_update(self):
+        self.assertTrue(reserve_seats(self.keys)['success'])
+        self.assertEqual(self.statuses(), {'7A': 'reserved', '7B': 'reserved', '7C': 'reserved'})
+        # The UPDATE, the version bump and the seat recount of the departure, inside the savepoint of transaction.atomic()
+        with self.assertNumQueries(6):
+            self.assertTrue(book_seats(self.keys)['success'])
+        self.assertEqual(self.statuses(), {'7A': 'booked', '7B': 'booked', '7C': 'booked'})
+
+    def test_seat_addressed_by_row_id_is_recorded(self):
+        self.assertTrue(reserve_seats(self.keys[:1])['success'])
+        seat = Seat.objects.get(seat_number='7A')
+        version, _ = seat_map_changes(self.flight, self.monday, 'economy')
+
+        self.assertTrue(book_seats([str(seat.id)])['success'])
+        self.assertEqual(seat_map_changes(self.flight, self.monday, 'economy', version), (version + 1, {'7A'}))
+        counter = SeatAvailability.objects.get(flight=self.flight, departure_date=self.monday, seat_class='economy')
+        self.assertEqual((counter.reserved, counter.booked), (0, 1))
+
+    def test_group_fails_as_a_unit(self):
+        self.assertTrue(book_seat(self.keys[1])['success'])
+        self.assertTrue(reserve_seat(self.keys[0])['success'])
+
+        self.assertEqual(book_seats(self.keys), {'success': False, 'error': 'Seat is not available'})
+        self.assertEqual(self.statuses(), {'7A': 'reserved', '7B': 'booked'})
+        self.assertFalse(reserve_seats([self.keys[0], self.keys[2]])['success'])
+        self.assertFalse(book_seats([self.keys[2], seat_key(self.flight.id, self.monday, '99Z')])['success'])
+        self.assertEqual(self.statuses(), {'7A': 'reserved', '7B': 'booked'})
+
+
+class HoldExpiryTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.keys = [seat_key(self.flight.id, self.monday, f'{row}A') for row in range(1, 6)]
+        reserve_seats(self.keys)
+        Seat.objects.filter(seat_number__in=['1A', '2A', '3A']).update(reserved_until=timezone.now() - timedelta(minutes=1))
+
+    def test_sweep_releases_expired_holds_in_batches(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(cleanup_expired_reservations(batch_size=2), 3)
+        deletes = [query for query in context.captured_queries if query['sql'].startswith('DELETE FROM "flight_seat"')]
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(sorted(Seat.objects.values_list('seat_number', flat=True)), ['4A', '5A'])
+
+    def test_seat_reserved_again_after_the_batch_read_is_left_alone(self):
+        since, _ = seat_map_changes(self.flight, self.monday, 'economy')
+        reserved_again = []
+
+        def reserve_after_batch_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if 'ORDER BY "flight_seat"."reserved_until"' in sql and not reserved_again:
+                # Another worker takes seat 1A between the read and the release
+                reserved_again.append(Seat.objects.filter(seat_number='1A').update(
+                    reserved_until=timezone.now() + timedelta(minutes=10), version=F('version') + 1
+                ))
+            return result
+
+        with connection.execute_wrapper(reserve_after_batch_read):
+            self.assertEqual(cleanup_expired_reservations(), 2)
+        self.assertEqual(reserved_again, [1])
+        self.assertEqual(Seat.objects.get(seat_number='1A').status, 'reserved')
+        self.assertEqual(sorted(Seat.objects.values_list('seat_number', flat=True)), ['1A', '4A', '5A'])
+        version, changed = seat_map_changes(self.flight, self.monday, 'economy', since)
+        self.assertEqual(version, since + 1)
+        self.assertEqual(changed, {'2A', '3A'})
+
+    def test_seat_released_after_the_batch_read_is_not_released_twice(self):
+        since, _ = seat_map_changes(self.flight, self.monday, 'economy')
+
+        def release_after_batch_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if 'ORDER BY "flight_seat"."reserved_until"' in sql:
+                Seat.objects.filter(seat_number='1A').update(status='available', reserved_until=None)
+            return result
+
+        with override_settings(SEAT_STORAGE='dense'), connection.execute_wrapper(release_after_batch_read):
+            self.assertEqual(cleanup_expired_reservations(), 2)
+        self.assertEqual(Seat.objects.filter(status='available').count(), 3)
+        self.assertEqual(seat_map_changes(self.flight, self.monday, 'economy', since)[1], {'2A', '3A'})
+
+    def test_command_runs_one_sweep(self):
+        call_command('expire_seat_holds', '--once', stdout=StringIO())
+        self.assertEqual(Seat.objects.count(), 2)
+
+    def test_expired_holds_read_as_available(self):
+        seat_map = get_seat_map(self.flight, self.monday)
+        self.assertEqual([seat_map[str(row)]['A']['status'] for row in range(1, 6)], ['available'] * 3 + ['reserved'] * 2)
+        self.assertEqual(Seat.objects.count(), 5)
+
+        self.assertTrue(reserve_seat(self.keys[0])['success'])
+        self.assertFalse(reserve_seat(self.keys[3])['success'])
+
+    def test_seat_reads_do_not_write(self):
+        params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': '07-01-2030'}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/seats/available', params, HTTP_HOST='127.0.0.1')
+        self.assertTrue(response.json()['success'])
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in context.captured_queries))
+
+
+@override_settings(SEAT_STORAGE='dense')
+class ProvisionSeatsTests(TestCase):
+
+    def setUp(self):
+        origin, destination = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta')
+        self.monday_flight = make_flight(origin, destination, [0])
+        self.daily_flight = make_flight(origin, destination, [0, 1, 2, 3, 4, 5, 6])
+
+    def provision(self, *args):
+        out = StringIO()
+        call_command('provision_seats', '--start', '2030-01-07', '--days', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_seeds_each_departure_once(self):
+        self.assertEqual(
+            list(unseeded_departures([date(2030, 1, 7), date(2030, 1, 8)])),
+            [(self.monday_flight.id, date(2030, 1, 7)), (self.daily_flight.id, date(2030, 1, 7)), (self.daily_flight.id, date(2030, 1, 8))]
+        )
+        self.assertIn('Provisioned 3 departure(s) with 450 seats', self.provision('--chunk', '2'))
+        self.assertEqual(Seat.objects.filter(departure_date=date(2030, 1, 8)).count(), 150)
+        self.assertIn('0 departure(s) without seats', self.provision())
+
+    def test_restart_after_interruption_creates_no_duplicates(self):
+        provision_departures([(self.daily_flight.id, date(2030, 1, 7))])
+        book_seat(seat_key(self.monday_flight.id, date(2030, 1, 7), '4D'))
+        self.assertIn('Provisioned 2 departure(s)', self.provision())
+        self.assertEqual(Seat.objects.count(), 450)
+        self.assertEqual(Seat.objects.get(flight=self.monday_flight, seat_number='4D').status, 'booked')
+
+    @override_settings(SEAT_STORAGE='sparse')
+    def test_sparse_storage_provisions_nothing(self):
+        self.assertIn('nothing to provision', self.provision())
+        self.assertFalse(Seat.objects.exists())
+
+
+class SeatMapVersionTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.flight.first_fare = 30000.0
+        self.flight.save()
+        self.monday = date(2030, 1, 7)
+        self.params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': '07-01-2030'}
+
+    def get(self, **extra):
+        params = dict(self.params, **{key: value for key, value in extra.items() if key == 'since'})
+        headers = {key: value for key, value in extra.items() if key != 'since'}
+        return self.client.get('/api/seats/available', params, HTTP_HOST='127.0.0.1', **headers)
+
+    def test_unchanged_seat_map_is_not_modified(self):
+        response = self.get()
+        self.assertEqual((response.json()['version'], len(response.json()['seats'])), (0, 150))
+
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+        reserve_seats([seat_key(self.flight.id, self.monday, '2B')])
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, response.json()['version']), (200, 1))
+
+    def test_since_returns_changed_seats_only(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('2B', '3C')]
+        reserve_seats(keys)
+        version = self.get().json()['version']
+
+        book_seat(keys[0])
+        release_seat(keys[1])
+        data = self.get(since=version).json()
+        self.assertEqual(data['version'], version + 2)
+        self.assertEqual([(seat['number'], seat['status']) for seat in data['seats']], [('2B', 'booked'), ('3C', 'available')])
+        self.assertEqual(self.get(since=data['version']).json()['seats'], [])
+
+    def test_lapsed_hold_changes_the_etag(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('2B', '3C')]
+        reserve_seats(keys)
+        response = self.get()
+        version = response.json()['version']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # The hold of 2B runs out: no seat change, no new version
+        Seat.objects.filter(seat_number='2B').update(reserved_until=timezone.now() - timedelta(seconds=1))
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, response.json()['version']), (200, version))
+        self.assertEqual({seat['number']: seat['status'] for seat in response.json()['seats']}['2B'], 'available')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        data = self.get(since=version).json()
+        self.assertEqual([(seat['number'], seat['status']) for seat in data['seats']], [('2B', 'available')])
+
+    def test_cabin_version_ignores_other_cabins(self):
+        etag = self.get()['ETag']
+        book_seat(seat_key(self.flight.id, self.monday, '31A'))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(seat_map_changes(self.flight, self.monday, 'first'), (1, None))
+
+
+class PackedSeatMapTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+
+    def get(self, **headers):
+        params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': '07-01-2030'}
+        return self.client.get('/api/seats/available', params, HTTP_HOST='127.0.0.1', **headers)
+
+    def test_packed_seat_map_matches_json(self):
+        reserve_seats([seat_key(self.flight.id, self.monday, '1B')])
+        book_seat(seat_key(self.flight.id, self.monday, '2A'))
+        seats = self.get().json()['seats']
+
+        response = self.get(HTTP_ACCEPT=SEAT_MAP_MEDIA_TYPE)
+        self.assertEqual(response['Content-Type'], SEAT_MAP_MEDIA_TYPE)
+        data = response.json()
+        self.assertEqual((data['layout'], data['count'], data['prices'], data['version']), ('standard', 150, [5000.0], 2))
+        self.assertNotIn('price_codes', data)
+        self.assertEqual(unpack_statuses(data['statuses'], data['count']), [seat['status'] for seat in seats])
+        self.assertLess(len(response.content) * 20, len(self.get().content))
+
+    def test_seats_with_other_prices_get_price_codes(self):
+        book_seat(seat_key(self.flight.id, self.monday, '1C'))
+        Seat.objects.filter(seat_number='1C').update(price=7000.0)
+        data = self.get(HTTP_ACCEPT=SEAT_MAP_MEDIA_TYPE).json()
+        self.assertEqual(data['prices'], [5000.0, 7000.0])
+        self.assertEqual(list(base64.b64decode(data['price_codes'])[:4]), [0, 0, 1, 0])
+
+    def test_representations_have_their_own_etags(self):
+        packed = self.get(HTTP_ACCEPT=SEAT_MAP_MEDIA_TYPE)
+        self.assertNotEqual(packed['ETag'], self.get()['ETag'])
+        self.assertEqual(self.get(HTTP_ACCEPT=SEAT_MAP_MEDIA_TYPE, HTTP_IF_NONE_MATCH=packed['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=packed['ETag']).status_code, 200)
+
+
+class SeatGridTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.client.force_login(User.objects.create(username='traveller'))
+
+    def page(self):
+        params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': '07-01-2030'}
+        with CaptureQueriesContext(connection) as queries:
+            html = self.client.get('/flight/seats', params, HTTP_HOST='127.0.0.1').content.decode()
+        return html, [query['sql'] for query in queries]
+
+    def test_grid_is_served_from_cache_until_a_seat_changes(self):
+        html, queries = self.page()
+        self.assertEqual(html.count('class="seat available"'), 150)
+        self.assertTrue(any('"flight_seat"' in sql for sql in queries))
+
+        cached, queries = self.page()
+        self.assertEqual(cached, html)
+        self.assertFalse(any('"flight_seat"' in sql for sql in queries))
+
+        book_seat(seat_key(self.flight.id, self.monday, '2B'))
+        html, queries = self.page()
+        self.assertIn(f'class="seat booked" data-seat-id="{seat_key(self.flight.id, self.monday, "2B")}"', html)
+        self.assertIn('let seatMapVersion = 1;', html)
+
+    def test_page_etag_matches_the_seat_map_it_shows(self):
+        reserve_seat(seat_key(self.flight.id, self.monday, '5E'))
+        self.page()
+        html, queries = self.page()
+        self.assertFalse(any('"flight_seat"' in sql for sql in queries))
+        params = {'flight_id': self.flight.id, 'seat_class': 'economy', 'depart_date': '07-01-2030'}
+        etag = self.client.get('/api/seats/available', params, HTTP_HOST='127.0.0.1', HTTP_ACCEPT=SEAT_MAP_MEDIA_TYPE)['ETag']
+        self.assertIn(f"let seatMapETag = '{escapejs(etag)}';", html)
+
+    def test_unknown_seat_class_is_rejected(self):
+        params = {'flight_id': self.flight.id, 'seat_class': 'bogus', 'depart_date': '07-01-2030'}
+        response = self.client.get('/flight/seats', params, HTTP_HOST='127.0.0.1')
+        self.assertEqual((response.status_code, response.content), (400, b'Invalid seat class'))
+        self.assertIsNone(seat_price(self.flight, 'bogus'))
+        self.assertEqual(render_seat_grid(self.flight, self.monday, 'bogus')[0].count('class="seat'), 0)
+
+    def test_grid_with_a_hold_expires_with_it(self):
+        self.assertEqual(render_seat_grid(self.flight, self.monday, 'economy')[2], 60 * 60)
+        reserve_seat(seat_key(self.flight.id, self.monday, '5E'), duration_minutes=10)
+        self.assertLessEqual(render_seat_grid(self.flight, self.monday, 'economy')[2], 600)
+
+
+class SeatAvailabilityTests(TestCase):
+
+    def setUp(self):
+        self.origin, self.destination = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta')
+        self.flight = make_flight(self.origin, self.destination, [0])
+        self.monday = date(2030, 1, 7)
+
+    def counts(self):
+        counter = SeatAvailability.objects.get(flight=self.flight, departure_date=self.monday, seat_class='economy')
+        return counter.available, counter.reserved, counter.booked
+
+    def keys(self, *numbers):
+        return [seat_key(self.flight.id, self.monday, number) for number in numbers]
+
+    def test_counters_follow_seat_changes(self):
+        reserve_seats(self.keys('1A', '1B', '1C'))
+        self.assertEqual(self.counts(), (147, 3, 0))
+        book_seats(self.keys('1A', '1B'))
+        release_seat(self.keys('1C')[0])
+        self.assertEqual(self.counts(), (148, 0, 2))
+
+        reserve_seat(self.keys('2A')[0])
+        Seat.objects.filter(seat_number='2A').update(reserved_until=timezone.now() - timedelta(minutes=1))
+        cleanup_expired_reservations()
+        self.assertEqual(self.counts(), (148, 0, 2))
+        # Cabins without a fare get no counter
+        self.assertEqual(SeatAvailability.objects.count(), 1)
+
+    def test_lapsed_holds_count_as_available_before_the_sweep(self):
+        reserve_seats(self.keys('1A', '1B', '1C'))
+        Seat.objects.filter(seat_number='1A').update(reserved_until=timezone.now() - timedelta(minutes=1))
+        with self.assertNumQueries(1):
+            self.assertEqual(seat_availability([self.flight.id], self.monday, 'economy'), {self.flight.id: 148})
+        cleanup_expired_reservations()
+        self.assertEqual(seat_availability([self.flight.id], self.monday, 'economy'), {self.flight.id: 148})
+        self.assertEqual(self.counts(), (148, 2, 0))
+
+    def test_search_hides_sold_out_flights_and_flags_low_ones(self):
+        other = make_flight(self.origin, self.destination, [0], economy_fare=6000.0)
+        numbers = seat_adjacency('standard', 'economy').numbers
+        book_seats(self.keys(*numbers))
+        book_seats([seat_key(other.id, self.monday, number) for number in numbers[3:]])
+
+        params = {'Origin': 'QQA', 'Destination': 'QQB', 'TripType': '1', 'DepartDate': '2030-01-07', 'SeatClass': 'economy'}
+        response = self.client.get('/flight', params, HTTP_HOST='127.0.0.1')
+        self.assertEqual([flight.id for flight in response.context['flights']], [other.id])
+        self.assertContains(response, 'Only 3 seats left')
+
+    def test_reconciliation_repairs_drift(self):
+        book_seats(self.keys('1A', '1B'))
+        SeatAvailability.objects.update(booked=40)
+        Seat.objects.create(flight=self.flight, departure_date=date(2030, 1, 14), seat_number='3C', seat_class='economy', status='reserved', price=5000.0)
+
+        out = StringIO()
+        call_command('reconcile_seat_counters', '--check', stdout=out)
+        self.assertIn('Checked 2 departure(s), found 2', out.getvalue())
+        call_command('reconcile_seat_counters', stdout=out)
+        self.assertEqual(self.counts(), (148, 0, 2))
+        self.assertEqual(SeatAvailability.objects.get(departure_date=date(2030, 1, 14)).reserved, 1)
+        self.assertEqual(reconcile_seat_counters(), (2, 0))
+
+
+@override_settings(SEAT_EVENTS_BACKEND='flight.seat_events.LocalBackend')
+class SeatEventTests(TransactionTestCase):
+    # on_commit callbacks only run when the transaction really commits
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.channel = departure_channel(self.flight.id, self.monday)
+        self.events = []
+        self.addCleanup(broker.subscribe(self.channel, self.events.append))
+
+    def changes(self):
+        return [(seat['number'], seat['status']) for event in self.events for seat in event['seats']]
+
+    def test_seat_changes_are_published_on_commit(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('3A', '3B')]
+        reserve_seats(keys)
+        book_seat(keys[0])
+        release_seat(keys[1])
+        self.assertEqual(self.changes(), [('3A', 'reserved'), ('3B', 'reserved'), ('3A', 'booked'), ('3B', 'available')])
+
+        reserve_seat(keys[1])
+        Seat.objects.update(status='reserved', reserved_until=timezone.now() - timedelta(minutes=1))
+        self.events.clear()
+        cleanup_expired_reservations()
+        self.assertEqual(sorted(self.changes()), [('3A', 'available'), ('3B', 'available')])
+
+    def test_failed_claims_publish_nothing(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('3A', '3B')]
+        book_seat(keys[1])
+        self.events.clear()
+        self.assertFalse(book_seats(keys)['success'])
+        self.assertEqual(self.events, [])
+
+    def test_events_carry_the_inventory_version(self):
+        reserve_seat(seat_key(self.flight.id, self.monday, '3A'))
+        book_seat(seat_key(self.flight.id, self.monday, '3A'))
+        self.assertEqual([event['version'] for event in self.events], [1, 2])
+
+    def scope(self, since=None, last_event_id=None, logged_in=True, depart_date='07-01-2030'):
+        query = f'flight_id={self.flight.id}&depart_date={depart_date}&seat_class=economy'
+        if since is not None:
+            query += f'&since={since}'
+        headers = []
+        if logged_in:
+            self.client.force_login(User.objects.get_or_create(username='traveller')[0])
+            headers.append((b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'.encode()))
+        if last_event_id is not None:
+            headers.append((b'last-event-id', str(last_event_id).encode()))
+        return {'type': 'http', 'path': '/api/seats/stream', 'query_string': query.encode(), 'headers': headers}
+
+    def stream(self, scope, live_events=(), messages_wanted=1):
+        """
+        Run the stream until it sent messages_wanted seat messages, delivering
+        live_events once it is subscribed; returns its ASGI messages
+        """
+        async def run():
+            disconnect = asyncio.Event()
+            messages = []
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                body = message.get('body', b'')
+                if body.startswith(b'retry'):
+                    for event in live_events:
+                        broker.deliver(self.channel, event)
+                elif body.startswith(b'event') and sum(m.get('body', b'').startswith(b'event') for m in messages) >= messages_wanted:
+                    disconnect.set()
+
+            await seat_stream(scope, receive, send)
+            return messages
+
+        return async_to_sync(run)()
+
+    def seat_messages(self, messages):
+        events = []
+        for message in messages:
+            body = message.get('body', b'').decode()
+            if body.startswith('event: seats\n'):
+                fields = dict(line.split(': ', 1) for line in body.strip().splitlines())
+                events.append((int(fields['id']), [(seat['number'], seat['status']) for seat in json.loads(fields['data'])]))
+        return events
+
+    def test_stream_sends_changes_of_its_cabin(self):
+        key = seat_key(self.flight.id, self.monday, '4C')
+        messages = self.stream(self.scope(since=0), [
+            # A first class change is filtered out, the economy one is sent
+            {'version': 1, 'seats': [{'id': 'x', 'number': '31A', 'status': 'booked'}]},
+            {'version': 2, 'seats': [{'id': key, 'number': '4C', 'status': 'booked'}]},
+        ])
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        self.assertEqual(self.seat_messages(messages), [(2, [('4C', 'booked')])])
+        # Only the subscription of the test is left
+        self.assertEqual(broker._subscribers[self.channel], {self.events.append})
+
+    def test_stream_starts_with_the_whole_cabin(self):
+        book_seat(seat_key(self.flight.id, self.monday, '4C'))
+        [(version, seats)] = self.seat_messages(self.stream(self.scope()))
+        self.assertEqual((version, len(seats)), (1, 150))
+        self.assertIn(('4C', 'booked'), seats)
+
+    def test_stream_resyncs_from_the_clients_version(self):
+        keys = [seat_key(self.flight.id, self.monday, number) for number in ('4C', '5D', '6E')]
+        book_seat(keys[0])
+        reserve_seats(keys[1:])
+        Seat.objects.filter(seat_number='6E').update(reserved_until=timezone.now() - timedelta(minutes=1))
+        resync = [(2, [('5D', 'reserved'), ('6E', 'available')])]
+        self.assertEqual(self.seat_messages(self.stream(self.scope(since=1))), resync)
+        # A reconnecting EventSource sends the id of the last message it got
+        self.assertEqual(self.seat_messages(self.stream(self.scope(since=0, last_event_id=1))), resync)
+
+        # Events already in the resync are not sent again
+        messages = self.stream(self.scope(since=1), [
+            {'version': 2, 'seats': [{'id': keys[1], 'number': '5D', 'status': 'reserved'}]},
+            {'version': 3, 'seats': [{'id': keys[1], 'number': '5D', 'status': 'booked'}]},
+        ], messages_wanted=2)
+        self.assertEqual(self.seat_messages(messages), resync + [(3, [('5D', 'booked')])])
+
+    def test_stream_requires_login(self):
+        messages = self.stream(self.scope(logged_in=False))
+        self.assertEqual((messages[0]['status'], json.loads(messages[1]['body'])), (403, {'success': False, 'error': 'Login required'}))
+        self.assertEqual(broker._subscribers[self.channel], {self.events.append})
+
+    def test_stream_rejects_unknown_departure(self):
+        self.assertEqual(self.stream(self.scope(depart_date='08-01-2030'))[0]['status'], 404)
+
+
+class DatabaseBackendTests(TransactionTestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+        self.events = []
+        self.backend = DatabaseBackend(lambda channel, event: self.events.append((channel, event)))
+
+    def test_seat_changes_reach_other_processes_through_the_table(self):
+        reserve_seat(seat_key(self.flight.id, self.monday, '3A'))
+        self.assertEqual(SeatEvent.objects.count(), 1)
+
+        self.backend.receive()
+        channel, event = self.events[0]
+        self.assertEqual(channel, departure_channel(self.flight.id, self.monday))
+        self.assertEqual([(seat['number'], seat['status']) for seat in event['seats']], [('3A', 'reserved')])
+        self.backend.receive()
+        self.assertEqual(len(self.events), 1)
+
+    def test_event_committed_after_a_later_one_is_delivered(self):
+        SeatEvent.objects.create(id=10, channel='later', event={'seats': []})
+        self.backend.receive()
+        SeatEvent.objects.create(id=9, channel='earlier', event={'seats': []})
+        self.backend.receive()
+        self.backend.receive()
+        self.assertEqual([channel for channel, event in self.events], ['later', 'earlier'])
+
+    def test_listening_starts_after_the_existing_events(self):
+        SeatEvent.objects.create(channel='old', event={'seats': []})
+        with mock.patch('threading.Thread'):
+            self.backend.listen()
+        self.backend.receive()
+        self.assertEqual(self.events, [])
+
+    def test_old_events_are_pruned(self):
+        SeatEvent.objects.create(channel='old', event={'seats': []})
+        SeatEvent.objects.update(created=timezone.now() - timedelta(hours=1))
+        self.backend.publish('new', {'seats': []})
+        self.assertEqual(list(SeatEvent.objects.values_list('channel', flat=True)), ['new'])
+
+
+def _use_database_file(path):
+    # Pool initializer: forked workers open their own connection to the shared file
+    connections['default'].settings_dict['NAME'] = path
+    connections['default'].connection = None
+
+
+def _book_all(keys):
+    keys = list(keys)
+    random.shuffle(keys)
+    return [(key, book_seat(key)) for key in keys]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite' and 'fork' in multiprocessing.get_all_start_methods(), "needs SQLite and fork")
+class SeatContentionTests(TransactionTestCase):
+    # Processes racing for the same seats through the conditional updates, on an SQLite file
+
+    @override_settings(SEAT_STORAGE='dense')
+    def test_each_seat_is_booked_once(self):
+        flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        monday = date(2030, 1, 7)
+        provision_departures([(flight.id, monday)])
+        keys = [seat_key(flight.id, monday, f'{row}{column}') for row in range(1, 5) for column in 'ABCDEF']
+
+        path = os.path.join(tempfile.mkdtemp(), 'contention.sqlite3')
+        self.addCleanup(os.remove, path)
+        with sqlite3.connect(path) as target:
+            connection.connection.backup(target)
+        with multiprocessing.get_context('fork').Pool(4, initializer=_use_database_file, initargs=(path,)) as pool:
+            results = [result for worker in pool.map(_book_all, [keys] * 4) for result in worker]
+
+        winners = sorted(key for key, result in results if result['success'])
+        self.assertEqual(winners, sorted(keys))
+        self.assertEqual({result['error'] for key, result in results if not result['success']}, {'Seat is not available for booking'})
+        with sqlite3.connect(path) as database:
+            rows = database.execute(
+                "SELECT status, version FROM flight_seat WHERE seat_number IN (%s)" % ','.join('?' * len(keys)),
+                [key.rsplit('-', 1)[-1] for key in keys]
+            ).fetchall()
+        self.assertEqual(rows, [('booked', 1)] * len(keys))
+
+
+class AutoAssignTests(TestCase):
+
+    def setUp(self):
+        self.flight = make_flight(make_place('QQA', 'Alpha'), make_place('QQB', 'Beta'), [0])
+        self.monday = date(2030, 1, 7)
+
+    def assign(self, party_size, preference=None):
+        result = auto_assign_seats(self.flight, self.monday, 'economy', party_size, preference)
+        return result.get('seat_numbers', result.get('error'))
+
+    def test_party_sits_in_one_row(self):
+        self.assertEqual(self.assign(3), ['1A', '1B', '1C'])
+        self.assertEqual(self.assign(2, 'aisle'), ['1D', '1E'])
+        self.assertEqual(self.assign(4), ['2A', '2B', '2C', '2D'])
+        self.assertEqual(Seat.objects.filter(status='reserved').count(), 9)
+
+    def test_nearly_full_cabin_uses_rows_next_to_each_other(self):
+        free = {'5A', '5B', '6A', '6B', '9F', '14F'}
+        numbers = [number for number in seat_adjacency('standard', 'economy').numbers if number not in free]
+        self.assertTrue(book_seats([seat_key(self.flight.id, self.monday, number) for number in numbers])['success'])
+
+        self.assertEqual(self.assign(4), ['5A', '5B', '6A', '6B'])
+        self.assertEqual(self.assign(2), ['9F', '14F'])
+        self.assertEqual(self.assign(1), 'Not enough seats available')
+
+    def test_candidate_blocks_are_precomputed(self):
+        blocks = candidate_blocks('standard', 'economy', 2, 'window')
+        self.assertIs(candidate_blocks('standard', 'economy', 2, 'window'), blocks)
+        adjacency = seat_adjacency('standard', 'economy')
+        self.assertEqual(blocks[0], adjacency.bits['1A'] | adjacency.bits['1B'])
+
+    def test_api_reserves_the_block(self):
+        payload = {'flight_id': self.flight.id, 'depart_date': '07-01-2030', 'seat_class': 'economy', 'party_size': 2, 'preference': 'window'}
+        data = self.client.post('/api/seats/auto-assign', payload, content_type='application/json', HTTP_HOST='127.0.0.1').json()
+        self.assertEqual(data['seat_ids'], [seat_key(self.flight.id, self.monday, number) for number in ('1A', '1B')])
+
+        payload['party_size'] = 12
+        data = self.client.post('/api/seats/auto-assign', payload, content_type='application/json', HTTP_HOST='127.0.0.1').json()
+        self.assertFalse(data['success'])
+
+
+    def test_api_tells_a_bad_flight_id_from_a_bad_party_size(self):
+        payload = {'flight_id': 'abc', 'depart_date': '07-01-2030', 'seat_class': 'economy', 'party_size': 2}
+
+        def post():
+            return self.client.post('/api/seats/auto-assign', payload, content_type='application/json', HTTP_HOST='127.0.0.1').json()
+
+        self.assertEqual(post(), {'success': False, 'error': 'Invalid flight id'})
+        payload.update(flight_id=self.flight.id, party_size='two')
+        self.assertEqual(post(), {'success': False, 'error': 'Invalid party size'})
+        payload.update(flight_id=self.flight.id + 1000, party_size=2)
+        self.assertEqual(post(), {'success': False, 'error': 'Flight not found'})
+
+class CabinLayoutTests(TestCase):
+
+    def test_template_is_compiled_once(self):
+        template = compile_layout('standard')
+        self.assertIs(compile_layout('standard'), template)
+        self.assertEqual(len(template.seats), 176)
+        self.assertEqual(template.by_number['27C'][1:], ('business', 27, 'C'))
+        self.assertEqual(template.cabins['economy'].column_groups, (('A', 'B', 'C'), ('D', 'E', 'F')))
+
+    def test_flight_uses_layout_of_its_aircraft(self):
+        origin, destination = make_place('QQA', 'Alpha'), make_place('QQB', 'Beta')
+        flight = make_flight(origin, destination, [0])
+        self.assertEqual(seat_map_template(flight).layout, 'standard')
+
+        flight.plane = 'a320'
+        flight.business_fare = 12000.0
+        self.assertEqual(seat_map_template(flight).layout, 'A320')
+        seats = list(departure_seats(flight, date(2030, 1, 7), 'business'))
+        self.assertEqual((len(seats), seats[0]['number'], seats[0]['price']), (12, '1A', 12000.0))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_computation(self):
+        single_flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            cache.set('key', 'result')
+            return 'result'
+
+        def call():
+            results.append(single_flight.do('key', compute, cache))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=call) for _ in range(10)]
+        for thread in followers:
+            thread.start()
+        # Release the leader only once every follower waits on its call
+        call_in_flight = single_flight._calls['key']
+        deadline = time_module.monotonic() + 5
+        while call_in_flight.waiters < len(followers) and time_module.monotonic() < deadline:
+            time_module.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 10)
+
+    def test_waits_for_result_of_other_worker(self):
+        cache.add('key:lock', 1)
+        threading.Timer(0.05, cache.set, ('key', 'from other worker')).start()
+        result = SingleFlight().do('key', lambda: 'computed here', cache)
+        self.assertEqual(result, ('from other worker', True))
@@ -8,6 +8,11 @@ urlpatterns = [
     path("register", views.register_view, name="register"),
     path("query/places/<str:q>", views.query, name="query"),
     path("flight", views.flight, name="flight"),
+    path("flight/results", views.flight_results, name="flight_results"),
+    path("api/flights/search", views.search_api, name="search_api"),
+    path("api/flights/connections", views.connections_api, name="connections"),
+    path("api/fares/calendar", views.fare_calendar, name="fare_calendar"),
+    path("api/search/cache-stats", views.search_cache_stats_view, name="search_cache_stats"),
     path("select_flight", views.select_flight, name="select_flight"),
     path("review", views.review, name="review"),
     path("flight/ticket/book", views.book, name="book"),
@@ -26,6 +31,7 @@ urlpatterns = [
     path('flight/seats', views.seat_selection, name="seat_selection"),
     path('api/seats/available', views.get_available_seats, name="available_seats"),
     path('api/seats/reserve', views.reserve_seat_view, name="reserve_seat"),
+    path('api/seats/auto-assign', views.auto_assign_seats_view, name="auto_assign_seats"),
     path('api/seats/release', views.release_seat_view, name="release_seat"),
     path('api/seats/confirm', views.confirm_seat_booking, name="confirm_booking"),
 ]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from datetime import timedelta, datetime
 from flight.models import *
-from .models import Week, Place, Flight
+from .models import Week, Place, Flight, MetroArea
 from tqdm import tqdm
 
 def get_number_of_lines(file):
@@ -32,6 +32,28 @@ def addPlaces():
             continue
     print("Done.\n")
 
+# Metro areas searched across all of their airports: code, city, country, airport codes
+METRO_AREAS = [
+    ('NYC', 'New York', 'United States', ['JFK', 'LGA', 'EWR']),
+    ('LON', 'London', 'United Kingdom', ['LHR', 'LGW', 'STN']),
+    ('TYO', 'Tokyo', 'Japan', ['NRT', 'HND']),
+    ('SEL', 'Seoul', 'South Korea', ['ICN', 'GMP']),
+    ('MOW', 'Moscow', 'Russia', ['SVO', 'DME']),
+    ('WAS', 'Washington', 'United States', ['DCA', 'BWI']),
+]
+
+def addMetroAreas():
+    """
+    Create the metro areas and attach the member airports that are loaded.
+    Runs after addPlaces(): the migration creating the metro areas runs
+    before any airport exists on a fresh database.
+    """
+    print("Adding Metro Areas...")
+    for code, city, country, airports in METRO_AREAS:
+        metro, _ = MetroArea.objects.get_or_create(code=code, defaults={'city': city, 'country': country})
+        metro.airports.add(*Place.objects.filter(code__in=airports))
+    print("Done.\n")
+
 def addDomesticFlights():
     file = open("./Data/domestic_flights.csv", "r")
     print("Adding Domestic Flights...")
@@ -1,10 +1,13 @@
 from django.shortcuts import render, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
-from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.http import parse_etags
 
 from datetime import datetime, timedelta
 import math
@@ -15,37 +18,62 @@ from capstone.utils import render_to_pdf, createticket
 
 #Fee and Surcharge variable
 from .constant import FEE
-from flight.utils import createWeekDays, addPlaces, addDomesticFlights, addInternationalFlights
+from flight.utils import createWeekDays, addPlaces, addMetroAreas, addDomesticFlights, addInternationalFlights
 from flight.seat_manager import (
-    get_seat_map, 
     reserve_seat, 
-    book_seat, 
+    reserve_seats,
+    book_seats,
     release_seat,
-    cleanup_expired_reservations,
-    create_seats_for_flight
+    ensure_seats_for_departure,
+    departure_seats,
+    cabin_column_groups,
+    get_seats,
+    parse_departure_date,
+    seat_availability,
+    seat_map_changes,
+    cabin_holds,
+    seat_key
 )
+from flight.search_index import FARE_FIELDS, find_flights_between, get_fare, weekday_min_fares
+from flight.place_index import get_place_index, search_places
+from flight.search_cache import bulk_update, search_cache_stats
+from flight.search_filters import parse_filters, apply_filters, paginate
+from flight.connections import find_connections, SORT_ORDERS, DEFAULT_LIMIT
+from flight.search_stream import stream_search
+from flight.seat_assign import auto_assign_seats
+from flight.seat_grid import seat_grid
+from flight.seat_wire import SEAT_MAP_MEDIA_TYPE, cabin_geometry, packed_seat_map, wants_packed
 
 try:
     if len(Week.objects.all()) == 0:
         createWeekDays()
 
     if len(Place.objects.all()) == 0:
-        addPlaces()
+        with bulk_update():
+            addPlaces()
+
+    if not MetroArea.airports.through.objects.exists():
+        addMetroAreas()
 
     if len(Flight.objects.all()) == 0:
         print("Do you want to add flights in the Database? (y/n)")
         if input().lower() in ['y', 'yes']:
-            addDomesticFlights()
-            addInternationalFlights()
+            with bulk_update():
+                addDomesticFlights()
+                addInternationalFlights()
+
+    # Build the autocomplete index up front so no keystroke waits on the database
+    get_place_index()
 except:
     pass
 
 # Create your views here.
 
-def index(request):
-    # Use strftime for proper zero-padded date format (YYYY-MM-DD) required by HTML date inputs
+def booking_window():
+    """
+    First and last date that can be booked (today to 3 months from now)
+    """
     today = datetime.now().date()
-    min_date = today.strftime("%Y-%m-%d")
     
     # Calculate max date (3 months from now)
     max_month = today.month + 3
@@ -55,7 +83,13 @@ def index(request):
         max_year += 1
     # Handle edge case where day might not exist in target month
     max_day = min(today.day, 28)  # Use 28 to be safe for all months
-    max_date = f"{max_year}-{max_month:02d}-{max_day:02d}"
+    return today, today.replace(year=max_year, month=max_month, day=max_day)
+
+def index(request):
+    # Use strftime for proper zero-padded date format (YYYY-MM-DD) required by HTML date inputs
+    first_day, last_day = booking_window()
+    min_date = first_day.strftime("%Y-%m-%d")
+    max_date = last_day.strftime("%Y-%m-%d")
     if request.method == 'POST':
         origin = request.POST.get('Origin')
         destination = request.POST.get('Destination')
@@ -144,13 +178,7 @@ def logout_view(request):
     return HttpResponseRedirect(reverse("index"))
 
 def query(request, q):
-    places = Place.objects.all()
-    filters = []
-    q = q.lower()
-    for place in places:
-        if (q in place.city.lower()) or (q in place.airport.lower()) or (q in place.code.lower()) or (q in place.country.lower()):
-            filters.append(place)
-    return JsonResponse([{'code':place.code, 'city':place.city, 'country': place.country} for place in filters], safe=False)
+    return JsonResponse(search_places(q), safe=False)
 
 @csrf_exempt
 def flight(request):
@@ -162,105 +190,63 @@ def flight(request):
     return_date = None
     seat = request.GET.get('SeatClass')
     
-    # Validate origin and destination codes
-    try:
-        origin = Place.objects.get(code=o_place.upper())
-    except Place.DoesNotExist:
-        # Suggest alternatives for common city codes
-        suggestions = {
-            'NYC': 'JFK, LGA, or EWR (New York area airports)',
-            'TOKYO': 'NRT or HND (Tokyo airports)',
-            'LONDON': 'LHR, LGW, or STN (London airports)',
-        }
-        suggestion = suggestions.get(o_place.upper(), '')
-        error_msg = f"Airport code '{o_place.upper()}' not found."
-        if suggestion:
-            error_msg += f" Did you mean {suggestion}?"
+    # Validate origin and destination codes (an airport or a metro area such as NYC)
+    origin, origin_codes = resolve_place(o_place)
+    if origin is None:
         return render(request, 'flight/error.html', {
             'error_title': 'Invalid Origin Airport',
-            'error_message': error_msg,
+            'error_message': unknown_place_message(o_place),
             'show_search': True
         })
-    
-    try:
-        destination = Place.objects.get(code=d_place.upper())
-    except Place.DoesNotExist:
-        suggestions = {
-            'NYC': 'JFK, LGA, or EWR (New York area airports)',
-            'TOKYO': 'NRT or HND (Tokyo airports)',
-            'LONDON': 'LHR, LGW, or STN (London airports)',
-        }
-        suggestion = suggestions.get(d_place.upper(), '')
-        error_msg = f"Airport code '{d_place.upper()}' not found."
-        if suggestion:
-            error_msg += f" Did you mean {suggestion}?"
+
+    destination, destination_codes = resolve_place(d_place)
+    if destination is None:
         return render(request, 'flight/error.html', {
             'error_title': 'Invalid Destination Airport',
-            'error_message': error_msg,
+            'error_message': unknown_place_message(d_place),
             'show_search': True
         })
-    
+
     if trip_type == '2':
         returndate = request.GET.get('ReturnDate')
         return_date = datetime.strptime(returndate, "%Y-%m-%d")
-        flightday2 = Week.objects.get(number=return_date.weekday()) ##
         origin2 = destination   ##
         destination2 = origin  ##
+        origin2_codes = destination_codes   ##
+        destination2_codes = origin_codes   ##
 
-    flightday = Week.objects.get(number=depart_date.weekday())
-    if seat == 'economy':
-        flights = Flight.objects.filter(depart_day=flightday,origin=origin,destination=destination).exclude(economy_fare=0).order_by('economy_fare')
-        try:
-            max_price = flights.last().economy_fare
-            min_price = flights.first().economy_fare
-        except:
-            max_price = 0
-            min_price = 0
+    flights = find_flights_between(origin_codes, destination_codes, depart_date.weekday(), seat)
+    flights, seats_left = available_flights(flights, depart_date.date(), seat)
+    try:
+        max_price = get_fare(flights[-1], seat)
+        min_price = get_fare(flights[0], seat)
+    except:
+        max_price = 0
+        min_price = 0
 
-        if trip_type == '2':    ##
-            flights2 = Flight.objects.filter(depart_day=flightday2,origin=origin2,destination=destination2).exclude(economy_fare=0).order_by('economy_fare')    ##
-            try:
-                max_price2 = flights2.last().economy_fare   ##
-                min_price2 = flights2.first().economy_fare  ##
-            except:
-                max_price2 = 0  ##
-                min_price2 = 0  ##
-                
-    elif seat == 'business':
-        flights = Flight.objects.filter(depart_day=flightday,origin=origin,destination=destination).exclude(business_fare=0).order_by('business_fare')
+    if trip_type == '2':    ##
+        flights2 = find_flights_between(origin2_codes, destination2_codes, return_date.weekday(), seat)    ##
+        flights2, seats_left2 = available_flights(flights2, return_date.date(), seat)    ##
         try:
-            max_price = flights.last().business_fare
-            min_price = flights.first().business_fare
+            max_price2 = get_fare(flights2[-1], seat)   ##
+            min_price2 = get_fare(flights2[0], seat)  ##
         except:
-            max_price = 0
-            min_price = 0
+            max_price2 = 0  ##
+            min_price2 = 0  ##
 
-        if trip_type == '2':    ##
-            flights2 = Flight.objects.filter(depart_day=flightday2,origin=origin2,destination=destination2).exclude(business_fare=0).order_by('business_fare')    ##
-            try:
-                max_price2 = flights2.last().business_fare   ##
-                min_price2 = flights2.first().business_fare  ##
-            except:
-                max_price2 = 0  ##
-                min_price2 = 0  ##
-
-    elif seat == 'first':
-        flights = Flight.objects.filter(depart_day=flightday,origin=origin,destination=destination).exclude(first_fare=0).order_by('first_fare')
-        try:
-            max_price = flights.last().first_fare
-            min_price = flights.first().first_fare
-        except:
-            max_price = 0
-            min_price = 0
-            
-        if trip_type == '2':    ##
-            flights2 = Flight.objects.filter(depart_day=flightday2,origin=origin2,destination=destination2).exclude(first_fare=0).order_by('first_fare')
-            try:
-                max_price2 = flights2.last().first_fare   ##
-                min_price2 = flights2.first().first_fare  ##
-            except:
-                max_price2 = 0  ##
-                min_price2 = 0  ##    ##
+    # Only the first page of the filtered results is rendered, "load more" fetches the rest
+    filters = search_filters(request.GET)
+    airlines = sorted({flight.airline for flight in flights})
+    flights, flights_next = paginate(apply_filters(flights, seat, filters), seat, filters['sort'], filters['after'])
+    if trip_type == '2':    ##
+        filters2 = search_filters(request.GET, '2')    ##
+        airlines2 = sorted({flight.airline for flight in flights2})    ##
+        flights2, flights2_next = paginate(apply_filters(flights2, seat, filters2), seat, filters2['sort'], filters2['after'])    ##
+
+    # No direct flight: offer itineraries with one or two stops instead
+    connections = []
+    if not airlines:
+        connections = add_leg_dates(find_connections(origin_codes, destination_codes, depart_date.weekday(), seat), depart_date)
 
     #print(calendar.day_name[depart_date.weekday()])
     if trip_type == '2':
@@ -278,7 +264,14 @@ def flight(request):
             'max_price': math.ceil(max_price/100)*100,
             'min_price': math.floor(min_price/100)*100,
             'max_price2': math.ceil(max_price2/100)*100,    ##
-            'min_price2': math.floor(min_price2/100)*100    ##
+            'min_price2': math.floor(min_price2/100)*100,    ##
+            'flights_next': flights_next,
+            'flights2_next': flights2_next,    ##
+            'seats_left': seats_left,
+            'seats_left2': seats_left2,    ##
+            'airlines': airlines,
+            'airlines2': airlines2,    ##
+            'connections': connections
         })
     else:
         return render(request, "flight/search.html", {
@@ -290,9 +283,219 @@ def flight(request):
             'depart_date': depart_date,
             'return_date': return_date,
             'max_price': math.ceil(max_price/100)*100,
-            'min_price': math.floor(min_price/100)*100
+            'min_price': math.floor(min_price/100)*100,
+            'flights_next': flights_next,
+            'seats_left': seats_left,
+            'airlines': airlines,
+            'connections': connections
         })
 
+# Search results show "only N seats left" from this many seats down
+LOW_SEATS_LEFT = 9
+
+def available_flights(flights, departure_date, cabin):
+    """
+    Flights of a search that are not sold out in the cabin on the date, and
+    {flight id: seats left} of those running low, from one counter query
+    """
+    availability = seat_availability([flight.id for flight in flights], departure_date, cabin)
+    flights = [flight for flight in flights if availability.get(flight.id) != 0]
+    running_low = {flight_id: left for flight_id, left in availability.items() if 0 < left <= LOW_SEATS_LEFT}
+    return flights, running_low
+
+def search_filters(params, suffix=''):
+    """
+    Filters of one result list, falling back to no filter on malformed input
+    """
+    try:
+        return parse_filters(params, suffix)
+    except ValueError:
+        return parse_filters({}, suffix)
+
+def flight_results(request):
+    """
+    Next page of search results as an HTML fragment (AJAX endpoint for "load more" and filters).
+    Takes the parameters of the search page; leg=2 pages through the return flights.
+    """
+    leg2 = request.GET.get('leg') == '2'
+    seat = request.GET.get('SeatClass', 'economy').lower()
+    origin, origin_codes = resolve_place(request.GET.get('Origin'))
+    destination, destination_codes = resolve_place(request.GET.get('Destination'))
+    if origin is None or destination is None or seat not in FARE_FIELDS:
+        return JsonResponse({'success': False, 'error': 'Invalid search'})
+    try:
+        depart_date = datetime.strptime(request.GET.get('ReturnDate' if leg2 else 'DepartDate', ''), "%Y-%m-%d")
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date'})
+
+    if leg2:
+        origin_codes, destination_codes = destination_codes, origin_codes
+    try:
+        filters = parse_filters(request.GET, '2' if leg2 else '')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid filter'})
+    flights = find_flights_between(origin_codes, destination_codes, depart_date.weekday(), seat)
+    flights, seats_left = available_flights(flights, depart_date.date(), seat)
+    page, next_cursor = paginate(apply_filters(flights, seat, filters), seat, filters['sort'], filters['after'])
+
+    context = {
+        'seat': seat.capitalize(),
+        'trip_type': request.GET.get('TripType'),
+        'depart_date': depart_date,
+        'first_page': not filters['after'],
+    }
+    context['flights2' if leg2 else 'flights'] = page
+    context['seats_left2' if leg2 else 'seats_left'] = seats_left
+    html = render_to_string('flight/search_results2.html' if leg2 else 'flight/search_results.html', context, request=request)
+    return JsonResponse({'success': True, 'html': html, 'next': next_cursor})
+
+def resolve_place(code):
+    """
+    Look up an airport code or a metro area code/city name.
+    Returns the Place or MetroArea and the airport codes to search, or (None, None).
+    """
+    code = (code or '').strip().upper()
+    try:
+        place = Place.objects.get(code=code)
+        return place, [place.code]
+    except Place.DoesNotExist:
+        pass
+    metro = MetroArea.objects.filter(Q(code=code) | Q(city__iexact=code)).prefetch_related('airports').first()
+    airports = [airport.code for airport in metro.airports.all()] if metro else []
+    if not airports:
+        # A metro area without loaded airports is as unknown as a wrong code
+        return None, None
+    return metro, airports
+
+# Closest places offered when a code is not found
+PLACE_SUGGESTIONS = 3
+
+def unknown_place_message(code):
+    """
+    Error message for a code that is neither an airport nor a metro area, with a "Did you mean" hint
+    """
+    code = (code or '').strip().upper()
+    message = f"Airport code '{code}' not found."
+    suggestions = [place['code'] for place in search_places(code, PLACE_SUGGESTIONS)] if code else []
+    if suggestions:
+        message += f" Did you mean {', '.join(suggestions)}?"
+    return message
+
+def add_leg_dates(itineraries, depart_date):
+    """
+    Attach the departure date of every leg to itineraries returned by find_connections
+    """
+    for itinerary in itineraries:
+        for leg in itinerary['legs']:
+            leg['date'] = (depart_date + timedelta(days=leg['day_offset'])).date()
+    return itineraries
+
+def connections_api(request):
+    """
+    One- and two-stop itineraries between two airports as JSON
+    """
+    origin, origin_codes = resolve_place(request.GET.get('origin'))
+    destination, destination_codes = resolve_place(request.GET.get('destination'))
+    if origin is None or destination is None:
+        return JsonResponse({'success': False, 'error': 'Unknown origin or destination'})
+    seat = request.GET.get('class', 'economy').lower()
+    sort = request.GET.get('sort', 'price')
+    try:
+        depart_date = datetime.strptime(request.GET.get('date', ''), "%Y-%m-%d")
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), 50)
+        max_stops = int(request.GET.get('stops', 2))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date, limit or stops'}, status=400)
+    if limit < 1 or not 1 <= max_stops <= 2:
+        return JsonResponse({'success': False, 'error': 'Invalid date, limit or stops'}, status=400)
+    if sort not in SORT_ORDERS:
+        return JsonResponse({'success': False, 'error': 'Invalid sort order'})
+
+    itineraries = add_leg_dates(
+        find_connections(origin_codes, destination_codes, depart_date.weekday(), seat, max_stops=max_stops, limit=limit, sort=sort),
+        depart_date
+    )
+    return JsonResponse({'success': True, 'itineraries': [{
+        'stops': itinerary['stops'],
+        'fare': itinerary['fare'],
+        'duration_minutes': itinerary['duration_minutes'],
+        'legs': [{
+            'flight_id': leg['flight'].id,
+            'airline': leg['flight'].airline,
+            'plane': leg['flight'].plane,
+            'origin': leg['flight'].origin.code,
+            'destination': leg['flight'].destination.code,
+            'date': leg['date'],
+            'depart_time': leg['flight'].depart_time.strftime("%H:%M"),
+            'arrival_time': leg['flight'].arrival_time.strftime("%H:%M"),
+            'fare': get_fare(leg['flight'], seat)
+        } for leg in itinerary['legs']]
+    } for itinerary in itineraries]})
+
+def search_api(request):
+    """
+    Flight search as a stream of NDJSON lines (JSON API for mobile and partner clients).
+    stops=1 or 2 adds connecting itineraries after the direct flights.
+    """
+    origin, origin_codes = resolve_place(request.GET.get('origin'))
+    destination, destination_codes = resolve_place(request.GET.get('destination'))
+    if origin is None or destination is None:
+        return JsonResponse({'success': False, 'error': 'Unknown origin or destination'})
+    seat = request.GET.get('class', 'economy').lower()
+    if seat not in FARE_FIELDS:
+        return JsonResponse({'success': False, 'error': 'Invalid class'})
+    try:
+        depart_date = datetime.strptime(request.GET.get('date', ''), "%Y-%m-%d").date()
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), 50)
+        max_stops = min(int(request.GET.get('stops', 0)), 2)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date, limit or stops'})
+    if limit < 1 or max_stops < 0:
+        return JsonResponse({'success': False, 'error': 'Invalid date, limit or stops'})
+
+    response = StreamingHttpResponse(
+        stream_search(origin_codes, destination_codes, depart_date, seat, max_stops=max_stops, limit=limit),
+        content_type='application/x-ndjson'
+    )
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def fare_calendar(request):
+    """
+    Cheapest fare for every day of the booking window (AJAX endpoint).
+    Schedules repeat weekly, so this only needs the seven weekday minima.
+    """
+    origin, origin_codes = resolve_place(request.GET.get('origin'))
+    destination, destination_codes = resolve_place(request.GET.get('destination'))
+    if origin is None or destination is None:
+        return JsonResponse({'success': False, 'error': 'Unknown origin or destination'})
+    seat = request.GET.get('class', 'economy').lower()
+    if seat not in FARE_FIELDS:
+        return JsonResponse({'success': False, 'error': 'Invalid class'})
+
+    weekday_fares = weekday_min_fares(origin_codes, destination_codes, seat)
+    first_day, last_day = booking_window()
+    fares = []
+    day = first_day
+    while day <= last_day:
+        fares.append({'date': day.strftime("%Y-%m-%d"), 'fare': weekday_fares[day.weekday()]})
+        day += timedelta(days=1)
+    return JsonResponse({
+        'success': True,
+        'origin': origin.code,
+        'destination': destination.code,
+        'class': seat,
+        'fares': fares
+    })
+
+def search_cache_stats_view(request):
+    """
+    Search cache hit/miss counters (staff only)
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'User unauthorised'}, status=403)
+    return JsonResponse(dict(search_cache_stats(), success=True))
+
 def review(request):
     flight_1 = request.GET.get('flight1Id')
     date1 = request.GET.get('flight1Date')
@@ -321,8 +524,8 @@ def review(request):
         # Get selected seat objects if any
         seat_objects = []
         if selected_seats:
-            seat_ids = [int(sid) for sid in selected_seats.split(',') if sid.strip()]
-            seat_objects = Seat.objects.filter(id__in=seat_ids)
+            seat_ids = [sid.strip() for sid in selected_seats.split(',') if sid.strip()]
+            seat_objects = get_seats(seat_ids)
         
         if round_trip:
             return render(request, "flight/book.html", {
@@ -568,6 +771,18 @@ def about_us(request):
     return render(request, 'flight/about.html')
 
 
+def seat_map_etag(flight, departure_date, seat_class, version, holds=(None, ()), packed=False):
+    """
+    ETag of the seat map of a cabin at an inventory version, per representation.
+    The cabin_holds() are part of it (the deadline of the next hold to lapse and
+    the number lapsed), as a lapsing hold changes the seat map but not the version.
+    """
+    next_expiry, lapsed = holds
+    expiry = f"-{next_expiry:%Y%m%d%H%M%S%f}" if next_expiry else ""
+    lapsed = f"-{len(lapsed)}lapsed" if lapsed else ""
+    return f'"{flight.id}-{departure_date:%Y%m%d}-{seat_class}-{version}{expiry}{lapsed}{"-packed" if packed else ""}"'
+
+
 @csrf_exempt
 def seat_selection(request):
     """
@@ -585,43 +800,33 @@ def seat_selection(request):
     date2 = request.GET.get('date2')
     round_trip = request.GET.get('round_trip') == 'true'
     
+    departure_date = parse_departure_date(depart_date)
+    if departure_date is None:
+        return HttpResponse("Invalid departure date", status=400)
+    if seat_class not in FARE_FIELDS:
+        return HttpResponse("Invalid seat class", status=400)
+    
     try:
         flight = Flight.objects.get(id=flight_id)
+        if not flight.depart_days & (1 << departure_date.weekday()):
+            return HttpResponse("Flight does not operate on this date", status=404)
         
-        # Check if seats exist for this flight, if not create them
-        if not flight.seats.exists():
-            create_seats_for_flight(flight)
-        
-        # Clean up expired reservations
-        cleanup_expired_reservations()
+        # With dense storage, seats are created per departure the first time someone opens it
+        ensure_seats_for_departure(flight, departure_date)
         
-        # Get seat map
-        seats = Seat.objects.filter(
-            flight=flight,
-            seat_class=seat_class
-        ).order_by('seat_number')
-        
-        # Organize seats into rows
-        seat_layout = {}
-        for seat in seats:
-            row = ''.join(filter(str.isdigit, seat.seat_number))
-            col = ''.join(filter(str.isalpha, seat.seat_number))
-            
-            if row not in seat_layout:
-                seat_layout[row] = {}
-            
-            seat_layout[row][col] = {
-                'id': seat.id,
-                'number': seat.seat_number,
-                'status': seat.status,
-                'price': seat.price
-            }
+        # The grid comes from the cache while the cabin's seats are unchanged
+        seat_map_version, holds, grid = seat_grid(flight, departure_date, seat_class)
         
         # Prepare context
         context = {
             'flight': flight,
             'seat_class': seat_class,
-            'seat_layout': seat_layout,
+            'column_groups': cabin_column_groups(flight, seat_class),
+            'seat_cabin': cabin_geometry(flight, seat_class),
+            'seat_key_prefix': seat_key(flight.id, departure_date, ''),
+            'seat_grid': grid,
+            'seat_map_version': seat_map_version,
+            'seat_map_etag': seat_map_etag(flight, departure_date, seat_class, seat_map_version, holds, packed=True),
             'depart_date': depart_date,
             'flight_id': flight_id,
             'round_trip': round_trip,
@@ -640,34 +845,64 @@ def seat_selection(request):
 @csrf_exempt
 def get_available_seats(request):
     """
-    Get available seats for a flight (AJAX endpoint)
+    Get the seats of one departure of a flight (AJAX endpoint)
+    The response carries the inventory version of the cabin and the state of
+    its holds as its ETag: a matching If-None-Match gets 304 Not Modified, and
+    since=<version> returns only the seats changed after that version, along
+    with those whose hold has lapsed.  Clients accepting
+    SEAT_MAP_MEDIA_TYPE get the whole cabin packed instead (see seat_wire).
     """
     if request.method == 'GET':
         flight_id = request.GET.get('flight_id')
         seat_class = request.GET.get('seat_class', 'economy')
+        departure_date = parse_departure_date(request.GET.get('depart_date'))
+        if departure_date is None:
+            return JsonResponse({'success': False, 'error': 'Invalid departure date'})
+        since = request.GET.get('since', '')
+        since = int(since) if since.isdigit() else None
         
         try:
             flight = Flight.objects.get(id=flight_id)
             
-            # Clean up expired reservations first
-            cleanup_expired_reservations()
+            version, changed = seat_map_changes(flight, departure_date, seat_class, since)
+            holds = cabin_holds(flight, departure_date, seat_class)
+            if changed is not None:
+                changed |= holds[1]
+            packed = wants_packed(request)
+            etag = seat_map_etag(flight, departure_date, seat_class, version, holds, packed)
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                response['Vary'] = 'Accept'
+                return response
             
-            seats = Seat.objects.filter(
-                flight=flight,
-                seat_class=seat_class
-            ).order_by('seat_number')
+            data = packed_seat_map(flight, departure_date, seat_class) if packed else None
+            if data is not None:
+                response = JsonResponse(dict(data, success=True, version=version), content_type=SEAT_MAP_MEDIA_TYPE)
+                response['ETag'] = etag
+                response['Cache-Control'] = 'no-cache'
+                response['Vary'] = 'Accept'
+                return response
             
             seat_data = []
-            for seat in seats:
-                seat_data.append({
-                    'id': seat.id,
-                    'number': seat.seat_number,
-                    'status': seat.status,
-                    'price': seat.price,
-                    'reserved_until': seat.reserved_until.isoformat() if seat.reserved_until else None
-                })
+            if changed is None or changed:
+                for seat in departure_seats(flight, departure_date, seat_class):
+                    if changed is not None and seat['number'] not in changed:
+                        continue
+                    if seat['reserved_until']:
+                        seat['reserved_until'] = seat['reserved_until'].isoformat()
+                    seat_data.append(seat)
             
-            return JsonResponse({'success': True, 'seats': seat_data})
+            data = {'success': True, 'version': version, 'seats': seat_data}
+            if changed is None:
+                data['column_groups'] = cabin_column_groups(flight, seat_class)
+            else:
+                data['since'] = since
+            response = JsonResponse(data)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'no-cache'
+            response['Vary'] = 'Accept'
+            return response
         except Flight.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Flight not found'})
     
@@ -675,17 +910,19 @@ def get_available_seats(request):
 
 
 @csrf_exempt
-@transaction.atomic
 def reserve_seat_view(request):
     """
-    Reserve a seat temporarily (AJAX endpoint)
-    Uses database transactions and row-level locking for concurrency control
+    Reserve a seat, or a group of seats given as seat_ids, temporarily (AJAX endpoint)
+    Seats are changed with conditional updates on their version (see seat_manager)
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             seat_id = data.get('seat_id')
+            seat_ids = data.get('seat_ids')
             
+            if seat_ids:
+                return JsonResponse(reserve_seats(seat_ids, duration_minutes=10))
             if not seat_id:
                 return JsonResponse({'success': False, 'error': 'Seat ID is required'})
             
@@ -700,7 +937,42 @@ def reserve_seat_view(request):
 
 
 @csrf_exempt
-@transaction.atomic
+def auto_assign_seats_view(request):
+    """
+    Reserve the best block of seats for a party (AJAX endpoint)
+    Takes flight_id, depart_date, seat_class, party_size and an optional
+    preference ('window' or 'aisle')
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            departure_date = parse_departure_date(data.get('depart_date'))
+            if departure_date is None:
+                return JsonResponse({'success': False, 'error': 'Invalid departure date'})
+            try:
+                flight_id = int(data.get('flight_id'))
+            except (TypeError, ValueError):
+                return JsonResponse({'success': False, 'error': 'Invalid flight id'})
+            try:
+                party_size = int(data.get('party_size', 1))
+            except (TypeError, ValueError):
+                return JsonResponse({'success': False, 'error': 'Invalid party size'})
+            flight = Flight.objects.get(id=flight_id)
+            
+            result = auto_assign_seats(
+                flight, departure_date, data.get('seat_class', 'economy'), party_size,
+                preference=data.get('preference'), duration_minutes=10
+            )
+            return JsonResponse(result)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+        except Flight.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Flight not found'})
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@csrf_exempt
 def release_seat_view(request):
     """
     Release a reserved seat (AJAX endpoint)
@@ -741,28 +1013,20 @@ def confirm_seat_booking(request):
             if not seat_ids:
                 return JsonResponse({'success': False, 'error': 'No seats selected'})
             
-            # Book all selected seats
-            booked_seats = []
-            for seat_id in seat_ids:
-                result = book_seat(seat_id)
-                if result['success']:
-                    booked_seats.append(seat_id)
-                else:
-                    # Rollback - release already booked seats
-                    for booked_id in booked_seats:
-                        release_seat(booked_id)
-                    return JsonResponse({
-                        'success': False, 
-                        'error': f"Failed to book seat: {result.get('error')}"
-                    })
+            # Book all selected seats as a unit
+            result = book_seats(seat_ids)
+            if not result['success']:
+                return JsonResponse({
+                    'success': False, 
+                    'error': f"Failed to book seat: {result.get('error')}"
+                })
+            booked_seats = result['seat_ids']
             
             # Link seats to ticket if provided
             if ticket_id:
                 try:
                     ticket = Ticket.objects.get(id=ticket_id)
-                    for seat_id in booked_seats:
-                        seat = Seat.objects.get(id=seat_id)
-                        ticket.selected_seats.add(seat)
+                    ticket.selected_seats.add(*get_seats(booked_seats))
                     ticket.save()
                 except Ticket.DoesNotExist:
                     return JsonResponse({'success': False, 'error': 'Ticket not found'})
@@ -24,6 +24,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
 from flight.models import Flight
+from flight.search_cache import bulk_update
 import random
 
 def update_flight_fares():
@@ -69,4 +70,6 @@ def update_flight_fares():
         print(f"  {f.origin.code} -> {f.destination.code} | Economy: ₹{f.economy_fare:,.0f} | Business: ₹{f.business_fare:,.0f} | First: ₹{f.first_fare:,.0f}")
 
 if __name__ == "__main__":
-    update_flight_fares()
+    # One search cache invalidation for the whole run instead of one per flight
+    with bulk_update():
+        update_flight_fares()